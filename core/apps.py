@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+import functools
 import os
 import threading
 import time
@@ -6,41 +7,98 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def background_worker():
-    """Background worker to poll tools and update cache."""
+def poll_server_stats():
+    """Global HW stats polling."""
+    from .views import get_server_stats
+    from django.conf import settings
+    from django.template.loader import render_to_string
+    from . import live
+    from .single_flight import store
+    stats = get_server_stats()
+    store('bg_server_stats', stats, 30, max_stale=getattr(settings, 'CACHE_MAX_STALE', 0))
+    # Rendered once here and pushed to every open dashboard
+    live.publish(live.SERVER_STATS_TOPIC, stats, html=render_to_string('core/partials/stats.html', {'stats': stats}))
+    return stats
+
+def poll_tools_nav():
+    """Module and service versions and service status for the sidebar."""
+    from django.core.cache import cache
+    from .context_processors import TOOLS_NAV_CACHE_KEY, TOOLS_NAV_TTL, tools_nav_entry
     from .models import Tool
     from .plugin_system import plugin_registry
-    from django import db
+    # Picks up modules added without a restart
+    plugin_registry.sync_tools_with_db()
+    snapshot = {}
+    for tool in Tool.objects.all():
+        module = plugin_registry.get_module(tool.name)
+        if not module:
+            continue
+        try:
+            snapshot[tool.name] = tools_nav_entry(module, tool)
+        except Exception as e:
+            logger.warning(f"Could not poll {tool.name} for the navigation: {e}")
+    cache.set(TOOLS_NAV_CACHE_KEY, snapshot, TOOLS_NAV_TTL)
+    return snapshot
+
+def server_stats_interval(last_duration=None):
+    """Every 3 seconds while a dashboard is subscribed, as often as the page used to poll."""
+    from . import live
+    return 3 if live.is_watched(live.SERVER_STATS_TOPIC) else 15
+
+def load_poll_jobs():
+    """One job for the server stats plus one per installed tool with a module."""
+    from .models import Tool
+    from .plugin_system import plugin_registry
+    from .scheduler import PollJob
+
+    jobs = [
+        PollJob('server_stats', poll_server_stats, interval=15, timeout=30, get_interval=server_stats_interval),
+        PollJob('tools_nav', poll_tools_nav, interval=15, timeout=60),
+    ]
+    for tool in Tool.objects.all():
+        module = plugin_registry.get_module(tool.name)
+        if module and tool.status == 'installed':
+            jobs.append(PollJob(
+                f'tool_{tool.name}',
+                functools.partial(module.background_poll, tool),
+                interval=module.poll_interval,
+                timeout=module.poll_timeout,
+                get_interval=functools.partial(module.get_poll_interval, tool),
+            ))
+    return jobs
+
+def cache_is_shared():
+    """Whether the default cache reaches the other worker processes of the host."""
+    from django.conf import settings
+    return not settings.CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache'))
+
+def background_worker():
+    """Background worker to poll tools and update cache."""
+    from django.conf import settings
+    from .leader import FileLease
+    from .scheduler import PollScheduler
     
     # Wait a bit for the server to start
     time.sleep(5)
-    
-    while True:
-        try:
-            # Refresh DB connection for this thread
-            db.connections.close_all()
-            
-            tools = list(Tool.objects.all())
-            for tool in tools:
-                module = plugin_registry.get_module(tool.name)
-                if module and tool.status == 'installed':
-                    try:
-                        logger.debug(f"Background polling for tool: {tool.name}")
-                        module.background_poll(tool)
-                    except Exception as e:
-                        logger.error(f"Error polling tool {tool.name}: {e}")
-            
-            # Global HW stats polling
-            from .views import get_server_stats
-            from django.core.cache import cache
-            stats = get_server_stats()
-            cache.set('bg_server_stats', stats, 30)
-            
-        except Exception as e:
-            logger.error(f"Background worker error: {e}")
-        
-        # Poll every 15 seconds
-        time.sleep(15)
+
+    if cache_is_shared():
+        # Only one process per host polls; the others serve from the cache and take over
+        # within a couple of seconds if the leader exits
+        lease = FileLease(settings.BACKGROUND_WORKER_LOCK)
+        if not lease.try_acquire():
+            logger.info(f"Background worker is running in process {lease.leader_pid()}, waiting for the lease")
+            lease.wait()
+        logger.info("Background worker acquired the lease")
+    else:
+        # A leader would fill a cache no other process reads
+        logger.warning(
+            "The cache is private to each process, so every worker process polls on its own. "
+            "Set CACHE_BACKEND=sqlite when running several worker processes."
+        )
+
+    # Each tool is polled on its own schedule in a bounded pool, a slow one only delays itself
+    scheduler = PollScheduler(workers=getattr(settings, 'BACKGROUND_POLL_WORKERS', 4))
+    scheduler.run(load_poll_jobs)
 
 class CoreConfig(AppConfig):
     name = 'core'
@@ -61,5 +119,13 @@ class CoreConfig(AppConfig):
         # To ensure it only runs once even in production, we could use a lock or a specific process
         # For now, a simple thread in ready() is a good start as requested
         if not any(arg in __import__('sys').argv for arg in ['migrate', 'makemigrations', 'collectstatic', 'shell', 'test']):
+            from .version import get_core_version
+            logger.info(f"SolsticeOps core {get_core_version()}")
             threading.Thread(target=background_worker, daemon=True, name="SolsticeOpsBackgroundWorker").start()
             logger.info("Started background worker thread")
+
+            from django.conf import settings
+            if settings.DOCKER_STATE_CACHE:
+                from .docker_state import docker_state
+                if docker_state.start():
+                    logger.info("Started Docker events watcher")
@@ -0,0 +1,124 @@
+import logging
+import sqlite3
+import threading
+import time
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from .private_files import UnsafeFileError, ensure_private_file, signed_dumps, signed_loads
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class SQLiteCache(BaseCache):
+    """
+    Cache shared by all processes on the host, stored in a single SQLite file in WAL mode.
+    Needs no external service. It suits the few, frequently rewritten entries the
+    background worker produces (poll results, server stats) that every web worker reads.
+    """
+    # Expired rows are purged every this many writes per process
+    PURGE_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Values are pickled: the file must be ours alone, and every value is signed
+            ensure_private_file(self.path, suffixes=('-wal', '-shm'))
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            self._local.conn = conn
+        return conn
+
+    def _loads(self, blob, default):
+        try:
+            return signed_loads(blob)
+        except UnsafeFileError:
+            logger.warning(f"Ignoring a cache entry with a bad signature in {self.path}")
+            return default
+
+    def _live(self):
+        return '(expires IS NULL OR expires > ?)'
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT value FROM cache WHERE key = ? AND {self._live()}', (key, time.time())
+        ).fetchone()
+        if row is None:
+            return default
+        return self._loads(row[0], default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND {self._live()}', (*keys, time.time())
+        ).fetchall()
+        values = {keys[key]: self._loads(value, _MISSING) for key, value in rows}
+        return {key: value for key, value in values.items() if value is not _MISSING}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, signed_dumps(value), self.get_backend_timeout(timeout)),
+        )
+        self._after_write()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Inserts, or replaces only an expired entry, in one atomic statement
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, signed_dumps(value), self.get_backend_timeout(timeout), time.time()),
+        )
+        self._after_write()
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {self._live()}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {self._live()}', (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Same policy as the database cache: drop the entries closest to expiring
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
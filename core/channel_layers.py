@@ -0,0 +1,273 @@
+import asyncio
+import collections
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from .private_files import UnsafeFileError, ensure_private_file, signed_dumps, signed_loads
+
+logger = logging.getLogger(__name__)
+
+class _Dispatcher:
+    """Receiving side of one event loop: messages fetched for its channels and the receivers waiting on them."""
+    def __init__(self):
+        self.prefix = f"sqlite-{uuid.uuid4().hex[:12]}"
+        self.buffers = collections.defaultdict(collections.deque)
+        self.waiters = collections.defaultdict(collections.deque)
+        self.task = None
+
+    def deliver(self, channel, message, expires):
+        waiters = self.waiters.get(channel)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(message)
+                return
+        self.buffers[channel].append((expires, message))
+
+    def take(self, channel):
+        buffer = self.buffers.get(channel)
+        now = time.time()
+        while buffer:
+            expires, message = buffer.popleft()
+            if expires > now:
+                return message
+        self.buffers.pop(channel, None)
+        return None
+
+    def drop_expired(self):
+        now = time.time()
+        for channel, buffer in list(self.buffers.items()):
+            while buffer and buffer[0][0] <= now:
+                buffer.popleft()
+            if not buffer:
+                del self.buffers[channel]
+        for channel, waiters in list(self.waiters.items()):
+            if not waiters:
+                del self.waiters[channel]
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer shared by all processes on the host through one SQLite file in WAL mode,
+    so groups and channels work across ASGI worker processes without Redis.
+
+    Each event loop runs one task that fetches the messages of all its channels in a
+    single query, polling every poll_interval seconds after traffic and slowing down to
+    idle_poll_interval while idle. Database calls run on a dedicated thread and never
+    block the event loop.
+    """
+    extensions = ['groups', 'flush']
+    # Expired messages and group memberships are purged every this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.01, idle_poll_interval=0.1, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.idle_poll_interval = idle_poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='SolsticeOpsChannelLayer')
+        self._conn = None
+        self._writes = 0
+        self._dispatchers = weakref.WeakKeyDictionary()
+        self._dispatchers_lock = threading.Lock()
+
+    # Database side, always called on the layer thread
+
+    def _connection(self):
+        if self._conn is None:
+            # Messages carry terminal input and output: the file must be ours alone
+            ensure_private_file(self.path, suffixes=('-wal', '-shm'))
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'target TEXT NOT NULL, channel TEXT NOT NULL, body BLOB NOT NULL, expires REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS messages_target ON messages (target, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS groups (name TEXT NOT NULL, channel TEXT NOT NULL, '
+                'expires REAL NOT NULL, PRIMARY KEY (name, channel))'
+            )
+            self._conn = conn
+        return self._conn
+
+    def _insert(self, conn, channel, body, now):
+        queued = conn.execute(
+            'SELECT COUNT(*) FROM messages WHERE channel = ? AND expires > ?', (channel, now)
+        ).fetchone()[0]
+        if queued >= self.get_capacity(channel):
+            return False
+        conn.execute(
+            'INSERT INTO messages (target, channel, body, expires) VALUES (?, ?, ?, ?)',
+            (self.non_local_name(channel), channel, body, now + self.expiry),
+        )
+        return True
+
+    def _db_send(self, channel, body):
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            sent = self._insert(conn, channel, body, time.time())
+        self._after_write()
+        return sent
+
+    def _db_group_send(self, group, body):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            channels = [row[0] for row in conn.execute(
+                'SELECT channel FROM groups WHERE name = ? AND expires > ?', (group, now)
+            )]
+            for channel in channels:
+                # A full channel drops the message, as with the other layers
+                self._insert(conn, channel, body, now)
+        self._after_write()
+
+    def _db_fetch(self, targets):
+        conn = self._connection()
+        placeholders = ','.join('?' * len(targets))
+        # Idle polls only read the index: the write lock is taken when there is work
+        pending = conn.execute(
+            f'SELECT 1 FROM messages WHERE target IN ({placeholders}) LIMIT 1', tuple(targets)
+        ).fetchone()
+        if pending is None:
+            return []
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                f'SELECT id, channel, body, expires FROM messages WHERE target IN ({placeholders}) ORDER BY id',
+                tuple(targets),
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    f'DELETE FROM messages WHERE target IN ({placeholders}) AND id <= ?',
+                    (*targets, rows[-1][0]),
+                )
+        now = time.time()
+        return [(channel, body, expires) for _, channel, body, expires in rows if expires > now]
+
+    def _db_group_add(self, group, channel):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO groups (name, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+        self._after_write()
+
+    def _db_group_discard(self, group, channel):
+        self._connection().execute('DELETE FROM groups WHERE name = ? AND channel = ?', (group, channel))
+
+    def _db_flush(self):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM messages')
+            conn.execute('DELETE FROM groups')
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge()
+
+    def _purge(self):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            # A channel that let a message expire has no reader any more (e.g. its process
+            # died): drop it from its groups, as the in-memory layer does
+            conn.execute(
+                'DELETE FROM groups WHERE expires <= ? OR channel IN '
+                '(SELECT DISTINCT channel FROM messages WHERE expires <= ?)', (now, now)
+            )
+            conn.execute('DELETE FROM messages WHERE expires <= ?', (now,))
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Receiving side
+
+    def _dispatcher(self):
+        loop = asyncio.get_running_loop()
+        with self._dispatchers_lock:
+            dispatcher = self._dispatchers.get(loop)
+            if dispatcher is None:
+                dispatcher = self._dispatchers[loop] = _Dispatcher()
+            return dispatcher
+
+    async def _poll(self, dispatcher):
+        delay = self.poll_interval
+        try:
+            while dispatcher.waiters:
+                targets = {self.non_local_name(channel) for channel in dispatcher.waiters}
+                received = await self._run(self._db_fetch, targets)
+                for channel, body, expires in received:
+                    try:
+                        message = signed_loads(body)
+                    except UnsafeFileError as e:
+                        logger.warning(f"Dropped message for {channel}: {e}")
+                        continue
+                    dispatcher.deliver(channel, message, expires)
+                dispatcher.drop_expired()
+                delay = self.poll_interval if received else min(delay * 2, self.idle_poll_interval)
+                await asyncio.sleep(delay)
+        finally:
+            dispatcher.task = None
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if not await self._run(self._db_send, channel, signed_dumps(message)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        dispatcher = self._dispatcher()
+        message = dispatcher.take(channel)
+        if message is not None:
+            return message
+        future = asyncio.get_running_loop().create_future()
+        dispatcher.waiters[channel].append(future)
+        if dispatcher.task is None:
+            dispatcher.task = asyncio.get_running_loop().create_task(self._poll(dispatcher))
+        try:
+            return await future
+        finally:
+            # Cancelled receivers (closed connections) stop being polled for
+            waiters = dispatcher.waiters.get(channel)
+            if waiters is not None and future in waiters:
+                waiters.remove(future)
+
+    async def new_channel(self, prefix='specific'):
+        return f"{prefix}.{self._dispatcher().prefix}!{uuid.uuid4().hex[:12]}"
+
+    async def flush(self):
+        await self._run(self._db_flush)
+
+    async def close(self):
+        pass
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._db_group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._db_group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._run(self._db_group_send, group, signed_dumps(message))
@@ -1,20 +1,137 @@
+import asyncio
+import collections
 import json
-from channels.generic.websocket import WebsocketConsumer
-from .terminal_manager import manager
-from .plugin_system import plugin_registry
+import threading
+from urllib.parse import parse_qs
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer, JsonWebsocketConsumer
+from . import live
+from .models import Tool
+from .terminal_manager import VIEWER_TTL, RemoteSession, manager, resize_session
+from .plugin_system import mark_tool_viewed, plugin_registry
 
-class TerminalConsumer(WebsocketConsumer):
-    def connect(self):
+class TerminalOutput:
+    """
+    Bounded output queue between a terminal session and one async consumer. Sessions call
+    send() from any thread and it never blocks: chunks are coalesced into frames of up to
+    FRAME_BYTES, sent FLUSH_DELAY after the first pending chunk or as soon as a frame fills.
+
+    Clients that acknowledge written bytes ({"ack": n}) get at most WINDOW_BYTES in flight.
+    When a client falls behind by more than MAX_BYTES, the backlog is dropped and the
+    terminal resumes with a notice, so a slow browser never stalls the shell or other viewers.
+    """
+    FLUSH_DELAY = 0.01
+    FRAME_BYTES = 64 * 1024
+    WINDOW_BYTES = 1024 * 1024
+    MAX_BYTES = 4 * 1024 * 1024
+    SKIPPED_NOTICE = b'\r\n\x1b[0m\x1b[33m[output skipped: the terminal could not keep up]\x1b[0m\r\n'
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.loop = asyncio.get_running_loop()
+        self.lock = threading.Lock()
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped = 0
+        self.signalled = False
+        self.closed = False
+        self.unacked = 0
+        self.flow_control = False
+        self.wakeup = asyncio.Event()
+        self.window_open = asyncio.Event()
+        self.window_open.set()
+        self.task = self.loop.create_task(self.run())
+
+    @property
+    def channel_name(self):
+        return self.consumer.channel_name
+
+    def send(self, bytes_data=None, text_data=None):
+        data = bytes_data if bytes_data is not None else (text_data or '').encode()
+        if not data:
+            return
+        with self.lock:
+            if self.closed:
+                return
+            if self.size + len(data) > self.MAX_BYTES:
+                self.dropped += self.size
+                self.chunks.clear()
+                self.size = 0
+            self.chunks.append(data)
+            self.size += len(data)
+            if self.signalled:
+                return
+            self.signalled = True
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def ack(self, count):
+        self.flow_control = True
+        self.unacked = max(0, self.unacked - count)
+        if self.unacked < self.WINDOW_BYTES:
+            self.window_open.set()
+
+    def _take(self):
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+            frame = []
+            size = 0
+            while self.chunks and size < self.FRAME_BYTES:
+                chunk = self.chunks.popleft()
+                frame.append(chunk)
+                size += len(chunk)
+            self.size -= size
+            if not self.chunks:
+                self.signalled = False
+        return b''.join(frame), dropped
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if self.size < self.FRAME_BYTES:
+                # Let small writes (e.g. typed characters echoed one by one) gather into one frame
+                await asyncio.sleep(self.FLUSH_DELAY)
+            while True:
+                if self.flow_control and self.unacked >= self.WINDOW_BYTES:
+                    self.window_open.clear()
+                    await self.window_open.wait()
+                frame, dropped = self._take()
+                if dropped:
+                    frame = self.SKIPPED_NOTICE + frame
+                if not frame:
+                    break
+                self.unacked += len(frame)
+                await self.consumer.send(bytes_data=frame)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.chunks.clear()
+        self.task.cancel()
+
+def terminal_size(scope):
+    """The rows and cols of the client's terminal from the query string, (None, None) if missing."""
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        rows, cols = int(query['rows'][0]), int(query['cols'][0])
+    except (KeyError, ValueError):
+        return None, None
+    if not (0 < rows <= 1000 and 0 < cols <= 1000):
+        return None, None
+    return rows, cols
+
+class TerminalConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         user = self.scope.get('user')
         if not user or not user.is_authenticated:
-            self.close()
+            await self.close()
             return
 
         self.session_type = self.scope['url_route']['kwargs'].get('session_type', 'system')
         
         # Only admins can access module-specific shells (docker, k8s, etc.)
         if self.session_type != 'system' and not user.can_manage_infrastructure:
-            self.close()
+            await self.close()
             return
 
         self.kwargs = self.scope['url_route']['kwargs'].copy()
@@ -31,28 +148,131 @@ class TerminalConsumer(WebsocketConsumer):
             kwargs_str = "_".join([f"{k}_{v}" for k, v in sorted_kwargs])
             self.session_id = f"{self.session_type}_{kwargs_str}"
 
-        self.accept()
-        self.session = manager.get_session(self.session_id, self.session_type, **self.kwargs)
+        await self.accept()
+        self.output = TerminalOutput(self)
+        self.session = await sync_to_async(manager.get_session)(self.session_id, self.session_type, **self.kwargs)
         if self.session:
-            self.session.register_consumer(self)
+            # Group output of a session owned elsewhere is only used once the owner's reply
+            # to the attach (the snapshot) has arrived
+            self.remote_attached = not isinstance(self.session, RemoteSession)
+            if not self.remote_attached:
+                self.keepalive = asyncio.ensure_future(self._keep_attached())
+            # Sized first, so the snapshot is rendered for the client's terminal
+            rows, cols = terminal_size(self.scope)
+            await sync_to_async(self.session.register_consumer)(self.output, rows, cols)
         else:
-            self.close()
+            await self.close()
 
-    def receive(self, text_data=None, bytes_data=None):
+    async def receive(self, text_data=None, bytes_data=None):
         if text_data:
             try:
                 data = json.loads(text_data)
                 if 'input' in data:
-                    self.session.send_input(data['input'])
+                    await sync_to_async(self.session.send_input)(data['input'])
+                elif 'ack' in data:
+                    self.output.ack(int(data['ack']))
                 elif 'resize' in data:
-                    self.session.resize(data['resize']['rows'], data['resize']['cols'])
+                    await sync_to_async(resize_session)(self.session, data['resize']['rows'], data['resize']['cols'])
                 elif 'restart' in data:
-                    manager.restart_session(self.session_id)
+                    await sync_to_async(manager.restart_session)(self.session_id)
                 elif 'heartbeat' in data:
                     pass
             except:
                 pass
 
+    async def _keep_attached(self):
+        # The owner drops viewers it has not heard of for VIEWER_TTL, e.g. once this process died
+        while True:
+            await asyncio.sleep(VIEWER_TTL / 3)
+            await sync_to_async(self.session.keepalive)(self.output)
+
+    async def terminal_output(self, event):
+        # Output of a session owned by another worker process. Before the attach reply
+        # ends, it is already part of the snapshot or the output sent with it
+        if self.remote_attached:
+            self.output.send(bytes_data=event['data'])
+
+    async def terminal_reply(self, event):
+        # The owner's reply to the attach: the snapshot, then the output held back meanwhile
+        if event['data']:
+            self.output.send(bytes_data=event['data'])
+        if event.get('attached'):
+            self.remote_attached = True
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'keepalive', None):
+            self.keepalive.cancel()
+        if hasattr(self, 'output'):
+            self.output.close()
+        if getattr(self, 'session', None):
+            await sync_to_async(self.session.unregister_consumer)(self.output)
+
+class LiveUpdatesConsumer(JsonWebsocketConsumer):
+    """
+    Pushes topic updates published by the background worker (see core.live) instead of
+    the page polling for them. The client sends {"subscribe": [...]}, {"unsubscribe": [...]}
+    and a periodic {"heartbeat": true} that keeps its topics marked as watched.
+    """
+    MAX_TOPICS = 32
+
+    def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            self.close()
+            return
+        self.topics = set()
+        self.accept()
+
+    def _resolve(self, topic):
+        """Returns the Tool of a tool topic, True for other known topics, None if unknown."""
+        if not isinstance(topic, str) or not live.TOPIC_RE.match(topic):
+            return None
+        if topic == live.SERVER_STATS_TOPIC:
+            return True
+        if topic.startswith('tool.'):
+            return Tool.objects.filter(name=topic[5:]).first()
+        return None
+
+    def _watch(self, topic, target):
+        live.mark_watched(topic)
+        if isinstance(target, Tool):
+            # Makes the background worker poll this tool at its fastest interval
+            mark_tool_viewed(target)
+
+    def subscribe(self, topics):
+        for topic in topics:
+            if topic in self.topics or len(self.topics) >= self.MAX_TOPICS:
+                continue
+            target = self._resolve(topic)
+            if not target:
+                continue
+            async_to_sync(self.channel_layer.group_add)(live.group_name(topic), self.channel_name)
+            self.topics.add(topic)
+            self._watch(topic, target)
+            snapshot = live.get_snapshot(topic)
+            if snapshot:
+                self.send_json({**snapshot, 'snapshot': True})
+
+    def unsubscribe(self, topics):
+        for topic in topics:
+            if topic in self.topics:
+                async_to_sync(self.channel_layer.group_discard)(live.group_name(topic), self.channel_name)
+                self.topics.discard(topic)
+
+    def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict):
+            return
+        if isinstance(content.get('subscribe'), list):
+            self.subscribe(content['subscribe'])
+        if isinstance(content.get('unsubscribe'), list):
+            self.unsubscribe(content['unsubscribe'])
+        if 'heartbeat' in content:
+            for topic in self.topics:
+                self._watch(topic, self._resolve(topic))
+
+    def live_update(self, event):
+        message = {k: v for k, v in event.items() if k != 'type'}
+        self.send_json(message)
+
     def disconnect(self, close_code):
-        if hasattr(self, 'session'):
-            self.session.unregister_consumer(self)
+        self.unsubscribe(list(getattr(self, 'topics', ())))
@@ -1,30 +1,58 @@
 from .models import Tool
 from .plugin_system import plugin_registry
-import subprocess
+from .version import get_core_version, get_module_version
 
-def tools_nav(request):
-    # Core version from git tag
+# Versions and service status of every tool, refreshed by the background worker
+# (see apps.poll_tools_nav) so rendering a page never probes services
+TOOLS_NAV_CACHE_KEY = 'tools_nav_snapshot'
+TOOLS_NAV_TTL = 3600
+
+def tools_nav_entry(module, tool):
+    """Snapshot fields of one tool, from the module's memoized service probes."""
+    return {
+        'service_version': module.get_cached_service_version(),
+        'actual_service_status': module.get_cached_service_status(tool) if tool.status == 'installed' else 'stopped',
+    }
+
+def refresh_tools_nav(module, tool):
+    """Probes one tool again into the snapshot, e.g. once an action changed its service."""
+    from django.core.cache import cache
+    snapshot = cache.get(TOOLS_NAV_CACHE_KEY)
+    if snapshot is None:
+        # Filled by the next poll
+        return
     try:
-        core_version = subprocess.check_output(['git', 'describe', '--tags', '--abbrev=0']).decode().strip()
-    except:
-        core_version = 'v0.0.0'
+        snapshot[tool.name] = tools_nav_entry(module, tool)
+    except Exception:
+        # Shown as unknown until the next poll rather than with the status before the action
+        snapshot.pop(tool.name, None)
+    cache.set(TOOLS_NAV_CACHE_KEY, snapshot, TOOLS_NAV_TTL)
+
+def tools_nav(request):
+    core_version = get_core_version()
 
     if not request.user.is_authenticated:
         return {'core_version': core_version}
-        
-    plugin_registry.sync_tools_with_db()
+
+    from django.core.cache import cache
+    snapshot = cache.get(TOOLS_NAV_CACHE_KEY) or {}
     all_tools = Tool.objects.all()
     tools = []
     for tool in all_tools:
         module = plugin_registry.get_module(tool.name)
         if module:
-            tool.module_version = getattr(module, 'version', '1.0.0')
-            tool.service_version = module.get_service_version() or tool.version
-            tool.actual_service_status = module.get_service_status(tool) if tool.status == 'installed' else 'stopped'
+            probed = snapshot.get(tool.name, {})
+            tool.module_version = get_module_version(module)
+            tool.service_version = probed.get('service_version') or tool.version
+            # None until the first poll, shown as unknown
+            tool.actual_service_status = probed.get('actual_service_status') if tool.status == 'installed' else 'stopped'
             tools.append(tool)
             
+    from . import live
     return {
         'tools_nav': tools,
         'plugin_registry': plugin_registry,
-        'core_version': core_version
+        'core_version': core_version,
+        # Pages fall back to polling when the leader's updates cannot reach this process
+        'live_updates': live.updates_reach_this_process(),
     }
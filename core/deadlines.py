@@ -0,0 +1,17 @@
+import contextvars
+import time
+
+# time.monotonic() by which the background job running on this thread should be done
+_job_deadline = contextvars.ContextVar('poll_job_deadline', default=None)
+
+def job_time_left(timeout):
+    """
+    timeout for a blocking call (None for no limit), shortened to what is left of the
+    timeout of the background job making it. Used by run_command and the API clients,
+    so a job stuck on I/O ends soon after its timeout instead of holding its worker.
+    """
+    deadline = _job_deadline.get()
+    if deadline is None:
+        return timeout
+    left = max(1.0, deadline - time.monotonic())
+    return left if timeout is None else min(timeout, left)
@@ -0,0 +1,112 @@
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import threading
+from urllib.parse import quote
+from django.conf import settings
+from .http_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOCKER_SOCKET = '/var/run/docker.sock'
+
+class DockerAPIError(subprocess.CalledProcessError):
+    """
+    Raised when the Engine API returns an error.
+    Subclasses CalledProcessError so callers written against the CLI transport keep working.
+    """
+    def __init__(self, status, request, output=b''):
+        if isinstance(output, str):
+            output = output.encode()
+        super().__init__(status, request, output=output)
+        self.status = status
+
+    def __str__(self):
+        message = self.output.decode(errors='replace').strip() if self.output else ''
+        return f"Docker API request '{self.cmd}' failed with status {self.returncode}: {message}"
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a unix domain socket instead of a TCP host."""
+    def __init__(self, socket_path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except:
+            sock.close()
+            raise
+        self.sock = sock
+
+def demux_stream(data):
+    """
+    Strips the 8-byte frame headers Docker adds to attached stdout/stderr streams
+    of containers started without a TTY. Raw (TTY) output is returned untouched.
+    """
+    if len(data) < 8 or data[0] not in (0, 1, 2) or data[1:4] != b'\x00\x00\x00':
+        return data
+    chunks = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size = int.from_bytes(data[pos + 4:pos + 8], 'big')
+        chunks.append(data[pos + 8:pos + 8 + size])
+        pos += 8 + size
+    return b''.join(chunks)
+
+class DockerEngineAPI(ConnectionPool):
+    """
+    Minimal Docker Engine API client over the unix socket.
+    Keeps a small pool of keep-alive connections so each call costs one HTTP round trip
+    instead of a `docker` process spawn.
+    """
+    def __init__(self, socket_path=DEFAULT_DOCKER_SOCKET, pool_size=4, timeout=30):
+        super().__init__(pool_size=pool_size, timeout=timeout)
+        self.socket_path = socket_path
+
+    def _new_connection(self, timeout):
+        return UnixHTTPConnection(self.socket_path, timeout=timeout)
+
+    def _raise_for_status(self, method, path, status, data):
+        try:
+            message = json.loads(data).get('message', '')
+        except:
+            message = data.decode(errors='replace')
+        raise DockerAPIError(status, f"{method} {path}", output=message)
+
+    def inspect(self, path):
+        """Returns the decoded object for an inspect path, or None if it does not exist."""
+        try:
+            return self.get_json(path)
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+def quote_id(obj_id):
+    return quote(str(obj_id), safe='')
+
+_api = None
+_api_lock = threading.Lock()
+
+def get_docker_api():
+    """
+    Returns the shared Engine API client, or None when the CLI transport should be used.
+    Controlled by settings.DOCKER_TRANSPORT ('auto', 'api' or 'cli').
+    """
+    global _api
+    mode = getattr(settings, 'DOCKER_TRANSPORT', 'auto')
+    if mode == 'cli':
+        return None
+    socket_path = getattr(settings, 'DOCKER_SOCKET', DEFAULT_DOCKER_SOCKET)
+    if mode == 'auto' and not os.path.exists(socket_path):
+        return None
+    with _api_lock:
+        if _api is None or _api.socket_path != socket_path:
+            _api = DockerEngineAPI(socket_path)
+        return _api
@@ -1,55 +1,173 @@
+import base64
 import json
 import logging
 from .utils import run_command
+from .docker_api import get_docker_api, demux_stream, quote_id, DockerAPIError
 
 logger = logging.getLogger(__name__)
 
+class _Unset:
+    """Marks hot fields a listing summary does not provide. Unpickles to the same instance."""
+    def __reduce__(self):
+        return '_UNSET'
+
+_UNSET = _Unset()
+
 class DockerObject:
-    def __init__(self, attrs):
-        self.attrs = attrs
+    """
+    Compact record for a Docker object. Hot fields live in slots, filled once from the
+    inspect data or the listing summary. The inspect data can be compacted to its JSON
+    text, which is decoded back (once, replacing the text) only when a field outside the
+    hot set is read.
+    """
+    __slots__ = ('id', 'name', 'summary', '_attrs', '_raw')
+    # Engine API path used to inspect a single object, formatted with its quoted ID
+    api_inspect_path = None
+
+    def __init__(self, attrs=None, summary=None):
+        # Partial listing fields; when set without attrs, the full inspect is fetched on first access
+        self.summary = summary
+        self._attrs = attrs
+        self._raw = None
+        if attrs is None and summary is not None:
+            self._load_summary(summary)
+        else:
+            self._load(attrs or {})
+
+    def _load(self, attrs):
+        """Sets the hot fields from the inspect data."""
+        self.id = attrs.get('Id')
+        # Names in inspect usually start with /
+        name = attrs.get('Name', '')
+        self.name = name[1:] if name.startswith('/') else name
+
+    def _load_summary(self, summary):
+        self.id = summary.get('Id')
+        self.name = summary.get('Name')
+
+    def _fetch_attrs(self):
+        """Return the full inspect data for an object built from a summary."""
+        return None
+
+    def _data(self):
+        """The inspect data as a dict, decoded or fetched at most once."""
+        if self._attrs is not None:
+            return self._attrs
+        if self._raw is not None:
+            # Held decoded from now on, never as both the text and the dict
+            self._attrs = json.loads(self._raw)
+            self._raw = None
+            return self._attrs
+        if self.summary is None:
+            return {}
+        # Lazy full inspection, only once a field missing from the summary is touched
+        attrs = self._fetch_attrs() or {}
+        self._attrs = attrs
+        if attrs:
+            self._load(attrs)
+        return attrs
+
+    @property
+    def attrs(self):
+        return self._data()
+
+    def compact(self):
+        """Keeps the inspect data only as JSON text. Used for objects held long-term in the state cache."""
+        if self._attrs is not None:
+            self._raw = json.dumps(self._attrs, separators=(',', ':')).encode()
+            self._attrs = None
+        return self
 
     def __getattr__(self, item):
-        try:
-            # Avoid recursion if self.attrs is missing during init or something
-            attrs = object.__getattribute__(self, 'attrs')
-        except AttributeError:
+        # Only reached for names that are not slots, properties or methods
+        if item.startswith('_') or item == 'attrs':
             raise AttributeError(item)
-
-        # Map some common attributes
-        if item == 'id':
-            return attrs.get('Id')
-        if item == 'name':
-            # Names in inspect usually start with /
-            name = attrs.get('Name', '')
-            return name[1:] if name.startswith('/') else name
-        
+        attrs = self._data()
         if item in attrs:
             return attrs[item]
-            
         raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}'")
 
 class Container(DockerObject):
+    __slots__ = ('status', '_created', '_ports', '_image_id', '_image_ref', '_image')
+    api_inspect_path = '/containers/{}/json'
+
+    def _load(self, attrs):
+        super()._load(attrs)
+        state = attrs.get('State', {})
+        self.status = state.get('Status', 'unknown') if isinstance(state, dict) else 'unknown'
+        self._created = attrs.get('Created')
+        self._ports = (attrs.get('NetworkSettings') or {}).get('Ports') or {}
+        self._image_id = attrs.get('Image')
+        self._image_ref = attrs.get('Config', {}).get('Image', 'unknown')
+        self._image = None
+
+    def _load_summary(self, summary):
+        super()._load_summary(summary)
+        self.status = summary.get('Status') or 'unknown'
+        self._created = self._ports = _UNSET
+        self._image_id = summary.get('ImageId')
+        self._image_ref = summary.get('Image') or 'unknown'
+        self._image = None
+
+    def _fetch_attrs(self):
+        full = ContainerManager(use_cache=False).get(self.summary['Id'])
+        if full is None:
+            logger.debug(f"Container {self.summary['Id']} disappeared before it could be inspected")
+            return {}
+        return full._data()
+
+    def _full_field(self, slot):
+        """Returns a field the listing summary lacks, inspecting the container if needed."""
+        if getattr(self, slot) is _UNSET:
+            self._data()
+        value = getattr(self, slot)
+        return None if value is _UNSET else value
+
+    @property
+    def running(self):
+        # Same set as `docker ps`: running, paused and restarting containers
+        return self.status in ('running', 'paused', 'restarting')
+
     @property
-    def status(self):
-        state = self.attrs.get('State', {})
-        if isinstance(state, dict):
-            return state.get('Status', 'unknown')
-        return 'unknown'
+    def created(self):
+        return self._full_field('_created')
+
+    @property
+    def ports(self):
+        return self._full_field('_ports')
 
     @property
     def image(self):
-        return Image({'Id': self.attrs.get('Image'), 'RepoTags': [self.attrs.get('Config', {}).get('Image', 'unknown')]})
+        if self._image is None:
+            if self._image_id is None and self._attrs is None and self.summary is not None:
+                # `docker ps` has no image ID, inspect the container for it
+                self._data()
+            self._image = Image({'Id': self._image_id, 'RepoTags': [self._image_ref]})
+        return self._image
+
+    def _api_action(self, action, timeout=None):
+        get_docker_api().post(f'/containers/{quote_id(self.id)}/{action}', timeout=timeout)
 
     def start(self):
+        if get_docker_api():
+            return self._api_action('start')
         run_command(['docker', 'start', self.id])
 
     def stop(self):
+        if get_docker_api():
+            return self._api_action('stop', timeout=60)
         run_command(['docker', 'stop', self.id])
 
     def restart(self):
+        if get_docker_api():
+            return self._api_action('restart', timeout=60)
         run_command(['docker', 'restart', self.id])
 
     def remove(self, force=False):
+        api = get_docker_api()
+        if api:
+            api.delete(f'/containers/{quote_id(self.id)}', params={'force': 1 if force else None})
+            return
         cmd = ['docker', 'rm']
         if force:
             cmd.append('-f')
@@ -57,6 +175,10 @@ class Container(DockerObject):
         run_command(cmd)
 
     def logs(self, tail=None, timestamps=False):
+        api = get_docker_api()
+        if api:
+            params = {'stdout': 1, 'stderr': 1, 'tail': tail or None, 'timestamps': 1 if timestamps else None}
+            return demux_stream(api.get(f'/containers/{quote_id(self.id)}/logs', params=params))
         cmd = ['docker', 'logs']
         if tail:
             cmd.extend(['--tail', str(tail)])
@@ -67,30 +189,49 @@ class Container(DockerObject):
 
     def exec_run(self, cmd):
         # Executes a command in the container. Assumes running as root.
-        full_cmd = ['docker', 'exec', self.id] + (cmd if isinstance(cmd, list) else cmd.split())
-        output = run_command(full_cmd, timeout=600)
+        cmd = cmd if isinstance(cmd, list) else cmd.split()
         # Mocking the result object
         class ExecResult:
-            def __init__(self, output):
-                self.exit_code = 0
+            def __init__(self, output, exit_code=0):
+                self.exit_code = exit_code
                 self.output = output
+
+        api = get_docker_api()
+        if api:
+            exec_id = api.post_json(f'/containers/{quote_id(self.id)}/exec', body={
+                'Cmd': cmd, 'AttachStdout': True, 'AttachStderr': True,
+            })['Id']
+            output = demux_stream(api.post(f'/exec/{exec_id}/start', body={'Detach': False, 'Tty': False}, timeout=600))
+            exit_code = api.get_json(f'/exec/{exec_id}/json').get('ExitCode') or 0
+            if exit_code:
+                # Same semantics as run_command: a non-zero exit raises
+                raise DockerAPIError(exit_code, f"exec {' '.join(cmd)}", output=output)
+            return ExecResult(output)
+
+        output = run_command(['docker', 'exec', self.id] + cmd, timeout=600)
         return ExecResult(output)
 
 class Image(DockerObject):
-    @property
-    def tags(self):
-        return self.attrs.get('RepoTags', [])
+    __slots__ = ('tags', 'created')
+    api_inspect_path = '/images/{}/json'
+
+    def _load(self, attrs):
+        super()._load(attrs)
+        self.tags = attrs.get('RepoTags', [])
+        self.created = attrs.get('Created')
 
 class Volume(DockerObject):
-    @property
-    def id(self):
-        return self.attrs.get('Name')
+    __slots__ = ()
+    api_inspect_path = '/volumes/{}'
 
-    @property
-    def name(self):
-        return self.attrs.get('Name')
+    def _load(self, attrs):
+        self.id = self.name = attrs.get('Name')
 
     def remove(self, force=False):
+        api = get_docker_api()
+        if api:
+            api.delete(f'/volumes/{quote_id(self.id)}', params={'force': 1 if force else None})
+            return
         cmd = ['docker', 'volume', 'rm']
         if force:
             cmd.append('-f')
@@ -98,43 +239,76 @@ class Volume(DockerObject):
         run_command(cmd)
 
 class Network(DockerObject):
-    @property
-    def id(self):
-        return self.attrs.get('Id')
+    __slots__ = ()
+    api_inspect_path = '/networks/{}'
 
-    @property
-    def name(self):
-        return self.attrs.get('Name')
+    def _load(self, attrs):
+        self.id = attrs.get('Id')
+        self.name = attrs.get('Name')
 
     def connect(self, container):
         container_id = container.id if hasattr(container, 'id') else container
+        api = get_docker_api()
+        if api:
+            api.post(f'/networks/{quote_id(self.id)}/connect', body={'Container': container_id})
+            return
         run_command(['docker', 'network', 'connect', self.id, container_id])
 
     def disconnect(self, container):
         container_id = container.id if hasattr(container, 'id') else container
+        api = get_docker_api()
+        if api:
+            api.post(f'/networks/{quote_id(self.id)}/disconnect', body={'Container': container_id})
+            return
         run_command(['docker', 'network', 'disconnect', self.id, container_id])
 
     def remove(self):
+        api = get_docker_api()
+        if api:
+            api.delete(f'/networks/{quote_id(self.id)}')
+            return
         run_command(['docker', 'network', 'rm', self.id])
 
 class DockerCLI:
-    def __init__(self):
-        self.containers = ContainerManager()
-        self.images = ImageManager()
-        self.volumes = VolumeManager()
-        self.networks = NetworkManager()
+    def __init__(self, use_cache=True):
+        self.containers = ContainerManager(use_cache)
+        self.images = ImageManager(use_cache)
+        self.volumes = VolumeManager(use_cache)
+        self.networks = NetworkManager(use_cache)
 
     def info(self):
         try:
+            api = get_docker_api()
+            if api:
+                return api.get_json('/info')
             output = run_command(['docker', 'info', '--format', '{{json .}}'])
             return json.loads(output)
         except:
             return {}
 
 class Manager:
+    # Object class managed by this manager, used for Engine API inspect paths
+    object_class = None
+
+    def __init__(self, use_cache=True):
+        self.use_cache = use_cache
+
+    def _state(self):
+        """Returns the event-fed state cache when it is in sync, otherwise None."""
+        if not self.use_cache:
+            return None
+        from .docker_state import docker_state
+        return docker_state if docker_state.synced else None
+
     def _exists(self, obj_id, type_filter=None):
         if not obj_id:
             return False
+        api = get_docker_api()
+        if api and self.object_class:
+            try:
+                return api.inspect(self.object_class.api_inspect_path.format(quote_id(obj_id))) is not None
+            except:
+                return False
         try:
             cmd = ['docker', 'inspect', '--format', '{{.Id}}', obj_id]
             run_command(cmd)
@@ -146,6 +320,15 @@ class Manager:
         if not ids:
             return []
         try:
+            api = get_docker_api()
+            if api and cls.api_inspect_path:
+                # One request per object over pooled keep-alive connections
+                results = []
+                for obj_id in ids:
+                    data = api.inspect(cls.api_inspect_path.format(quote_id(obj_id)))
+                    if data:
+                        results.append(cls(data))
+                return results
             # Inspect multiple IDs at once
             output = run_command(['docker', 'inspect'] + ids)
             data = json.loads(output)
@@ -153,12 +336,56 @@ class Manager:
         except Exception as e:
             return []
 
+    def _api_get(self, obj_id):
+        data = get_docker_api().inspect(self.object_class.api_inspect_path.format(quote_id(obj_id)))
+        return self.object_class(data) if data else None
+
+def _api_container_summary(item):
+    names = item.get('Names') or []
+    return {
+        'Id': item.get('Id'),
+        'Name': names[0].lstrip('/') if names else '',
+        'Status': item.get('State'),
+        'Image': item.get('Image'),
+        'ImageId': item.get('ImageID'),
+    }
+
+def _cli_container_summary(item):
+    # `docker ps --format` has no image ID, Container.image falls back to a full inspect
+    return {
+        'Id': item.get('ID'),
+        'Name': (item.get('Names') or '').split(',')[0],
+        'Status': item.get('State'),
+        'Image': item.get('Image'),
+    }
+
 class ContainerManager(Manager):
-    def list(self, all=False):
-        cmd = ['docker', 'ps', '-q']
-        if all:
-            cmd.append('-a')
+    object_class = Container
+
+    def list(self, all=False, summary=False):
+        """
+        Lists containers. With summary=True, a single listing call provides id, name, status
+        and image; the full inspect of a container runs only when another field is accessed.
+        """
+        state = self._state()
+        if state:
+            return state.list_containers(all=all)
         try:
+            api = get_docker_api()
+            if api:
+                items = api.get_json('/containers/json', params={'all': 1 if all else None})
+                if summary:
+                    return [Container(summary=_api_container_summary(item)) for item in items]
+                return self._inspect_all([item['Id'] for item in items], Container)
+            if summary:
+                cmd = ['docker', 'ps', '--no-trunc', '--format', '{{json .}}']
+                if all:
+                    cmd.append('-a')
+                output = run_command(cmd).decode().strip()
+                return [Container(summary=_cli_container_summary(json.loads(line))) for line in output.splitlines() if line.strip()]
+            cmd = ['docker', 'ps', '-q']
+            if all:
+                cmd.append('-a')
             output = run_command(cmd).decode().strip()
             ids = output.split() if output else []
             return self._inspect_all(ids, Container)
@@ -166,7 +393,14 @@ class ContainerManager(Manager):
             return []
 
     def get(self, container_id):
+        state = self._state()
+        if state:
+            container = state.get_container(container_id)
+            if container:
+                return container
         try:
+            if get_docker_api():
+                return self._api_get(container_id)
             # Try to inspect directly but suppress logs if it fails
             output = run_command(['docker', 'inspect', container_id], log_errors=False)
             if output:
@@ -177,7 +411,50 @@ class ContainerManager(Manager):
             pass
         return None
 
+    def _api_run(self, api, image, **kwargs):
+        config = {'Image': image, 'HostConfig': {}}
+        host_config = config['HostConfig']
+        if kwargs.get('ports'):
+            exposed, bindings = {}, {}
+            for c_port, h_port in kwargs['ports'].items():
+                c_port = str(c_port) if '/' in str(c_port) else f"{c_port}/tcp"
+                host_ip, _, host_port = str(h_port).rpartition(':')
+                exposed[c_port] = {}
+                bindings.setdefault(c_port, []).append({'HostIp': host_ip, 'HostPort': host_port})
+            config['ExposedPorts'] = exposed
+            host_config['PortBindings'] = bindings
+        if kwargs.get('volumes'):
+            host_config['Binds'] = [f"{src}:{cfg['bind']}:{cfg.get('mode', 'rw')}" for src, cfg in kwargs['volumes'].items()]
+        if kwargs.get('network'):
+            host_config['NetworkMode'] = kwargs['network']
+        if kwargs.get('restart_policy'):
+            policy = kwargs['restart_policy'].get('Name')
+            if policy:
+                host_config['RestartPolicy'] = {'Name': policy}
+        if kwargs.get('privileged'):
+            host_config['Privileged'] = True
+        if kwargs.get('environment'):
+            env = kwargs['environment']
+            config['Env'] = list(env) if isinstance(env, list) else [f"{k}={v}" for k, v in env.items()]
+
+        params = {'name': kwargs.get('name')}
+        try:
+            created = api.post_json('/containers/create', params=params, body=config)
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+            # Image is not present locally, pull it like `docker run` does
+            repository, _, tag = image.rpartition(':') if ':' in image.split('/')[-1] else (image, '', 'latest')
+            ImageManager(use_cache=False).pull(repository, tag=tag)
+            created = api.post_json('/containers/create', params=params, body=config)
+        api.post(f"/containers/{created['Id']}/start")
+        return self.get(created['Id'])
+
     def run(self, image, **kwargs):
+        api = get_docker_api()
+        if api:
+            return self._api_run(api, image, **kwargs)
+
         cmd = ['docker', 'run', '-d']
         if kwargs.get('name'):
             cmd.extend(['--name', kwargs['name']])
@@ -209,19 +486,56 @@ class ContainerManager(Manager):
         return self.get(kwargs.get('name') or image)
 
 class ImageManager(Manager):
+    object_class = Image
+
     def list(self):
+        state = self._state()
+        if state:
+            return state.list_images()
         try:
+            api = get_docker_api()
+            if api:
+                summary = api.get_json('/images/json')
+                return self._inspect_all([item['Id'] for item in summary], Image)
             output = run_command(['docker', 'images', '-q']).decode().strip()
             ids = list(set(output.split())) if output else []
             return self._inspect_all(ids, Image)
         except:
             return []
 
+    def get(self, image_id):
+        try:
+            if get_docker_api():
+                return self._api_get(image_id)
+            images = self._inspect_all([image_id], Image)
+            return images[0] if images else None
+        except:
+            return None
+
     def pull(self, repository, tag=None, auth_config=None):
+        api = get_docker_api()
+        if api:
+            headers = {}
+            if auth_config:
+                headers['X-Registry-Auth'] = base64.urlsafe_b64encode(json.dumps(auth_config).encode()).decode()
+            output = api.post('/images/create', params={'fromImage': repository, 'tag': tag or 'latest'}, headers=headers, timeout=600)
+            # Pull errors are reported inside the progress stream with a 200 status
+            for line in output.splitlines():
+                try:
+                    progress = json.loads(line)
+                except ValueError:
+                    continue
+                if progress.get('error'):
+                    raise DockerAPIError(500, f"POST /images/create {repository}", output=progress['error'])
+            return
         image = f"{repository}:{tag}" if tag else repository
         run_command(['docker', 'pull', image])
 
     def remove(self, image_id, force=False):
+        api = get_docker_api()
+        if api:
+            api.delete(f'/images/{quote_id(image_id)}', params={'force': 1 if force else None})
+            return
         cmd = ['docker', 'rmi']
         if force:
             cmd.append('-f')
@@ -229,8 +543,16 @@ class ImageManager(Manager):
         run_command(cmd)
 
 class VolumeManager(Manager):
+    object_class = Volume
+
     def list(self):
+        state = self._state()
+        if state:
+            return state.list_volumes()
         try:
+            api = get_docker_api()
+            if api:
+                return [Volume(item) for item in api.get_json('/volumes').get('Volumes') or []]
             output = run_command(['docker', 'volume', 'ls', '-q']).decode().strip()
             names = output.split() if output else []
             if not names: return []
@@ -241,7 +563,14 @@ class VolumeManager(Manager):
             return []
 
     def get(self, name):
+        state = self._state()
+        if state:
+            volume = state.get_volume(name)
+            if volume:
+                return volume
         try:
+            if get_docker_api():
+                return self._api_get(name)
             output = run_command(['docker', 'volume', 'inspect', name], log_errors=False)
             if output:
                 data = json.loads(output)
@@ -252,11 +581,25 @@ class VolumeManager(Manager):
         return None
 
     def create(self, name, driver='local'):
+        api = get_docker_api()
+        if api:
+            api.post('/volumes/create', body={'Name': name, 'Driver': driver})
+            return
         run_command(['docker', 'volume', 'create', '--name', name, '--driver', driver])
 
 class NetworkManager(Manager):
+    object_class = Network
+
     def list(self):
+        state = self._state()
+        if state:
+            return state.list_networks()
         try:
+            api = get_docker_api()
+            if api:
+                # The list endpoint omits attached containers, inspect each network for full data
+                summary = api.get_json('/networks')
+                return self._inspect_all([item['Id'] for item in summary], Network)
             output = run_command(['docker', 'network', 'ls', '-q']).decode().strip()
             ids = output.split() if output else []
             return self._inspect_all(ids, Network)
@@ -264,7 +607,14 @@ class NetworkManager(Manager):
             return []
 
     def get(self, network_id):
+        state = self._state()
+        if state:
+            network = state.get_network(network_id)
+            if network:
+                return network
         try:
+            if get_docker_api():
+                return self._api_get(network_id)
             output = run_command(['docker', 'network', 'inspect', network_id], log_errors=False)
             if output:
                 data = json.loads(output)
@@ -275,4 +625,8 @@ class NetworkManager(Manager):
         return None
 
     def create(self, name, driver='bridge'):
+        api = get_docker_api()
+        if api:
+            api.post('/networks/create', body={'Name': name, 'Driver': driver})
+            return
         run_command(['docker', 'network', 'create', '--driver', driver, name])
@@ -0,0 +1,238 @@
+import json
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from .docker_api import get_docker_api
+from .docker_cli_wrapper import DockerCLI
+
+logger = logging.getLogger(__name__)
+
+# Container actions that do not change inspect data
+IGNORED_CONTAINER_ACTIONS = {
+    'exec_create', 'exec_start', 'exec_die', 'exec_detach', 'attach', 'detach',
+    'resize', 'top', 'commit', 'copy', 'archive-path', 'extract-to-dir', 'export',
+}
+
+class DockerStateCache:
+    """
+    In-process cache of containers, images, volumes and networks kept current by the
+    Docker events stream. A full resync happens only when the stream (re)connects;
+    in between, each event re-inspects or drops just the object it names.
+    """
+    def __init__(self):
+        self.containers = {}
+        self.images = {}
+        self.volumes = {}
+        self.networks = {}
+        self._container_names = {}
+        self.lock = threading.Lock()
+        self.synced = False
+        self.keep_running = False
+        self.thread = None
+        self.client = DockerCLI(use_cache=False)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return True
+        if not get_docker_api() and not shutil.which('docker'):
+            logger.info("Docker is not available, state cache not started")
+            return False
+        self.keep_running = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name="SolsticeOpsDockerEvents")
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.keep_running = False
+        self.synced = False
+
+    def run(self):
+        backoff = 1
+        while self.keep_running:
+            # Events since the resync started are replayed by the daemon, so nothing is missed
+            since = int(time.time())
+            try:
+                self.resync()
+                backoff = 1
+                for line in self._events(since):
+                    if not self.keep_running:
+                        break
+                    try:
+                        self.apply_event(json.loads(line))
+                    except Exception as e:
+                        logger.warning(f"Failed to apply Docker event: {e}")
+            except Exception as e:
+                logger.warning(f"Docker events stream error: {e}")
+            self.synced = False
+            if self.keep_running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _events(self, since):
+        api = get_docker_api()
+        if api:
+            yield from api.stream('GET', '/events', params={'since': since})
+            return
+        process = subprocess.Popen(
+            ['docker', 'events', '--format', '{{json .}}', '--since', str(since)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            for line in process.stdout:
+                if line.strip():
+                    yield line
+        finally:
+            process.terminate()
+
+    def resync(self):
+        # Held objects keep only their hot fields decoded, see DockerObject.compact
+        containers = [c.compact() for c in self.client.containers.list(all=True)]
+        images = [i.compact() for i in self.client.images.list()]
+        volumes = [v.compact() for v in self.client.volumes.list()]
+        networks = [n.compact() for n in self.client.networks.list()]
+        with self.lock:
+            self.containers = {c.id: c for c in containers}
+            self._container_names = {c.name: c.id for c in containers}
+            self.images = {i.id: i for i in images}
+            self.volumes = {v.name: v for v in volumes}
+            self.networks = {n.id: n for n in networks}
+            self.synced = True
+        logger.debug(f"Docker state resynced: {len(containers)} containers, {len(images)} images")
+
+    def apply_event(self, event):
+        obj_type = event.get('Type')
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        actor = event.get('Actor') or {}
+        obj_id = actor.get('ID') or event.get('id')
+        if not obj_id:
+            return
+
+        if obj_type == 'container':
+            if action in IGNORED_CONTAINER_ACTIONS:
+                return
+            if action == 'destroy':
+                self._drop_container(obj_id)
+            else:
+                self.refresh_container(obj_id)
+        elif obj_type == 'image':
+            if action == 'delete':
+                with self.lock:
+                    self.images.pop(obj_id, None)
+            else:
+                self.refresh_image(obj_id)
+        elif obj_type == 'volume':
+            if action == 'destroy':
+                with self.lock:
+                    self.volumes.pop(obj_id, None)
+            elif action == 'create':
+                self.refresh_volume(obj_id)
+        elif obj_type == 'network':
+            if action in ('destroy', 'remove'):
+                with self.lock:
+                    self.networks.pop(obj_id, None)
+            else:
+                self.refresh_network(obj_id)
+                # Attached containers carry their own copy of network settings
+                container_id = (actor.get('Attributes') or {}).get('container')
+                if container_id:
+                    self.refresh_container(container_id)
+
+    def _drop_container(self, container_id):
+        with self.lock:
+            container = self.containers.pop(container_id, None)
+            if container and self._container_names.get(container.name) == container_id:
+                del self._container_names[container.name]
+
+    def refresh_container(self, container_id):
+        container = self.client.containers.get(container_id)
+        if not container:
+            self._drop_container(container_id)
+            return
+        container.compact()
+        with self.lock:
+            old = self.containers.get(container.id)
+            if old and old.name != container.name:
+                self._container_names.pop(old.name, None)
+            self.containers[container.id] = container
+            self._container_names[container.name] = container.id
+
+    def refresh_image(self, image_ref):
+        image = self.client.images.get(image_ref)
+        with self.lock:
+            if not image:
+                self.images.pop(image_ref, None)
+                return
+            image.compact()
+            self.images[image.id] = image
+            # A tag moved to this image is no longer on the one that had it
+            stale = [i.id for i in self.images.values() if i.id != image.id and set(i.tags or []) & set(image.tags or [])]
+        for image_id in stale:
+            self.refresh_image(image_id)
+
+    def refresh_volume(self, name):
+        volume = self.client.volumes.get(name)
+        with self.lock:
+            if volume:
+                self.volumes[volume.name] = volume.compact()
+            else:
+                self.volumes.pop(name, None)
+
+    def refresh_network(self, network_id):
+        network = self.client.networks.get(network_id)
+        with self.lock:
+            if network:
+                self.networks[network.id] = network.compact()
+            else:
+                self.networks.pop(network_id, None)
+
+    def list_containers(self, all=False):
+        with self.lock:
+            containers = list(self.containers.values())
+        if all:
+            return containers
+        return [c for c in containers if c.running]
+
+    def get_container(self, ref):
+        """Looks a container up by ID, name or unique ID prefix, like `docker inspect`."""
+        if not ref:
+            return None
+        with self.lock:
+            if ref in self.containers:
+                return self.containers[ref]
+            container_id = self._container_names.get(ref.lstrip('/'))
+            if container_id:
+                return self.containers.get(container_id)
+            matches = [c for cid, c in self.containers.items() if cid.startswith(ref)]
+        return matches[0] if len(matches) == 1 else None
+
+    def list_images(self):
+        with self.lock:
+            return list(self.images.values())
+
+    def list_volumes(self):
+        with self.lock:
+            return list(self.volumes.values())
+
+    def get_volume(self, name):
+        with self.lock:
+            return self.volumes.get(name)
+
+    def list_networks(self):
+        with self.lock:
+            return list(self.networks.values())
+
+    def get_network(self, ref):
+        if not ref:
+            return None
+        with self.lock:
+            if ref in self.networks:
+                return self.networks[ref]
+            for network in self.networks.values():
+                if network.name == ref:
+                    return network
+            matches = [n for nid, n in self.networks.items() if nid.startswith(ref)]
+        return matches[0] if len(matches) == 1 else None
+
+docker_state = DockerStateCache()
@@ -0,0 +1,133 @@
+import http.client
+import json
+import queue
+from urllib.parse import urlencode
+from .deadlines import job_time_left
+
+class ConnectionPool:
+    """
+    Small pool of keep-alive HTTP connections shared by the API clients.
+    Subclasses provide _new_connection(timeout) and may override _raise_for_status.
+    """
+    def __init__(self, pool_size=4, timeout=30):
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self, timeout):
+        raise NotImplementedError()
+
+    def _default_headers(self):
+        return {}
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(self.timeout), False
+
+    def _release(self, conn):
+        if conn.sock is not None:
+            conn.sock.settimeout(self.timeout)
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _build_url(self, path, params=None):
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+            if params:
+                return f"{path}?{urlencode(params)}"
+        return path
+
+    def request(self, method, path, params=None, body=None, headers=None, timeout=None, content_type='application/json'):
+        """Performs a request and returns (status, body bytes). Retries once on a stale pooled connection."""
+        url = self._build_url(path, params)
+        headers = {**self._default_headers(), **(headers or {})}
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = content_type
+
+        # Background jobs only wait for what is left of their own timeout
+        timeout = job_time_left(self.timeout if timeout is None else timeout)
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # Idle keep-alive connections may have been closed by the server
+                if reused and attempt == 0:
+                    continue
+                raise
+            except:
+                conn.close()
+                raise
+            finally:
+                conn.timeout = self.timeout
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, data
+
+    def _raise_for_status(self, method, path, status, data):
+        raise NotImplementedError()
+
+    def _check(self, method, path, status, data):
+        if status >= 400:
+            self._raise_for_status(method, path, status, data)
+        return data
+
+    def get(self, path, params=None, timeout=None):
+        status, data = self.request('GET', path, params=params, timeout=timeout)
+        return self._check('GET', path, status, data)
+
+    def get_json(self, path, params=None, timeout=None):
+        return json.loads(self.get(path, params=params, timeout=timeout))
+
+    def post(self, path, params=None, body=None, headers=None, timeout=None):
+        status, data = self.request('POST', path, params=params, body=body, headers=headers, timeout=timeout)
+        return self._check('POST', path, status, data)
+
+    def post_json(self, path, params=None, body=None, headers=None, timeout=None):
+        data = self.post(path, params=params, body=body, headers=headers, timeout=timeout)
+        return json.loads(data) if data else {}
+
+    def patch(self, path, body, content_type='application/merge-patch+json', timeout=None):
+        status, data = self.request('PATCH', path, body=body, timeout=timeout, content_type=content_type)
+        return self._check('PATCH', path, status, data)
+
+    def delete(self, path, params=None, timeout=None):
+        status, data = self.request('DELETE', path, params=params, timeout=timeout)
+        return self._check('DELETE', path, status, data)
+
+    def stream(self, method, path, params=None, timeout=None):
+        """Yields the lines of a streaming response read over a dedicated, unpooled connection."""
+        conn = self._new_connection(timeout)
+        try:
+            conn.request(method, self._build_url(path, params), headers=self._default_headers())
+            response = conn.getresponse()
+            if response.status >= 400:
+                self._check(method, path, response.status, response.read())
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield line
+        finally:
+            conn.close()
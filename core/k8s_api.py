@@ -0,0 +1,261 @@
+import base64
+import http.client
+import json
+import logging
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+from django.conf import settings
+from .http_pool import ConnectionPool
+from .k8s_config import file_signature, kubeconfigs
+from .utils import run_command
+
+logger = logging.getLogger(__name__)
+
+# kubectl resource name -> (API group path, plural, namespaced)
+RESOURCES = {
+    'pod': ('/api/v1', 'pods', True),
+    'service': ('/api/v1', 'services', True),
+    'configmap': ('/api/v1', 'configmaps', True),
+    'secret': ('/api/v1', 'secrets', True),
+    'event': ('/api/v1', 'events', True),
+    'node': ('/api/v1', 'nodes', False),
+    'namespace': ('/api/v1', 'namespaces', False),
+    'deployment': ('/apis/apps/v1', 'deployments', True),
+}
+
+class K8sAPIError(subprocess.CalledProcessError):
+    """
+    Raised when the API server returns an error.
+    Subclasses CalledProcessError so callers written against kubectl keep working.
+    """
+    def __init__(self, status, request, output=b''):
+        if isinstance(output, str):
+            output = output.encode()
+        super().__init__(status, request, output=output)
+        self.status = status
+
+    def __str__(self):
+        message = self.output.decode(errors='replace').strip() if self.output else ''
+        return f"Kubernetes API request '{self.cmd}' failed with status {self.returncode}: {message}"
+
+class UnsupportedKubeconfig(Exception):
+    """The kubeconfig uses an auth method only kubectl can handle (exec plugins, auth providers)."""
+
+def _named(entries, name):
+    for entry in entries or []:
+        if entry.get('name') == name:
+            return entry
+    return {}
+
+def context_namespace(kubeconfig, context=None):
+    """Returns the namespace kubectl defaults to for the context."""
+    context_cfg = _named((kubeconfig or {}).get('contexts'), context or (kubeconfig or {}).get('current-context'))
+    return context_cfg.get('context', {}).get('namespace') or 'default'
+
+def resource_path(resource_type, namespace=None, name=None, all_namespaces=False, default_namespace='default'):
+    """Builds the REST path for a resource type known in RESOURCES."""
+    group, plural, namespaced = RESOURCES[resource_type]
+    path = group
+    if namespaced and not all_namespaces:
+        path += f"/namespaces/{quote(namespace or default_namespace, safe='')}"
+    path += f"/{plural}"
+    if name:
+        path += f"/{quote(name, safe='')}"
+    return path
+
+def list_params(label_selector=None, field_selector=None, limit=None, continue_token=None):
+    return {
+        'labelSelector': label_selector or None,
+        'fieldSelector': field_selector or None,
+        'limit': limit or None,
+        'continue': continue_token or None,
+    }
+
+class KubeAPI(ConnectionPool):
+    """
+    Kubernetes REST client built from a parsed kubeconfig. TLS and credentials are set up
+    once and reused by a pool of keep-alive connections to the API server.
+    """
+    def __init__(self, kubeconfig, context=None, pool_size=4, timeout=30):
+        super().__init__(pool_size=pool_size, timeout=timeout)
+        self.context_name = context or kubeconfig.get('current-context')
+        context_cfg = _named(kubeconfig.get('contexts'), self.context_name).get('context', {})
+        cluster = _named(kubeconfig.get('clusters'), context_cfg.get('cluster')).get('cluster', {})
+        user = _named(kubeconfig.get('users'), context_cfg.get('user')).get('user', {})
+        if not cluster.get('server'):
+            raise UnsupportedKubeconfig(f"Context '{self.context_name}' has no cluster server")
+        if user.get('exec') or user.get('auth-provider'):
+            raise UnsupportedKubeconfig("Exec and auth-provider credentials require kubectl")
+
+        self.namespace = context_namespace(kubeconfig, self.context_name)
+        url = urlsplit(cluster['server'])
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip('/')
+
+        self.token = user.get('token')
+        if not self.token and user.get('tokenFile'):
+            with open(user['tokenFile']) as f:
+                self.token = f.read().strip()
+        self.basic_auth = None
+        if user.get('username') and user.get('password'):
+            self.basic_auth = base64.b64encode(f"{user['username']}:{user['password']}".encode()).decode()
+        self.ssl_context = self._build_ssl_context(cluster, user) if self.scheme == 'https' else None
+
+    def _build_ssl_context(self, cluster, user):
+        ctx = ssl.create_default_context()
+        if cluster.get('insecure-skip-tls-verify'):
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        elif cluster.get('certificate-authority-data'):
+            ctx.load_verify_locations(cadata=base64.b64decode(cluster['certificate-authority-data']).decode())
+        elif cluster.get('certificate-authority'):
+            ctx.load_verify_locations(cafile=cluster['certificate-authority'])
+
+        if user.get('client-certificate-data') and user.get('client-key-data'):
+            # ssl can only load client certificates from files
+            with tempfile.TemporaryDirectory() as tmp:
+                cert_path = os.path.join(tmp, 'client.crt')
+                key_path = os.path.join(tmp, 'client.key')
+                for path, key in ((cert_path, 'client-certificate-data'), (key_path, 'client-key-data')):
+                    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(base64.b64decode(user[key]))
+                ctx.load_cert_chain(cert_path, key_path)
+        elif user.get('client-certificate') and user.get('client-key'):
+            ctx.load_cert_chain(user['client-certificate'], user['client-key'])
+        return ctx
+
+    def _new_connection(self, timeout):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _default_headers(self):
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        elif self.basic_auth:
+            headers['Authorization'] = f"Basic {self.basic_auth}"
+        return headers
+
+    def _build_url(self, path, params=None):
+        return self.base_path + super()._build_url(path, params)
+
+    def _raise_for_status(self, method, path, status, data):
+        try:
+            message = json.loads(data).get('message', '')
+        except:
+            message = data.decode(errors='replace')
+        raise K8sAPIError(status, f"{method} {path}", output=message)
+
+    def supports(self, resource_type):
+        return resource_type in RESOURCES
+
+    def resource_path(self, resource_type, namespace=None, name=None, all_namespaces=False):
+        # Same default as kubectl: the context namespace
+        return resource_path(resource_type, namespace, name, all_namespaces, default_namespace=self.namespace)
+
+    def list(self, resource_type, namespace=None, all_namespaces=False, params=None):
+        """Returns the raw list object, with kind and apiVersion filled in on items like kubectl does."""
+        data = self.get_json(self.resource_path(resource_type, namespace, all_namespaces=all_namespaces), params=params)
+        kind = (data.get('kind') or '').removesuffix('List')
+        for item in data.get('items') or []:
+            item.setdefault('kind', kind)
+            item.setdefault('apiVersion', data.get('apiVersion'))
+        return data
+
+    def get_object(self, resource_type, name, namespace=None):
+        try:
+            return self.get_json(self.resource_path(resource_type, namespace, name))
+        except K8sAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def delete_object(self, resource_type, name, namespace=None):
+        self.delete(self.resource_path(resource_type, namespace, name))
+
+    def scale(self, resource_type, name, replicas, namespace=None):
+        self.patch(self.resource_path(resource_type, namespace, name) + '/scale', {'spec': {'replicas': int(replicas)}})
+
+    def rollout_restart(self, resource_type, name, namespace=None):
+        # What `kubectl rollout restart` does: bump a pod template annotation
+        restarted_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        body = {'spec': {'template': {'metadata': {'annotations': {'kubectl.kubernetes.io/restartedAt': restarted_at}}}}}
+        self.patch(self.resource_path(resource_type, namespace, name), body, content_type='application/strategic-merge-patch+json')
+
+    def pod_logs(self, name, namespace=None, tail=None, timestamps=False):
+        params = {'tailLines': tail or None, 'timestamps': 'true' if timestamps else None}
+        return self.get(self.resource_path('pod', namespace, name) + '/log', params=params)
+
+    def version(self):
+        return self.get_json('/version')
+
+    def watch(self, resource_type, namespace=None, all_namespaces=False, resource_version=None, timeout_seconds=300):
+        """Yields decoded watch events until the server closes the watch after timeout_seconds."""
+        params = {
+            'watch': 1,
+            'resourceVersion': resource_version,
+            'allowWatchBookmarks': 'true',
+            'timeoutSeconds': timeout_seconds,
+        }
+        path = self.resource_path(resource_type, namespace, all_namespaces=all_namespaces)
+        for line in self.stream('GET', path, params=params, timeout=timeout_seconds + 30):
+            yield json.loads(line)
+
+_kubeconfigs = {}
+_clients = {}
+_lock = threading.Lock()
+
+def load_kubeconfig(path):
+    """Returns the kubeconfig at path as a dict, resolved by kubectl once per file version."""
+    version = file_signature(path)
+    if version is None:
+        return None
+    with _lock:
+        cached = _kubeconfigs.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+    config = None
+    try:
+        config = json.loads(run_command(['kubectl', 'config', 'view', '--raw', '-o', 'json'], env=kubeconfigs.env(path), timeout=10, log_errors=False))
+    except Exception as e:
+        logger.debug(f"Could not load kubeconfig {path}: {e}")
+    with _lock:
+        _kubeconfigs[path] = (version, config)
+    return config
+
+def get_k8s_api(kubeconfig_path, context=None):
+    """
+    Returns a pooled REST client for the kubeconfig, or None when kubectl should be used.
+    Controlled by settings.K8S_TRANSPORT ('auto' or 'api' use the REST client when the
+    kubeconfig allows it, 'cli' always forks kubectl).
+    """
+    if getattr(settings, 'K8S_TRANSPORT', 'auto') == 'cli' or not kubeconfig_path:
+        return None
+    version = file_signature(kubeconfig_path)
+    key = (kubeconfig_path, context)
+    with _lock:
+        cached = _clients.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    config = load_kubeconfig(kubeconfig_path)
+    client = None
+    if config:
+        try:
+            client = KubeAPI(config, context=context)
+        except Exception as e:
+            logger.info(f"Using kubectl for {kubeconfig_path}: {e}")
+    with _lock:
+        old = _clients.get(key)
+        if old and old[1]:
+            old[1].close()
+        _clients[key] = (version, client)
+    return client
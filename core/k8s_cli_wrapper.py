@@ -1,39 +1,81 @@
+import hashlib
 import json
 import logging
-import os
+from urllib.parse import urlencode
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from .utils import run_command
+from .k8s_api import RESOURCES, get_k8s_api, load_kubeconfig, context_namespace, resource_path, list_params
+from .k8s_config import get_kubeconfig, kubeconfigs
+from .k8s_informer import informers
 
 logger = logging.getLogger(__name__)
 
-def get_kubeconfig():
-    """Returns the path to the kubeconfig file if it exists and is accessible by the current process."""
-    paths = [
-        '/etc/kubernetes/admin.conf',
-        '/etc/rancher/k3s/k3s.yaml',
-        '/var/snap/microk8s/current/credentials/client.config',
-        os.path.expanduser('~/.kube/config'),
-        '/root/.kube/config'
-    ]
-    for p in paths:
-        if os.path.exists(p) and os.access(p, os.R_OK) and os.path.getsize(p) > 0:
-            return p
-    return None
+def kubectl_command(context, *args):
+    """Builds a kubectl command line, selecting the named kubeconfig context if given."""
+    cmd = ['kubectl']
+    if context:
+        cmd.extend(['--context', context])
+    cmd.extend(args)
+    return cmd
+
+# snake_case attribute -> camelCase key, filled on first use
+_camel_names = {
+    'cluster_ip': 'clusterIP', 'cluster_ips': 'clusterIPs', 'external_ips': 'externalIPs',
+    'pod_ip': 'podIP', 'pod_ips': 'podIPs', 'host_ip': 'hostIP', 'host_ips': 'hostIPs',
+    'target_port': 'targetPort',
+}
+
+def to_camel(snake_str):
+    camel = _camel_names.get(snake_str)
+    if camel is None:
+        components = snake_str.split('_')
+        camel = _camel_names[snake_str] = components[0] + ''.join(x.title() for x in components[1:])
+    return camel
+
+_MISSING = object()
 
 class K8sObject:
+    """
+    Attribute access over a Kubernetes API object. Resolved attributes (camelCase lookup,
+    timestamp parsing, wrapping of nested dicts) are memoized per instance, so the
+    wrapped data must not be modified after construction.
+    """
+    __slots__ = ('attrs', 'kube_context', '_resolved')
+
     def __init__(self, attrs):
         self.attrs = attrs
+        # kubeconfig context the object was read from, None for the current context
+        self.kube_context = None
+        self._resolved = None
+
+    def __getstate__(self):
+        return (self.attrs, self.kube_context)
+
+    def __setstate__(self, state):
+        self.attrs, self.kube_context = state
+        self._resolved = None
 
     def _to_camel(self, snake_str):
-        if snake_str == 'cluster_ip': return 'clusterIP'
-        if snake_str == 'target_port': return 'targetPort'
-        components = snake_str.split('_')
-        return components[0] + ''.join(x.title() for x in components[1:])
+        return to_camel(snake_str)
 
     def __getattr__(self, item):
         try:
-            attrs = object.__getattribute__(self, 'attrs')
+            resolved = object.__getattribute__(self, '_resolved')
         except AttributeError:
             raise AttributeError(item)
+        if resolved is None:
+            resolved = self._resolved = {}
+
+        val = resolved.get(item, _MISSING)
+        if val is _MISSING:
+            val = resolved[item] = self._resolve(item)
+        if val is _MISSING:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}'")
+        return val
+
+    def _resolve(self, item):
+        attrs = self.attrs
 
         # Special mappings for common fields
         if item == 'name':
@@ -45,7 +87,6 @@ class K8sObject:
         if item == 'creation_timestamp':
             ts = attrs.get('creationTimestamp') or attrs.get('metadata', {}).get('creationTimestamp')
             if ts:
-                from django.utils.dateparse import parse_datetime
                 dt = parse_datetime(ts)
                 if dt: return dt
         if item == 'replicas':
@@ -54,15 +95,12 @@ class K8sObject:
         val = None
         if item in attrs:
             val = attrs[item]
-        else:
-            camel_item = self._to_camel(item)
-            if camel_item in attrs:
-                val = attrs[camel_item]
+        elif not item.startswith('__'):
+            val = attrs.get(to_camel(item))
 
         if val is not None:
             # Handle timestamps
             if isinstance(val, str) and (item.endswith('_timestamp') or item.endswith('Timestamp') or item == 'creationTimestamp'):
-                from django.utils.dateparse import parse_datetime
                 dt = parse_datetime(val)
                 if dt: return dt
             
@@ -72,7 +110,7 @@ class K8sObject:
                 return [K8sObject(x) if isinstance(x, dict) else x for x in val]
             return val
             
-        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}'")
+        return _MISSING
 
     def __getitem__(self, key):
         try:
@@ -86,162 +124,307 @@ class K8sObject:
             raise KeyError(key)
 
 class Pod(K8sObject):
+    __slots__ = ()
+
     def logs(self, tail=None, timestamps=False):
-        cmd = ['kubectl', 'logs', self.name]
+        api = get_k8s_api(get_kubeconfig(), self.kube_context)
+        if api:
+            return api.pod_logs(self.name, self.namespace, tail=tail, timestamps=timestamps)
+        cmd = kubectl_command(self.kube_context, 'logs', self.name)
         if self.namespace:
             cmd.extend(['-n', self.namespace])
         if tail:
             cmd.extend(['--tail', str(tail)])
         if timestamps:
             cmd.append('--timestamps')
-        
-        env = os.environ.copy()
-        kconfig = get_kubeconfig()
-        if kconfig:
-            env['KUBECONFIG'] = kconfig
-        return run_command(cmd, env=env)
+        return run_command(cmd, env=kubeconfigs.env(get_kubeconfig()))
 
 class Deployment(K8sObject):
-    pass
+    __slots__ = ()
 
 class Service(K8sObject):
-    pass
+    __slots__ = ()
 
 class Node(K8sObject):
-    pass
+    __slots__ = ()
 
 class ConfigMap(K8sObject):
-    pass
+    __slots__ = ()
 
 class Secret(K8sObject):
-    pass
+    __slots__ = ()
 
 class Event(K8sObject):
-    pass
+    __slots__ = ()
+
+class K8sList(list):
+    """List of objects plus the API server's chunking metadata."""
+    def __init__(self, items=(), continue_token=None, remaining_item_count=None):
+        super().__init__(items)
+        self.continue_token = continue_token
+        self.remaining_item_count = remaining_item_count
+
+class K8sPagedSource:
+    """
+    Lazily paged list for core.utils.paginate_list: each page is one limit/continue request
+    to the API server instead of a full list sliced in Python.
+    """
+    def __init__(self, manager, namespace=None, all_namespaces=False, label_selector=None, field_selector=None):
+        self.manager = manager
+        self.namespace = namespace
+        self.all_namespaces = all_namespaces
+        self.label_selector = label_selector
+        self.field_selector = field_selector
+
+    @property
+    def cache_key(self):
+        scope = repr((get_kubeconfig(), self.manager.context, self.manager.resource_type, self.namespace, self.all_namespaces,
+                      self.label_selector, self.field_selector))
+        return f"k8s_pages_{hashlib.md5(scope.encode()).hexdigest()}"
+
+    def supports_paging(self):
+        return self.manager._api() is not None or self.manager.resource_type in RESOURCES
+
+    def fetch_page(self, limit, continue_token=None):
+        return self.manager._list(self.namespace, self.all_namespaces, self.label_selector, self.field_selector,
+                                  limit=limit, continue_token=continue_token)
+
+    def fetch_all(self):
+        return self.manager.list(self.namespace, self.all_namespaces, self.label_selector, self.field_selector)
+
+    def is_expired(self, error):
+        """True for the 410 Gone the server returns once a continue token is too old."""
+        output = getattr(error, 'output', None) or b''
+        return getattr(error, 'status', None) == 410 or b'Expired' in output
 
 class Manager:
-    def __init__(self, resource_type, cls):
+    def __init__(self, resource_type, cls, context=None):
         self.resource_type = resource_type
         self.cls = cls
+        self.context = context
 
     def _get_env(self):
-        env = os.environ.copy()
-        kconfig = get_kubeconfig()
-        if kconfig:
-            env['KUBECONFIG'] = kconfig
-        return env
+        return kubeconfigs.env(get_kubeconfig())
+
+    def _kubectl(self, *args):
+        return kubectl_command(self.context, *args)
+
+    def _wrap(self, data):
+        obj = self.cls(data)
+        if self.context:
+            obj.kube_context = self.context
+        return obj
+
+    def _api(self):
+        """Returns the REST client when it can serve this resource type, otherwise None."""
+        api = get_k8s_api(get_kubeconfig(), self.context)
+        if api and api.supports(self.resource_type):
+            return api
+        return None
+
+    def list(self, namespace=None, all_namespaces=False, label_selector=None, field_selector=None,
+             limit=None, continue_token=None):
+        """
+        Lists objects as a K8sList. Label and field selectors are evaluated by the API server;
+        with limit, a single chunk is returned and its continue_token fetches the next one.
+        """
+        try:
+            return self._list(namespace, all_namespaces, label_selector, field_selector, limit, continue_token)
+        except:
+            return K8sList()
+
+    def _list(self, namespace=None, all_namespaces=False, label_selector=None, field_selector=None,
+              limit=None, continue_token=None):
+        filtered = label_selector or field_selector or limit or continue_token
+        if getattr(settings, 'K8S_WATCH_CACHE', False) and not filtered and self.resource_type in RESOURCES:
+            # Served from memory once the watch for this type and namespace has synced
+            informer = informers.get(self.resource_type, self._wrap, self._get_env, self._api, namespace=namespace,
+                                     all_namespaces=all_namespaces, context=self.context)
+            if informer.synced:
+                return K8sList(informer.items())
+
+        params = list_params(label_selector, field_selector, limit, continue_token)
+        api = self._api()
+        if api:
+            return self._wrap_list(api.list(self.resource_type, namespace, all_namespaces=all_namespaces, params=params))
+
+        if (limit or continue_token) and self.resource_type in RESOURCES:
+            # kubectl cannot return a single chunk from `get`, but it can relay the raw API call
+            kconfig = get_kubeconfig()
+            default_namespace = context_namespace(load_kubeconfig(kconfig) if kconfig else None, self.context)
+            path = resource_path(self.resource_type, namespace, all_namespaces=all_namespaces, default_namespace=default_namespace)
+            query = urlencode({k: v for k, v in params.items() if v is not None})
+            output = run_command(self._kubectl('get', '--raw', f"{path}?{query}"), env=self._get_env(), timeout=10)
+            return self._wrap_list(json.loads(output))
 
-    def list(self, namespace=None, all_namespaces=False):
-        cmd = ['kubectl', 'get', self.resource_type, '-o', 'json']
+        cmd = self._kubectl('get', self.resource_type, '-o', 'json')
         if all_namespaces:
             cmd.append('-A')
         elif namespace:
             cmd.extend(['-n', namespace])
-        
-        try:
-            output = run_command(cmd, env=self._get_env(), timeout=10)
-            data = json.loads(output)
-            return [self.cls(item) for item in data.get('items', [])]
-        except:
-            return []
+        if label_selector:
+            cmd.extend(['-l', label_selector])
+        if field_selector:
+            cmd.extend(['--field-selector', field_selector])
+
+        output = run_command(cmd, env=self._get_env(), timeout=10)
+        return self._wrap_list(json.loads(output))
+
+    def _wrap_list(self, data):
+        metadata = data.get('metadata') or {}
+        return K8sList(
+            [self._wrap(item) for item in data.get('items') or []],
+            continue_token=metadata.get('continue') or None,
+            remaining_item_count=metadata.get('remainingItemCount'),
+        )
+
+    def paged(self, namespace=None, all_namespaces=False, label_selector=None, field_selector=None):
+        """Returns a source core.utils.paginate_list can page through on the server."""
+        return K8sPagedSource(self, namespace, all_namespaces, label_selector, field_selector)
 
     def get(self, name, namespace=None):
-        cmd = ['kubectl', 'get', self.resource_type, name, '-o', 'json']
+        if getattr(settings, 'K8S_WATCH_CACHE', False):
+            informer = informers.find(self.resource_type, namespace, context=self.context)
+            if informer:
+                obj = informer.get(name, namespace)
+                if obj:
+                    return obj
+
+        api = self._api()
+        if api:
+            try:
+                data = api.get_object(self.resource_type, name, namespace)
+                return self._wrap(data) if data else None
+            except:
+                return None
+
+        cmd = self._kubectl('get', self.resource_type, name, '-o', 'json')
         if namespace:
             cmd.extend(['-n', namespace])
         try:
             output = run_command(cmd, env=self._get_env(), log_errors=False, timeout=10)
             if output:
-                return self.cls(json.loads(output))
+                return self._wrap(json.loads(output))
         except:
             pass
         return None
 
     def delete(self, name, namespace=None):
-        cmd = ['kubectl', 'delete', self.resource_type, name]
+        api = self._api()
+        if api:
+            api.delete_object(self.resource_type, name, namespace)
+            return
+        cmd = self._kubectl('delete', self.resource_type, name)
         if namespace:
             cmd.extend(['-n', namespace])
         run_command(cmd, env=self._get_env())
 
 class PodManager(Manager):
-    def __init__(self):
-        super().__init__('pod', Pod)
+    def __init__(self, context=None):
+        super().__init__('pod', Pod, context=context)
 
 class DeploymentManager(Manager):
-    def __init__(self):
-        super().__init__('deployment', Deployment)
+    def __init__(self, context=None):
+        super().__init__('deployment', Deployment, context=context)
     
     def scale(self, name, replicas, namespace=None):
-        cmd = ['kubectl', 'scale', 'deployment', name, f'--replicas={replicas}']
+        api = self._api()
+        if api:
+            api.scale(self.resource_type, name, replicas, namespace)
+            return
+        cmd = self._kubectl('scale', 'deployment', name, f'--replicas={replicas}')
         if namespace:
             cmd.extend(['-n', namespace])
         run_command(cmd, env=self._get_env())
 
     def restart(self, name, namespace=None):
-        cmd = ['kubectl', 'rollout', 'restart', 'deployment', name]
+        api = self._api()
+        if api:
+            api.rollout_restart(self.resource_type, name, namespace)
+            return
+        cmd = self._kubectl('rollout', 'restart', 'deployment', name)
         if namespace:
             cmd.extend(['-n', namespace])
         run_command(cmd, env=self._get_env())
 
 class ServiceManager(Manager):
-    def __init__(self):
-        super().__init__('service', Service)
+    def __init__(self, context=None):
+        super().__init__('service', Service, context=context)
 
 class NodeManager(Manager):
-    def __init__(self):
-        super().__init__('node', Node)
+    def __init__(self, context=None):
+        super().__init__('node', Node, context=context)
 
 class ConfigMapManager(Manager):
-    def __init__(self):
-        super().__init__('configmap', ConfigMap)
+    def __init__(self, context=None):
+        super().__init__('configmap', ConfigMap, context=context)
 
 class SecretManager(Manager):
-    def __init__(self):
-        super().__init__('secret', Secret)
+    def __init__(self, context=None):
+        super().__init__('secret', Secret, context=context)
 
 class EventManager(Manager):
-    def __init__(self):
-        super().__init__('event', Event)
+    def __init__(self, context=None):
+        super().__init__('event', Event, context=context)
 
 class K8sCLI:
-    def __init__(self):
-        self.pods = PodManager()
-        self.deployments = DeploymentManager()
-        self.services = ServiceManager()
-        self.nodes = NodeManager()
-        self.configmaps = ConfigMapManager()
-        self.secrets = SecretManager()
-        self.events = EventManager()
+    def __init__(self, context=None):
+        """context selects a named kubeconfig context; None uses the current one."""
+        self.context = context
+        self.pods = PodManager(context)
+        self.deployments = DeploymentManager(context)
+        self.services = ServiceManager(context)
+        self.nodes = NodeManager(context)
+        self.configmaps = ConfigMapManager(context)
+        self.secrets = SecretManager(context)
+        self.events = EventManager(context)
+
+    def _api(self):
+        return get_k8s_api(get_kubeconfig(), self.context)
+
+    def _run(self, *args):
+        return run_command(kubectl_command(self.context, *args), env=kubeconfigs.env(get_kubeconfig()), timeout=5)
 
     def info(self):
         try:
-            env = os.environ.copy()
-            kconfig = get_kubeconfig()
-            if kconfig:
-                env['KUBECONFIG'] = kconfig
-            output = run_command(['kubectl', 'version', '-o', 'json'], env=env, timeout=5)
+            api = self._api()
+            if api:
+                # kubectl reports the server under serverVersion; there is no client here
+                return {'serverVersion': api.version()}
+            output = self._run('version', '-o', 'json')
             return json.loads(output)
         except:
             return {}
 
     def get_context(self):
         try:
-            env = os.environ.copy()
-            kconfig = get_kubeconfig()
-            if kconfig:
-                env['KUBECONFIG'] = kconfig
-            output = run_command(['kubectl', 'config', 'current-context'], env=env, timeout=5)
+            api = self._api()
+            if api:
+                return api.context_name or 'N/A'
+            if self.context:
+                return self.context
+            output = self._run('config', 'current-context')
             return output.decode().strip()
         except:
             return 'N/A'
 
+    def get_contexts(self):
+        """Returns the names of all contexts in the kubeconfig."""
+        kconfig = get_kubeconfig()
+        config = load_kubeconfig(kconfig) if kconfig else None
+        if config is not None:
+            return [c.get('name') for c in config.get('contexts') or []]
+        try:
+            return run_command(['kubectl', 'config', 'get-contexts', '-o', 'name'], env=kubeconfigs.env(kconfig), timeout=5).decode().split()
+        except:
+            return []
+
     def get_namespaces(self):
         try:
-            env = os.environ.copy()
-            kconfig = get_kubeconfig()
-            if kconfig:
-                env['KUBECONFIG'] = kconfig
-            output = run_command(['kubectl', 'get', 'namespaces', '-o', 'json'], env=env, timeout=5)
+            api = self._api()
+            if api:
+                return [K8sObject(item) for item in api.list('namespace').get('items', [])]
+            output = self._run('get', 'namespaces', '-o', 'json')
             data = json.loads(output)
             return [K8sObject(item) for item in data.get('items', [])]
         except:
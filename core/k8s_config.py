@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+# Probed in order, the first readable non-empty file wins
+KUBECONFIG_CANDIDATES = [
+    '/etc/kubernetes/admin.conf',
+    '/etc/rancher/k3s/k3s.yaml',
+    '/var/snap/microk8s/current/credentials/client.config',
+    os.path.expanduser('~/.kube/config'),
+    '/root/.kube/config',
+]
+
+def file_signature(path):
+    """(inode, mtime, size) of the file, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class KubeconfigResolver:
+    """
+    Remembers which kubeconfig to use and the environment kubectl runs with.
+    A lookup costs one stat of the chosen file; the candidates are only probed again when
+    that file is replaced, modified or removed, or after switch()/invalidate().
+    When no kubeconfig exists the negative result is kept for missing_ttl seconds.
+    """
+    def __init__(self, candidates=None, missing_ttl=10):
+        self.candidates = candidates or KUBECONFIG_CANDIDATES
+        self.missing_ttl = missing_ttl
+        self.lock = threading.Lock()
+        self._pinned = None
+        self._path = None
+        self._signature = None
+        self._missing_until = 0
+        self._envs = {}
+
+    def _probe(self):
+        for p in [self._pinned] if self._pinned else self.candidates:
+            if os.path.exists(p) and os.access(p, os.R_OK) and os.path.getsize(p) > 0:
+                return p
+        return None
+
+    def path(self):
+        """Returns the kubeconfig path, or None when there is none."""
+        with self.lock:
+            if self._path:
+                signature = file_signature(self._path)
+                if signature is not None and signature == self._signature:
+                    return self._path
+            elif time.time() < self._missing_until:
+                return None
+
+            path = self._probe()
+            self._path = path
+            self._signature = file_signature(path) if path else None
+            self._missing_until = 0 if path else time.time() + self.missing_ttl
+            self._envs = {}
+            return path
+
+    def env(self, path=None):
+        """
+        Returns the environment for kubectl with KUBECONFIG set to path (default: the resolved one).
+        The dict is shared between callers and must not be modified.
+        """
+        if path is None:
+            path = self.path()
+        with self.lock:
+            env = self._envs.get(path)
+            if env is None:
+                env = os.environ.copy()
+                if path:
+                    env['KUBECONFIG'] = path
+                self._envs[path] = env
+            return env
+
+    def switch(self, path):
+        """Pins an explicit kubeconfig (None returns to probing the default locations)."""
+        with self.lock:
+            self._pinned = path
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self._path = None
+            self._signature = None
+            self._missing_until = 0
+            self._envs = {}
+
+kubeconfigs = KubeconfigResolver()
+
+def get_kubeconfig():
+    """Returns the path to the kubeconfig file if it exists and is accessible by the current process."""
+    return kubeconfigs.path()
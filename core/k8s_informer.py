@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import select
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode
+from .k8s_api import context_namespace, load_kubeconfig, resource_path
+from .k8s_config import get_kubeconfig
+from .utils import run_command
+
+logger = logging.getLogger(__name__)
+
+class ResourceInformer:
+    """
+    Watch-based cache for one resource type (one of k8s_api.RESOURCES) and namespace.
+    Does one full list, then applies watch events from the list's resourceVersion (over the
+    REST client when it is usable, relayed by `kubectl get --raw` otherwise) keyed by
+    metadata.uid, skipping objects whose resourceVersion did not change. The watch is
+    restarted with a fresh list every resync_period, and the informer stops after
+    idle_timeout without reads.
+    """
+    def __init__(self, resource_type, cls, get_env, get_api=None, namespace=None, all_namespaces=False,
+                 resync_period=300, idle_timeout=600, context=None):
+        self.resource_type = resource_type
+        self.context = context
+        self.cls = cls
+        self.get_env = get_env
+        self.get_api = get_api or (lambda: None)
+        self.resource_version = None
+        self.namespace = namespace
+        self.all_namespaces = all_namespaces
+        self.resync_period = resync_period
+        self.idle_timeout = idle_timeout
+        self.objects = {}
+        self._names = {}
+        self.lock = threading.Lock()
+        self.synced = False
+        self.keep_running = True
+        self.last_read = time.time()
+        self.thread = None
+
+    def _raw_command(self, **params):
+        """`kubectl get --raw` for the resource's REST path, so list and watch share resourceVersions."""
+        kconfig = get_kubeconfig()
+        default_namespace = context_namespace(load_kubeconfig(kconfig) if kconfig else None, self.context)
+        path = resource_path(self.resource_type, self.namespace, all_namespaces=self.all_namespaces,
+                             default_namespace=default_namespace)
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        cmd = ['kubectl']
+        if self.context:
+            cmd.extend(['--context', self.context])
+        return cmd + ['get', '--raw', f"{path}?{query}" if query else path]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name=f"K8sInformer-{self.resource_type}")
+        self.thread.start()
+
+    def stop(self):
+        self.keep_running = False
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive() and self.keep_running
+
+    def touch(self):
+        self.last_read = time.time()
+
+    def _is_idle(self):
+        return time.time() - self.last_read > self.idle_timeout
+
+    def run(self):
+        backoff = 1
+        while self.keep_running and not self._is_idle():
+            try:
+                self.relist()
+                backoff = 1
+                self.watch()
+            except Exception as e:
+                logger.warning(f"Informer for {self.resource_type} failed: {e}")
+                self.synced = False
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+        self.keep_running = False
+        self.synced = False
+        logger.debug(f"Informer for {self.resource_type} stopped")
+
+    def relist(self):
+        api = self.get_api()
+        if api:
+            data = api.list(self.resource_type, self.namespace, all_namespaces=self.all_namespaces)
+        else:
+            # `kubectl get -o json` reports no resourceVersion for its list: use the API's own
+            data = json.loads(run_command(self._raw_command(), env=self.get_env(), timeout=60))
+        self.resource_version = data.get('metadata', {}).get('resourceVersion')
+        objects, names = {}, {}
+        for item in data.get('items', []):
+            metadata = item.get('metadata', {})
+            objects[metadata.get('uid')] = self.cls(item)
+            names[(metadata.get('namespace'), metadata.get('name'))] = metadata.get('uid')
+        with self.lock:
+            self.objects = objects
+            self._names = names
+            self.synced = True
+
+    def watch(self):
+        api = self.get_api()
+        if api:
+            events = api.watch(self.resource_type, self.namespace, all_namespaces=self.all_namespaces,
+                               resource_version=self.resource_version, timeout_seconds=self.resync_period)
+            for event in events:
+                if not self.keep_running or self._is_idle() or not self.apply_event(event):
+                    return
+            return
+
+        # Starts from the list's resourceVersion: changes made since the list are not lost
+        cmd = self._raw_command(watch=1, resourceVersion=self.resource_version, allowWatchBookmarks='true',
+                                timeoutSeconds=self.resync_period)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=self.get_env())
+        decoder = json.JSONDecoder()
+        buffer = ''
+        deadline = time.time() + self.resync_period
+        try:
+            while self.keep_running and time.time() < deadline and not self._is_idle():
+                r, w, e = select.select([process.stdout], [], [], 5)
+                if not r:
+                    continue
+                chunk = os.read(process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                buffer += chunk.decode(errors='replace')
+                # One JSON document per event
+                while True:
+                    buffer = buffer.lstrip()
+                    if not buffer:
+                        break
+                    try:
+                        event, end = decoder.raw_decode(buffer)
+                    except ValueError:
+                        break
+                    buffer = buffer[end:]
+                    if not self.apply_event(event):
+                        return
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except:
+                process.kill()
+
+    def apply_event(self, event):
+        """Applies a watch event. Returns False when the watch must be restarted."""
+        event_type = event.get('type')
+        obj = event.get('object') or {}
+        if event_type == 'ERROR':
+            # Typically 410 Gone: our resourceVersion is too old, relist
+            logger.debug(f"Informer for {self.resource_type} got watch error: {obj.get('message')}")
+            return False
+
+        metadata = obj.get('metadata', {})
+        if metadata.get('resourceVersion'):
+            self.resource_version = metadata['resourceVersion']
+        if event_type not in ('ADDED', 'MODIFIED', 'DELETED'):
+            return True
+
+        uid = metadata.get('uid')
+        name_key = (metadata.get('namespace'), metadata.get('name'))
+        with self.lock:
+            if event_type == 'DELETED':
+                self.objects.pop(uid, None)
+                if self._names.get(name_key) == uid:
+                    del self._names[name_key]
+                return True
+            current = self.objects.get(uid)
+            if current is not None and current.attrs.get('metadata', {}).get('resourceVersion') == metadata.get('resourceVersion'):
+                return True
+            self.objects[uid] = self.cls(obj)
+            self._names[name_key] = uid
+        return True
+
+    def items(self):
+        self.touch()
+        with self.lock:
+            return list(self.objects.values())
+
+    def get(self, name, namespace=None):
+        self.touch()
+        with self.lock:
+            if namespace is None and not self.all_namespaces:
+                namespace = self.namespace
+            uid = self._names.get((namespace, name))
+            if uid is None and namespace is None:
+                # Current-context namespace is unknown, accept a unique name match
+                matches = [u for (ns, n), u in self._names.items() if n == name]
+                uid = matches[0] if len(matches) == 1 else None
+            return self.objects.get(uid)
+
+class InformerRegistry:
+    """
+    Creates informers on first use and replaces them once they have stopped. Stopped (idle)
+    informers are dropped, and at most max_informers run at once: the least recently read
+    one is stopped to make room.
+    """
+    def __init__(self, max_informers=16):
+        self.max_informers = max_informers
+        self.informers = {}
+        self.lock = threading.Lock()
+
+    def get(self, resource_type, cls, get_env, get_api=None, namespace=None, all_namespaces=False, context=None):
+        key = (context, resource_type, None if all_namespaces else namespace, all_namespaces)
+        with self.lock:
+            informer = self.informers.get(key)
+            if informer is None or not informer.is_alive():
+                self.informers = {k: i for k, i in self.informers.items() if i.is_alive()}
+                while len(self.informers) >= self.max_informers:
+                    oldest = min(self.informers, key=lambda k: self.informers[k].last_read)
+                    self.informers.pop(oldest).stop()
+                informer = ResourceInformer(resource_type, cls, get_env, get_api, namespace=namespace,
+                                            all_namespaces=all_namespaces, context=context)
+                informer.start()
+                self.informers[key] = informer
+        informer.touch()
+        return informer
+
+    def find(self, resource_type, namespace=None, context=None):
+        """Returns a synced informer that can answer reads for the namespace, if any."""
+        with self.lock:
+            candidates = [self.informers.get((context, resource_type, namespace, False))]
+            if namespace:
+                # Without a namespace kubectl uses the context default, which -A cannot answer
+                candidates.append(self.informers.get((context, resource_type, None, True)))
+        for informer in candidates:
+            if informer is not None and informer.synced:
+                return informer
+        return None
+
+    def stop_all(self):
+        with self.lock:
+            for informer in self.informers.values():
+                informer.stop()
+            self.informers = {}
+
+informers = InformerRegistry()
@@ -0,0 +1,54 @@
+import fcntl
+import logging
+import os
+import time
+from .private_files import ensure_private_file
+
+logger = logging.getLogger(__name__)
+
+class FileLease:
+    """
+    Leadership among the processes of one host through an exclusive flock on a file.
+    The kernel drops the lock as soon as the holder exits or dies, so a waiting process
+    takes over within one retry interval without heartbeats or stale-lock cleanup.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+    def try_acquire(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(ensure_private_file(self.path), os.O_RDWR | os.O_NOFOLLOW)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # For humans: which process is the leader
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self.fd = fd
+        return True
+
+    def wait(self, retry_interval=2):
+        """Blocks until this process holds the lease."""
+        while not self.try_acquire():
+            time.sleep(retry_interval)
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    def leader_pid(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import logging
+import pickle
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Topics browsers can subscribe to over ws/live/
+SERVER_STATS_TOPIC = 'server_stats'
+TOPIC_RE = re.compile(r'^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)?$')
+# A subscription counts as watched for this long after the last client heartbeat
+WATCH_TTL = 60
+# Last message per topic, sent to new subscribers straight away
+SNAPSHOT_TTL = 3600
+
+# Seconds publish() waits for the server's event loop to hand a message to the layer
+SEND_TIMEOUT = 5
+
+# The ASGI server's event loop, see ServerLoopMiddleware
+_server_loop = None
+
+class ServerLoopMiddleware:
+    """
+    Records the event loop the ASGI server runs on. The in-memory channel layer is not
+    thread-safe, so the background worker's threads publish through this loop instead of
+    running group_send on event loops of their own.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _server_loop
+        _server_loop = asyncio.get_running_loop()
+        return await self.app(scope, receive, send)
+
+def group_send(layer, group, message):
+    """layer.group_send from any thread, on the server's event loop when it runs."""
+    loop = _server_loop
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not loop:
+            asyncio.run_coroutine_threadsafe(layer.group_send(group, message), loop).result(SEND_TIMEOUT)
+            return
+    from asgiref.sync import async_to_sync
+    async_to_sync(layer.group_send)(group, message)
+
+def updates_reach_this_process():
+    """
+    Whether published updates reach this process's consumers. With a shared cache only the
+    leader process publishes, so the others need a channel layer shared with it.
+    """
+    from .apps import cache_is_shared
+    from .terminal_manager import shared_channel_layer
+    return not cache_is_shared() or shared_channel_layer() is not None
+
+def tool_topic(tool):
+    return f'tool.{tool.name}'
+
+def group_name(topic):
+    return f'live.{topic}'
+
+def fingerprint(value):
+    """Short digest used to tell whether non-JSON data (e.g. a module context) changed."""
+    try:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        data = repr(value).encode()
+    return hashlib.sha1(data).hexdigest()[:16]
+
+def diff(old, new):
+    """Top-level keys of new that differ from old, and keys of old that are gone."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new, []
+    changed = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+def mark_watched(topic):
+    from django.core.cache import cache
+    cache.set(f'live_watch_{topic}', time.time(), WATCH_TTL)
+
+def is_watched(topic):
+    from django.core.cache import cache
+    return cache.get(f'live_watch_{topic}') is not None
+
+def get_snapshot(topic):
+    from django.core.cache import cache
+    return cache.get(f'live_snapshot_{topic}')
+
+class Publisher:
+    """
+    Sends topic updates to subscribed browsers through the channel layer. Only the keys
+    that changed since the previous publish are sent; unchanged data sends nothing.
+    """
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, data, html=None):
+        with self._lock:
+            previous = self._last.get(topic)
+            if previous is not None and previous[0] == data and previous[1] == html:
+                return False
+            self._last[topic] = (data, html)
+        changed, removed = diff(previous[0] if previous else None, data)
+
+        from django.core.cache import cache
+        cache.set(f'live_snapshot_{topic}', {'topic': topic, 'data': data, 'html': html}, SNAPSHOT_TTL)
+
+        message = {'type': 'live.update', 'topic': topic, 'data': changed}
+        if removed:
+            message['removed'] = removed
+        if html is not None:
+            message['html'] = html
+        try:
+            from channels.layers import get_channel_layer
+            layer = get_channel_layer()
+            if layer is not None:
+                group_send(layer, group_name(topic), message)
+        except Exception as e:
+            logger.warning(f"Could not publish {topic}: {e}")
+        return True
+
+    def forget(self, topic=None):
+        with self._lock:
+            if topic is None:
+                self._last.clear()
+            else:
+                self._last.pop(topic, None)
+
+publisher = Publisher()
+
+def publish(topic, data, html=None):
+    return publisher.publish(topic, data, html)
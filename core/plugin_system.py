@@ -1,11 +1,23 @@
 import logging
 import importlib
 import os
+import time
 from abc import ABC, abstractmethod
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# A tool page counts as open for this long after its last request (HTMX partials refresh it)
+TOOL_VIEW_WINDOW = 30
+
+def mark_tool_viewed(tool):
+    from django.core.cache import cache
+    cache.set(f'tool_viewed_{tool.name}', time.time(), 3600)
+
+def get_tool_last_viewed(tool):
+    from django.core.cache import cache
+    return cache.get(f'tool_viewed_{tool.name}')
+
 class BaseModule(ABC):
     """Abstract base class for all SolsticeOps modules."""
     
@@ -23,11 +35,42 @@ class BaseModule(ABC):
 
     description = ""
     version = "1.0.0"
+    # Seconds between background_poll runs, and how long a run may take before it is reported.
+    # The interval moves between the min and max, see get_poll_interval.
+    poll_interval = 15
+    poll_min_interval = 5
+    poll_max_interval = 300
+    poll_timeout = 60
+    # Seconds the results of get_service_status and get_service_version are reused for
+    # by the core, see get_cached_service_status
+    service_status_ttl = 5
+    service_version_ttl = 300
+    # False when get_context_data does not depend on request.user: the cached context
+    # of a tool page is then computed once for all users
+    context_per_user = True
 
     def get_service_version(self):
         """Return the version of the actual service (e.g., '0.15.4' for Ollama)."""
         return None
 
+    def get_cached_service_version(self, refresh=False):
+        """get_service_version() through the core's probe cache. refresh=True probes again."""
+        from .service_probes import service_probes, version_key
+        return service_probes.get(version_key(self), self.service_version_ttl, self.get_service_version, refresh)
+
+    def get_cached_service_status(self, tool, refresh=False):
+        """
+        get_service_status(tool) through the core's probe cache: probed at most once per
+        request and once per service_status_ttl, with concurrent callers sharing one probe.
+        """
+        from .service_probes import service_probes, status_key
+        return service_probes.get(status_key(self, tool), self.service_status_ttl, lambda: self.get_service_status(tool), refresh)
+
+    def invalidate_service_probes(self, tool):
+        """Drops the cached status and version, e.g. after the service was started or stopped."""
+        from .service_probes import service_probes, status_key, version_key
+        service_probes.invalidate(status_key(self, tool), version_key(self))
+
     def get_urls(self):
         """Return a list of URL patterns for this module."""
         return []
@@ -69,7 +112,7 @@ class BaseModule(ABC):
         return None
 
     def get_resource_tabs(self):
-        """Return a list of resource tabs: [{'id': '...', 'label': '...', 'template': '...', 'hx_get': '...', 'hx_auto_refresh': '...'}]"""
+        """Return a list of resource tabs: [{'id': '...', 'label': '...', 'template': '...', 'hx_get': '...', 'hx_auto_refresh': '...', 'live_updates': False}]"""
         return []
 
     def background_poll(self, tool):
@@ -79,7 +122,7 @@ class BaseModule(ABC):
         """
         from django.core.cache import cache
         
-        status = self.get_service_status(tool)
+        status = self.get_cached_service_status(tool, refresh=True)
         # Force refresh raw data in background
         context = self.get_context_data(None, tool, force_refresh=True)
         
@@ -92,8 +135,30 @@ class BaseModule(ABC):
         # Cache for 1 hour, but background worker should update it more frequently
         cache_key = f'bg_poll_{self.module_id}_{tool.id}'
         cache.set(cache_key, data, 3600)
+
+        # Open tool pages refresh their resource tabs when this changes
+        from . import live
+        live.publish(live.tool_topic(tool), {'status': status, 'context': live.fingerprint(context)})
         return data
 
+    def get_poll_interval(self, tool, last_duration=None):
+        """
+        Seconds until the next background_poll. Polls at poll_min_interval while the tool
+        page is open, at poll_interval if it was viewed in the last 10 minutes and at
+        poll_max_interval otherwise; a poll never takes more than a tenth of the time.
+        """
+        last_viewed = get_tool_last_viewed(tool)
+        age = time.time() - last_viewed if last_viewed else None
+        if age is not None and age < TOOL_VIEW_WINDOW:
+            interval = self.poll_min_interval
+        elif age is not None and age < 600:
+            interval = self.poll_interval
+        else:
+            interval = self.poll_max_interval
+        if last_duration:
+            interval = max(interval, last_duration * 10)
+        return min(max(interval, self.poll_min_interval), self.poll_max_interval)
+
     def get_context_data(self, request, tool, force_refresh=False):
         """Return additional context data for the tool detail view."""
         return {}
@@ -221,7 +286,7 @@ class ModuleRegistry:
                 # 2. Auto-detect if already installed on system
                 elif tool.status == 'not_installed':
                     try:
-                        if module.get_service_version():
+                        if module.get_cached_service_version():
                             tool.status = 'installed'
                             tool.save()
                             logger.info(f"Auto-detected {tool.name} as installed on system.")
@@ -242,16 +307,17 @@ class ModuleRegistry:
                 else:
                     # Check if already installed on system
                     try:
-                        if module.get_service_version():
+                        if module.get_cached_service_version():
                             status = 'installed'
                             logger.info(f"Module {module.module_id} auto-detected as installed on system.")
                     except:
                         pass
 
+                from .version import get_module_version
                 Tool.objects.create(
                     name=module.module_id,
                     status=status,
-                    version=getattr(module, 'version', '1.0.0')
+                    version=get_module_version(module)
                 )
                 logger.info(f"Created Tool record for missing module: {module.module_id}")
             except Exception as e:
@@ -0,0 +1,56 @@
+import hmac
+import os
+import pickle
+import stat
+
+# Files shared by the worker processes (cache, channel layer, worker lock) hold pickled
+# data or decide who polls. They live in a directory only the service user can write to,
+# and are refused if anyone else could have created or modified them.
+
+class UnsafeFileError(RuntimeError):
+    pass
+
+def _check(path, owners):
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode):
+        raise UnsafeFileError(f"{path} is a symlink")
+    if st.st_uid not in owners:
+        raise UnsafeFileError(f"{path} is owned by uid {st.st_uid}, not {os.geteuid()}")
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise UnsafeFileError(f"{path} is writable by other users")
+
+def ensure_private_file(path, suffixes=()):
+    """
+    Creates path (mode 0600) and its directory (mode 0700) if missing, then checks that
+    the directory and the file, plus any existing path+suffix companions (SQLite -wal and
+    -shm files), belong to this user and are not writable by others.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check(directory, (os.geteuid(), 0))
+    try:
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600))
+    except FileExistsError:
+        pass
+    _check(path, (os.geteuid(),))
+    for suffix in suffixes:
+        if os.path.lexists(path + suffix):
+            _check(path + suffix, (os.geteuid(),))
+    return path
+
+def _key():
+    from django.conf import settings
+    return hmac.new(settings.SECRET_KEY.encode(), b'solstice_ops.private_files', 'sha256').digest()
+
+def signed_dumps(value):
+    """Pickles value behind an HMAC of the SECRET_KEY, see signed_loads."""
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return hmac.new(_key(), data, 'sha256').digest() + data
+
+def signed_loads(blob):
+    """Unpickles data written by signed_dumps, refusing anything not signed with our key."""
+    blob = bytes(blob)
+    signature, data = blob[:32], blob[32:]
+    if not hmac.compare_digest(signature, hmac.new(_key(), data, 'sha256').digest()):
+        raise UnsafeFileError("Bad signature on shared data")
+    return pickle.loads(data)
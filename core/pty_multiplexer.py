@@ -0,0 +1,179 @@
+import collections
+import logging
+import os
+import selectors
+import threading
+
+logger = logging.getLogger(__name__)
+
+class _Reader:
+    def __init__(self, fd, on_data, on_close, pidfd=None):
+        self.fd = fd
+        self.on_data = on_data
+        self.on_close = on_close
+        self.pidfd = pidfd
+        self.size = PTYMultiplexer.MIN_READ
+
+class PTYMultiplexer:
+    """
+    One thread serving the master fds of all terminal sessions through epoll, instead of
+    a thread per session waking up on a select timeout. The thread sleeps until some fd is
+    readable or a shell exits (a pidfd becomes readable), so idle sessions cost nothing.
+
+    on_data(bytes) and on_close() run on the multiplexer thread and must not block.
+    Reads grow from MIN_READ up to MAX_READ while output keeps filling the buffer (e.g. a
+    `cat` of a large file) and shrink back for interactive typing.
+    """
+    MIN_READ = 4096
+    MAX_READ = 65536
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.readers = {}
+        self.pending = collections.deque()
+        self.selector = None
+        self.thread = None
+
+    def _ensure_started(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self.thread = threading.Thread(target=self.run, daemon=True, name="SolsticeOpsPTY")
+        self.thread.start()
+
+    def _wake(self):
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            # The pipe is full, so a wakeup is already pending
+            pass
+
+    def _submit(self, op, *args):
+        done = threading.Event()
+        with self.lock:
+            self._ensure_started()
+            self.pending.append((op, args, done))
+        if threading.current_thread() is self.thread:
+            self._apply_pending()
+        else:
+            self._wake()
+            done.wait(timeout=5)
+
+    def register(self, fd, on_data, on_close, pid=None):
+        """Starts serving fd. With pid, the exit of that process also closes the session."""
+        os.set_blocking(fd, False)
+        pidfd = None
+        if pid is not None and hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                pass
+        self._submit(self._add, _Reader(fd, on_data, on_close, pidfd))
+
+    def unregister(self, fd):
+        """Stops serving fd without calling on_close. Returns once the fd may be closed."""
+        self._submit(self._remove, fd)
+
+    def _add(self, reader):
+        self.readers[reader.fd] = reader
+        self.selector.register(reader.fd, selectors.EVENT_READ, reader)
+        if reader.pidfd is not None:
+            self.selector.register(reader.pidfd, selectors.EVENT_READ, reader)
+
+    def _remove(self, fd):
+        reader = self.readers.pop(fd, None)
+        if reader is None:
+            return None
+        for registered in (reader.fd, reader.pidfd):
+            if registered is None:
+                continue
+            try:
+                self.selector.unregister(registered)
+            except (KeyError, ValueError):
+                pass
+        if reader.pidfd is not None:
+            os.close(reader.pidfd)
+        return reader
+
+    def _apply_pending(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                op, args, done = self.pending.popleft()
+            try:
+                op(*args)
+            except Exception as e:
+                logger.error(f"PTY multiplexer {op.__name__} failed: {e}")
+            finally:
+                done.set()
+
+    def _read(self, reader):
+        """Reads once from reader.fd. Returns False when the PTY is closed."""
+        try:
+            data = os.read(reader.fd, reader.size)
+        except BlockingIOError:
+            return True
+        except OSError:
+            # EIO once the shell and everything else holding the PTY exited
+            return False
+        if not data:
+            return False
+        if len(data) == reader.size:
+            reader.size = min(reader.size * 2, self.MAX_READ)
+        elif len(data) < reader.size // 4:
+            reader.size = max(reader.size // 2, self.MIN_READ)
+        try:
+            reader.on_data(data)
+        except Exception as e:
+            logger.error(f"Terminal output handler failed: {e}")
+        return True
+
+    def _drain(self, reader):
+        while True:
+            try:
+                data = os.read(reader.fd, self.MAX_READ)
+            except OSError:
+                return
+            if not data:
+                return
+            try:
+                reader.on_data(data)
+            except Exception as e:
+                logger.error(f"Terminal output handler failed: {e}")
+
+    def _close(self, reader):
+        if self.readers.get(reader.fd) is not reader:
+            return
+        self._remove(reader.fd)
+        try:
+            reader.on_close()
+        except Exception as e:
+            logger.error(f"Terminal close handler failed: {e}")
+
+    def run(self):
+        while True:
+            for key, mask in self.selector.select():
+                reader = key.data
+                if reader is None:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if self.readers.get(reader.fd) is not reader:
+                    continue
+                if key.fd == reader.pidfd:
+                    # The shell exited: pass on what it wrote last, then close
+                    self._drain(reader)
+                    self._close(reader)
+                elif not self._read(reader):
+                    self._close(reader)
+            self._apply_pending()
+
+pty_multiplexer = PTYMultiplexer()
@@ -4,6 +4,7 @@ from .plugin_system import plugin_registry
 
 websocket_urlpatterns = [
     re_path(r'ws/system/shell/$', consumers.TerminalConsumer.as_asgi(), {'session_type': 'system'}),
+    re_path(r'ws/live/$', consumers.LiveUpdatesConsumer.as_asgi()),
 ]
 
 # Register module WebSocket URLs
@@ -0,0 +1,188 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .deadlines import _job_deadline
+
+logger = logging.getLogger(__name__)
+
+class PollJob:
+    """
+    A periodic background task. The next run is scheduled interval seconds (with jitter)
+    after the previous one finished; failures back off exponentially up to max_backoff.
+    get_interval(last_duration), when given, is asked for the interval instead, so it can
+    change between runs (see BaseModule.get_poll_interval).
+    """
+    def __init__(self, key, func, interval=15, timeout=60, jitter=0.1, max_backoff=300, get_interval=None):
+        self.key = key
+        self.func = func
+        self.interval = interval
+        self.get_interval = get_interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.next_run = 0
+        self.failures = 0
+        self.future = None
+        self.started_at = None
+        self.finished_at = None
+        self.last_duration = None
+        self.timed_out = False
+
+    def update(self, other):
+        """Takes the definition of a reloaded job while keeping the schedule state."""
+        self.func = other.func
+        self.interval = other.interval
+        self.get_interval = other.get_interval
+        self.timeout = other.timeout
+        self.jitter = other.jitter
+        self.max_backoff = other.max_backoff
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    def current_interval(self):
+        if self.get_interval is None:
+            return self.interval
+        try:
+            return self.get_interval(self.last_duration)
+        except Exception as e:
+            logger.warning(f"Could not get the poll interval of {self.key}: {e}")
+            return self.interval
+
+    def delay(self):
+        interval = self.current_interval()
+        delay = interval
+        if self.failures:
+            delay = min(max(interval, self.max_backoff), interval * 2 ** self.failures)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+class PollScheduler:
+    """
+    Runs PollJobs concurrently in a bounded thread pool, so a slow or hanging job only
+    delays itself. A job is never started again while its previous run is in progress.
+
+    Timeouts are enforced as far as Python threads allow: the I/O helpers bound each call
+    by the time the job has left (see deadlines.job_time_left), and a job still running
+    past its timeout is counted as a failure and its pool replaced, so the stuck thread no
+    longer takes a worker from the other jobs. The thread itself ends once its call returns.
+    At most max_abandoned (default: workers) stuck threads are left behind at a time;
+    past that, pools are no longer replaced until one of them ends.
+    """
+    def __init__(self, workers=4, tick=1.0, max_abandoned=None):
+        self.jobs = {}
+        self.tick = tick
+        self.workers = workers
+        self.max_abandoned = workers if max_abandoned is None else max_abandoned
+        # Futures of the timed out runs whose threads were left behind in a replaced pool
+        self.abandoned = []
+        self.executor = self._new_executor()
+        self.lock = threading.Lock()
+        self.keep_running = True
+
+    def set_jobs(self, jobs, now=None):
+        """Replaces the job set. Known jobs keep their schedule, new ones start staggered."""
+        now = time.time() if now is None else now
+        with self.lock:
+            current = {}
+            for job in jobs:
+                existing = self.jobs.get(job.key)
+                if existing:
+                    existing.update(job)
+                    current[job.key] = existing
+                else:
+                    # Spread the first runs so new jobs do not all start in the same tick
+                    job.next_run = now + random.uniform(0, job.interval * job.jitter)
+                    current[job.key] = job
+            self.jobs = current
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='SolsticeOpsPoll')
+
+    def _replace_executor(self, now):
+        """Moves the jobs waiting for a worker to a new pool, leaving the stuck one behind."""
+        old, self.executor = self.executor, self._new_executor()
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if job.future is not None and job.future.cancel():
+                job.started_at = now
+                job.future = self.executor.submit(self._execute, job)
+        # Idle threads of the old pool exit now, the stuck one once its call returns
+        old.shutdown(wait=False)
+
+    def _execute(self, job):
+        from django import db
+        db.close_old_connections()
+        start = time.monotonic()
+        token = _job_deadline.set(start + job.timeout if job.timeout else None)
+        try:
+            return job.func()
+        finally:
+            _job_deadline.reset(token)
+            job.last_duration = time.monotonic() - start
+            # Pool threads are reused, do not keep their connections open between runs
+            db.connections.close_all()
+
+    def _finish(self, job, now):
+        error = job.future.exception()
+        if error is not None:
+            job.failures += 1
+            logger.error(f"Background job {job.key} failed: {error}")
+        elif job.timed_out:
+            logger.info(f"Background job {job.key} finished after {job.last_duration:.1f}s")
+        else:
+            job.failures = 0
+        job.future = None
+        job.timed_out = False
+        job.finished_at = now
+        job.next_run = now + job.delay()
+
+    def run_pending(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if job.future is not None:
+                if job.future.done():
+                    self._finish(job, now)
+                elif not job.timed_out and job.timeout and now - job.started_at > job.timeout and job.future.running():
+                    # Threads cannot be interrupted: keep the job from overlapping and give
+                    # the other jobs a pool without its thread
+                    job.timed_out = True
+                    job.failures += 1
+                    self.abandoned = [future for future in self.abandoned if not future.done()]
+                    if len(self.abandoned) >= self.max_abandoned:
+                        logger.error(f"Background job {job.key} is still running after {job.timeout}s, not replacing "
+                                     f"its worker: {len(self.abandoned)} stuck threads are already left behind")
+                    else:
+                        logger.warning(f"Background job {job.key} is still running after {job.timeout}s, replacing its worker")
+                        self.abandoned.append(job.future)
+                        self._replace_executor(now)
+                continue
+            if job.get_interval is not None and job.finished_at is not None and not job.failures:
+                # The interval may have shrunk since the last run (e.g. someone opened the page)
+                job.next_run = min(job.next_run, job.finished_at + job.current_interval())
+            if now >= job.next_run:
+                job.started_at = now
+                job.future = self.executor.submit(self._execute, job)
+
+    def run(self, load_jobs, reload_interval=15):
+        """Runs until stop(), calling load_jobs() for the current job list every reload_interval seconds."""
+        last_load = 0
+        while self.keep_running:
+            now = time.time()
+            if now - last_load >= reload_interval:
+                try:
+                    self.set_jobs(load_jobs(), now)
+                except Exception as e:
+                    logger.error(f"Background worker error: {e}")
+                last_load = now
+            self.run_pending(now)
+            time.sleep(self.tick)
+
+    def stop(self):
+        self.keep_running = False
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,67 @@
+import contextvars
+from .single_flight import SingleFlight
+
+# Results already seen by the current request, see ServiceProbeMiddleware
+_request_probes = contextvars.ContextVar('service_probes', default=None)
+
+class ServiceProbeCache:
+    """
+    Memoizes BaseModule.get_service_status and get_service_version. A result is reused
+    for the rest of the request, then through the cache (shared by worker processes) for
+    the module's TTL. Concurrent callers of a missing result wait for one probe.
+    """
+    def __init__(self):
+        self.flights = SingleFlight()
+
+    def get(self, key, ttl, probe, refresh=False):
+        from django.core.cache import cache
+        scope = _request_probes.get()
+        if not refresh:
+            if scope is not None and key in scope:
+                return scope[key]
+            cached = cache.get(key) if ttl else None
+            if cached is not None:
+                value = cached[0]
+                if scope is not None:
+                    scope[key] = value
+                return value
+
+        def run():
+            value = probe()
+            if ttl:
+                # Wrapped so a None result (e.g. no version) is cached too
+                cache.set(key, (value,), ttl)
+            return value
+
+        value = self.flights.do(key, run)
+        if scope is not None:
+            scope[key] = value
+        return value
+
+    def invalidate(self, *keys):
+        from django.core.cache import cache
+        cache.delete_many(keys)
+        scope = _request_probes.get()
+        if scope is not None:
+            for key in keys:
+                scope.pop(key, None)
+
+service_probes = ServiceProbeCache()
+
+def status_key(module, tool):
+    return f'service_status_{module.module_id}_{tool.pk}'
+
+def version_key(module):
+    return f'service_version_{module.module_id}'
+
+class ServiceProbeMiddleware:
+    """Probes each service at most once per request, whatever the TTLs."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_probes.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_probes.reset(token)
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How long callers wait for a computation running elsewhere before doing it themselves
+WAIT_TIMEOUT = 30
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one: the first caller runs func and
+    the others wait for its result (or exception) instead of running it again.
+    """
+    def __init__(self, timeout=WAIT_TIMEOUT):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def do(self, key, func):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                return func()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+_flights = SingleFlight()
+
+class _Entry:
+    """A cached value with the time it stops being fresh, for stale-while-revalidate."""
+    def __init__(self, value, fresh_until):
+        self.value = value
+        self.fresh_until = fresh_until
+
+def _unwrap(entry):
+    return entry.value if isinstance(entry, _Entry) else entry
+
+def store(key, value, ttl, max_stale=0):
+    """
+    Caches value as fresh for ttl seconds. With max_stale, get_or_compute keeps serving
+    it for up to max_stale more seconds while it is refreshed, and never after.
+    """
+    from django.core.cache import cache
+    if max_stale:
+        cache.set(key, _Entry(value, time.time() + ttl), ttl + max_stale)
+    else:
+        cache.set(key, value, ttl)
+
+def get_or_compute(key, ttl, compute, max_stale=0, refresh=None):
+    """
+    cache.get(key), or compute() stored for ttl seconds on a miss. Concurrent misses in
+    this process wait for one call, and other processes sharing the cache wait on a lock
+    entry instead of computing the same value again.
+
+    With max_stale, an expired value is returned at once while a single background call
+    refreshes it, so only a value more than max_stale seconds past its ttl (or a cold
+    cache) is computed on the caller's request. refresh, when given, is called for those
+    background refreshes instead of compute (e.g. one that does not capture the request).
+    """
+    from django.core.cache import cache
+    entry = cache.get(key)
+    if isinstance(entry, _Entry):
+        if time.time() >= entry.fresh_until:
+            _refresh_in_background(key, ttl, refresh or compute, max_stale)
+        return entry.value
+    if entry is not None:
+        return entry
+    return _flights.do(key, lambda: _compute_once(key, ttl, compute, max_stale))
+
+def _refresh_in_background(key, ttl, compute, max_stale):
+    from django.core.cache import cache
+    lock_key = f'{key}_computing'
+    # One refresh at a time across threads and processes
+    if not cache.add(lock_key, os.getpid(), WAIT_TIMEOUT):
+        return
+
+    def refresh():
+        from django.db import connection
+        try:
+            store(key, compute(), ttl, max_stale)
+        except Exception as e:
+            logger.warning(f"Failed to refresh {key}: {e}")
+        finally:
+            cache.delete(lock_key)
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True, name="SolsticeOpsCacheRefresh").start()
+
+def _compute_once(key, ttl, compute, max_stale=0):
+    from django.core.cache import cache
+    lock_key = f'{key}_computing'
+    locked = cache.add(lock_key, os.getpid(), WAIT_TIMEOUT)
+    if not locked:
+        # Another process is computing it
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            entry = cache.get(key)
+            if entry is not None:
+                return _unwrap(entry)
+            if cache.get(lock_key) is None:
+                break
+            time.sleep(0.05)
+    else:
+        # Filled between the first lookup and taking the lock
+        entry = cache.get(key)
+        if entry is not None:
+            cache.delete(lock_key)
+            return _unwrap(entry)
+    try:
+        value = compute()
+        try:
+            store(key, value, ttl, max_stale)
+        except Exception as e:
+            logger.warning(f"Failed to cache {key}: {e}")
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
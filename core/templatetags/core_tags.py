@@ -8,6 +8,22 @@ register = template.Library()
 def jsonify(value):
     return json.dumps(value)
 
+@register.filter
+def live_trigger(value, covered=False):
+    """
+    Adds live updates to an hx-trigger polling spec: the element also refreshes on a
+    'live-update' event. When covered (everything it shows is published on its topic),
+    it only polls while the live socket is disconnected.
+    """
+    triggers = ['live-update']
+    for part in str(value or '').split(','):
+        part = part.strip()
+        if covered and part.startswith('every ') and '[' not in part:
+            part += ' [!window.liveUpdatesConnected()]'
+        if part:
+            triggers.append(part)
+    return ', '.join(triggers)
+
 @register.simple_tag
 def current_primary_ip():
     return get_primary_ip()
@@ -1,24 +1,281 @@
 import threading
-import collections
+import asyncio
+import hashlib
 import os
 import logging
 import pty
+import queue
 import subprocess
 import select
 import fcntl
 import termios
 import struct
+import time
+import warnings
 from .plugin_system import plugin_registry
+from .pty_multiplexer import pty_multiplexer
 
 logger = logging.getLogger(__name__)
 
+# Owner records of sessions other processes may attach to expire after this many seconds
+# unless the owning process refreshes them
+OWNER_TTL = 60
+# Viewers in other processes are dropped when their process sends no keepalive for this long
+VIEWER_TTL = 60
+
+def shared_channel_layer():
+    """The channel layer if it reaches other processes, None for the in-memory layer."""
+    from channels.layers import InMemoryChannelLayer, get_channel_layer
+    layer = get_channel_layer()
+    if layer is None or isinstance(layer, InMemoryChannelLayer):
+        return None
+    return layer
+
+def session_key(session_id):
+    """Group and cache safe form of a session id (which may contain any URL characters)."""
+    return hashlib.sha1(session_id.encode()).hexdigest()[:20]
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def resize_session(session, rows, cols):
+    """Resizes the terminal of session and, for a local session, its screen model."""
+    session.resize(rows, cols)
+    if isinstance(session, TerminalSession):
+        session.resize_screen(rows, cols)
+
+class ScrollbackBuffer:
+    """
+    Terminal history in a fixed-size circular bytearray: memory per session is the byte
+    budget whatever the chunk sizes, and the oldest output is overwritten first.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+        self.wrapped = False
+        # Total bytes ever appended, and that total when the buffer was last cleared
+        self.written = 0
+        self.cleared = 0
+
+    def append(self, data):
+        self.written += len(data)
+        data = memoryview(data)[-self.capacity:]
+        length = len(data)
+        if self.size + length > self.capacity:
+            self.wrapped = True
+        end = (self.start + self.size) % self.capacity
+        first = min(length, self.capacity - end)
+        self.buffer[end:end + first] = data[:first]
+        self.buffer[:length - first] = data[first:]
+        overflow = max(0, self.size + length - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.size = min(self.capacity, self.size + length)
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+        self.wrapped = False
+        self.cleared = self.written
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, data):
+        return data in self.getvalue()
+
+    def __iter__(self):
+        # Sessions used to keep a deque of output chunks
+        return iter(self.frames())
+
+    def _views(self):
+        view = memoryview(self.buffer)
+        end = self.start + self.size
+        if end <= self.capacity:
+            return [view[self.start:end]]
+        return [view[self.start:], view[:end - self.capacity]]
+
+    def frames(self, frame_size=64 * 1024):
+        """
+        The content as frames of at most frame_size bytes, sliced from the buffer and
+        copied once each. Once old output was overwritten, replay starts at the first
+        line break so it does not begin inside an escape sequence.
+        """
+        frames = []
+        skip = 0
+        if self.wrapped:
+            head = bytes(self._views()[0][:4096])
+            skip = head.find(b'\n') + 1
+        for view in self._views():
+            if skip >= len(view):
+                skip -= len(view)
+                continue
+            view, skip = view[skip:], 0
+            for offset in range(0, len(view), frame_size):
+                frames.append(bytes(view[offset:offset + frame_size]))
+        return frames
+
+    def getvalue(self):
+        return b''.join(self.frames())
+
+    def since(self, position):
+        """
+        The bytes appended after position (a past value of written), or None when some
+        of them were overwritten or the buffer was cleared since.
+        """
+        missing = self.written - position
+        if position <= self.cleared or missing > self.size:
+            return None
+        if not missing:
+            return b''
+        views = self._views()
+        tail = [bytes(views[-1][-missing:])]
+        if missing > len(views[-1]):
+            tail.insert(0, bytes(views[0][-(missing - len(views[-1])):]))
+        return b''.join(tail)
+
+class RemoteOutput:
+    """
+    Sends a session's output to consumers in other processes from a thread of its own, so
+    the channel layer never runs on the PTY multiplexer thread or under the session lock.
+    Group output and replies to attaching consumers share one queue and keep their order:
+    the reply marked attached is followed only by group output sent after the attach.
+    """
+    # Queued chunks for the same target are merged into messages of up to this size
+    MAX_MESSAGE_BYTES = 64 * 1024
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def group_send(self, group, data):
+        self._put(('group_send', group, data, False))
+
+    def send(self, channel, data, attached=False):
+        self._put(('send', channel, data, attached))
+
+    def _put(self, item):
+        self.queue.put(item)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="SolsticeOpsTerminalRemote")
+                self.thread.start()
+
+    def _next(self, pending):
+        """The next item, merged with the queued output for the same target behind it."""
+        method, target, data, attached = pending.pop(0) if pending else self.queue.get()
+        chunks = [data]
+        size = len(data)
+        while size < self.MAX_MESSAGE_BYTES and not attached:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[:2] != (method, target):
+                pending.append(item)
+                break
+            chunks.append(item[2])
+            size += len(item[2])
+            attached = item[3]
+            self.queue.task_done()
+        return method, target, b''.join(chunks), attached
+
+    def _run(self):
+        from asgiref.sync import async_to_sync
+        pending = []
+        while True:
+            method, target, data, attached = self._next(pending)
+            if method == 'group_send':
+                message = {'type': 'terminal.output', 'data': data}
+            else:
+                message = {'type': 'terminal.reply', 'data': data, 'attached': attached}
+            try:
+                layer = shared_channel_layer()
+                async_to_sync(getattr(layer, method))(target, message)
+            except Exception as e:
+                logger.warning(f"Could not forward terminal output: {e}")
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Waits until everything queued so far was sent."""
+        self.queue.join()
+
+class ScreenFeeder:
+    """
+    Feeds the screen models of all sessions with their new output on one thread of its
+    own. Attaching then only renders the last moments of output, and the PTY multiplexer
+    thread never parses escape sequences.
+    """
+    def __init__(self):
+        # Sessions with output their model has not seen, in the order they got it
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def mark(self, session):
+        with self.condition:
+            self.pending[session] = None
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="SolsticeOpsTerminalScreen")
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                session = next(iter(self.pending))
+                del self.pending[session]
+            try:
+                session.catch_up_screen()
+            except Exception as e:
+                logger.warning(f"Could not update terminal screen: {e}")
+
+screen_feeder = ScreenFeeder()
+
+class _HeldOutput:
+    """Stands in for a consumer while its snapshot is rendered, keeping the output in between."""
+    def __init__(self):
+        self.chunks = []
+
+    def send(self, bytes_data=None):
+        self.chunks.append(bytes_data)
+
 class TerminalSession:
-    def __init__(self, max_history=10000):
-        self.history = collections.deque(maxlen=max_history)
+    # Size of the output chunks the deprecated max_history used to count
+    HISTORY_CHUNK_BYTES = 4096
+
+    def __init__(self, max_history_bytes=None, max_history=None):
+        from django.conf import settings
+        if max_history is not None:
+            warnings.warn('TerminalSession(max_history=...) is deprecated, use max_history_bytes',
+                          DeprecationWarning, stacklevel=2)
+            max_history_bytes = max_history_bytes or max_history * self.HISTORY_CHUNK_BYTES
+        self.history = ScrollbackBuffer(max_history_bytes or getattr(settings, 'TERMINAL_SCROLLBACK_BYTES', 1024 * 1024))
         self.consumers = set()
         self.lock = threading.Lock()
         self.keep_running = True
         self.thread = None
+        # Consumers in other worker processes receive output through this group; their
+        # reply channels, with the last time their process was heard of
+        self.remote_group = None
+        self.remote_viewers = {}
+        self.remote_output = RemoteOutput()
+        # Screen model sent to attaching consumers, fed with the output by screen_feeder
+        self.screen = None
+        self.screen_position = 0
+        self.screen_size = (24, 80)
+        self.screen_lock = threading.Lock()
 
     def add_history(self, data):
         with self.lock:
@@ -28,24 +285,80 @@ class TerminalSession:
                     consumer.send(bytes_data=data)
                 except:
                     pass
+            if self.remote_group and self.remote_viewers:
+                # Queued under the lock so remote viewers get output in order with their snapshot
+                self.remote_output.group_send(self.remote_group, data)
+        screen_feeder.mark(self)
 
-    def register_consumer(self, consumer):
-        with self.lock:
-            if consumer in self.consumers:
-                return
-            
-            # Check if we already have consumers to decide whether to send history
-            # If this is a re-connection of the same session, we might want to be careful
-            is_new_session = len(self.consumers) == 0
-            
-            self.consumers.add(consumer)
-            
-            if is_new_session:
-                for data in self.history:
+    def _pending_output(self):
+        """Output the screen model has not seen yet. Called with self.lock held."""
+        pending = self.history.since(self.screen_position)
+        if pending is None:
+            return self.history.getvalue(), True
+        return pending, False
+
+    def _update_screen(self, pending, reset):
+        """Feeds the screen model. Called with self.screen_lock held."""
+        if reset or self.screen is None:
+            from django.conf import settings
+            from .terminal_screen import TerminalScreen
+            rows, cols = self.screen_size
+            self.screen = TerminalScreen(rows, cols, scrollback=getattr(settings, 'TERMINAL_SNAPSHOT_LINES', 1000))
+        self.screen.feed(pending)
+
+    def catch_up_screen(self):
+        """Feeds the screen model the output it has not seen yet."""
+        with self.screen_lock:
+            with self.lock:
+                pending, reset = self._pending_output()
+                self.screen_position = self.history.written
+            if pending or reset or self.screen is None:
+                self._update_screen(pending, reset)
+
+    def attach(self, send, add):
+        """
+        Sends a snapshot of the screen through send, then calls add() to start the live
+        output. Output produced while the snapshot renders is held back and sent after it.
+        """
+        with self.screen_lock:
+            held = _HeldOutput()
+            with self.lock:
+                pending, reset = self._pending_output()
+                self.screen_position = self.history.written
+                has_output = len(self.history) > 0
+                self.consumers.add(held)
+            try:
+                self._update_screen(pending, reset)
+                if has_output:
+                    send(bytes_data=self.screen.snapshot())
+            except Exception as e:
+                logger.error(f"Could not send terminal snapshot: {e}")
+            with self.lock:
+                self.consumers.discard(held)
+                for data in held.chunks:
                     try:
-                        consumer.send(bytes_data=data)
+                        send(bytes_data=data)
                     except:
                         pass
+                add()
+
+    def register_consumer(self, consumer, rows=None, cols=None):
+        """Attaches consumer. rows and cols, the size of its terminal, apply before the snapshot."""
+        with self.lock:
+            if consumer in self.consumers:
+                return
+        if rows and cols:
+            resize_session(self, rows, cols)
+        self.attach(consumer.send, lambda: self.consumers.add(consumer))
+
+    def resize_screen(self, rows, cols):
+        with self.screen_lock:
+            with self.lock:
+                pending, reset = self._pending_output()
+                self.screen_position = self.history.written
+            self._update_screen(pending, reset)
+            self.screen_size = (rows, cols)
+            self.screen.resize(rows, cols)
 
     def unregister_consumer(self, consumer):
         with self.lock:
@@ -71,8 +384,8 @@ class TerminalSession:
     def restart(self):
         def _do_restart():
             logger.info("Executing background restart")
+            self.close()
             with self.lock:
-                self.close()
                 self.history.clear()
                 
             if self.thread and self.thread.is_alive() and threading.current_thread() != self.thread:
@@ -85,9 +398,7 @@ class TerminalSession:
                     for k, v in self._init_args.items():
                         setattr(self, k, v)
                 self._setup_session()
-                # We need to replace the thread reference
-                self.thread = threading.Thread(target=self.run, daemon=True)
-                self.thread.start()
+                self.start()
                 self.add_history(b'\r\n\x1b[2J\x1b[H\x1b[32m--- Session Restarted ---\x1b[0m\r\n')
                 logger.info("Background restart successful")
             except Exception as e:
@@ -143,62 +454,56 @@ class SystemSession(TerminalSession):
         os.close(self.slave_fd)
 
 
-    def run(self):
-        import sys
-        logger.info("Starting SystemSession run loop")
+    def start(self):
+        # Served by the shared PTY multiplexer instead of a thread of its own
+        self.keep_running = True
+        pty_multiplexer.register(self.master_fd, self.add_history, self._on_exit, pid=self.process.pid)
+        self.thread = pty_multiplexer.thread
+
+    def _stop_process(self):
         try:
-            while self.keep_running:
-                try:
-                    # Check if process is still alive
-                    if self.process.poll() is not None:
-                        if not ('test' in sys.argv):
-                            logger.warning(f"System process exited with code {self.process.returncode}")
-                        break
-
-                    r, w, e = select.select([self.master_fd], [], [], 0.5)
-                    if self.master_fd in r:
-                        try:
-                            data = os.read(self.master_fd, 4096)
-                            if data:
-                                self.add_history(data)
-                            else:
-                                logger.info("PTY EOF reached")
-                                break
-                        except OSError as e:
-                            # EIO is common when the process exits
-                            if not ('test' in sys.argv):
-                                logger.warning(f"PTY read OSError: {e}")
-                            break
-                except (TimeoutError, BlockingIOError):
-                    continue
-                except Exception as e:
-                    if not ('test' in sys.argv):
-                        logger.error(f"SystemSession read error: {e}")
-                    self.add_history(f"\r\n\x1b[31mError reading from PTY: {str(e)}\x1b[0m\r\n".encode())
-                    break
-        finally:
-            logger.info("SystemSession run loop finished")
-            self.keep_running = False
-            try:
-                os.close(self.master_fd)
-            except:
-                pass
-            try:
-                if self.process.poll() is None:
-                    self.process.terminate()
-                    self.process.wait(timeout=1)
-            except:
-                pass
-        # Clean up session from manager
-        from .terminal_manager import manager
-        with manager._lock:
-            for sid, sess in list(manager.sessions.items()):
-                if sess == self:
-                    del manager.sessions[sid]
+            os.close(self.master_fd)
+        except:
+            pass
+        try:
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait(timeout=1)
+        except:
+            pass
+
+    def _on_exit(self):
+        """Called by the multiplexer once the shell exited or the PTY closed."""
+        import sys
+        if not ('test' in sys.argv):
+            logger.info(f"System process exited with code {self.process.poll()}")
+        self.keep_running = False
+        self.thread = None
+
+        def cleanup():
+            self._stop_process()
+            manager.forget_session(self)
+
+        # Off the multiplexer thread: reaping the process may wait, and get_session holds
+        # the manager lock while start() waits for the multiplexer thread
+        threading.Thread(target=cleanup, daemon=True, name="SolsticeOpsTerminalExit").start()
+
+    def close(self):
+        self.keep_running = False
+        self.thread = None
+        pty_multiplexer.unregister(self.master_fd)
+        self._stop_process()
 
     def send_input(self, data):
+        data = data.encode()
         try:
-            os.write(self.master_fd, data.encode())
+            while data:
+                try:
+                    written = os.write(self.master_fd, data)
+                    data = data[written:]
+                except BlockingIOError:
+                    # The master fd is non-blocking: wait for the shell to take a large paste
+                    select.select([], [self.master_fd], [], 1)
         except:
             pass
 
@@ -209,6 +514,49 @@ class SystemSession(TerminalSession):
         except:
             pass
 
+class RemoteSession:
+    """
+    A session owned by another worker process. Input goes to the owner's channel and
+    output comes back to the consumer through the session group (see TerminalManager.listen).
+    """
+    def __init__(self, owner_channel, session_id, session_type, kwargs):
+        self.owner_channel = owner_channel
+        self.session_id = session_id
+        self.session_type = session_type
+        self.kwargs = kwargs
+        self.group = f"terminal.{session_key(session_id)}"
+
+    def _send(self, message_type, **fields):
+        from asgiref.sync import async_to_sync
+        async_to_sync(shared_channel_layer().send)(self.owner_channel, {'type': message_type, 'session_id': self.session_id, **fields})
+
+    def register_consumer(self, consumer, rows=None, cols=None):
+        from asgiref.sync import async_to_sync
+        async_to_sync(shared_channel_layer().group_add)(self.group, consumer.channel_name)
+        self._send('terminal.attach', session_type=self.session_type, kwargs=self.kwargs, reply_channel=consumer.channel_name,
+                   rows=rows, cols=cols)
+
+    def keepalive(self, consumer):
+        """Tells the owner consumer is still attached, see VIEWER_TTL."""
+        self._send('terminal.keepalive', reply_channel=consumer.channel_name)
+
+    def unregister_consumer(self, consumer):
+        from asgiref.sync import async_to_sync
+        try:
+            async_to_sync(shared_channel_layer().group_discard)(self.group, consumer.channel_name)
+            self._send('terminal.detach', reply_channel=consumer.channel_name)
+        except Exception as e:
+            logger.warning(f"Could not detach from terminal session {self.session_id}: {e}")
+
+    def send_input(self, data):
+        self._send('terminal.input', data=data)
+
+    def resize(self, rows, cols):
+        self._send('terminal.resize', rows=rows, cols=cols)
+
+    def restart(self):
+        self._send('terminal.restart')
+
 class TerminalManager:
     _instance = None
     _lock = threading.Lock()
@@ -226,8 +574,121 @@ class TerminalManager:
             if session:
                 session.restart()
                 return True
+        owner = self._remote_owner(session_id)
+        if owner:
+            RemoteSession(owner, session_id, None, {}).restart()
+            return True
         return False
 
+    def forget_session(self, session):
+        with self._lock:
+            for sid, sess in list(self.sessions.items()):
+                if sess is session:
+                    del self.sessions[sid]
+
+    def _owner_key(self, session_id):
+        return f"terminal_owner_{session_key(session_id)}"
+
+    def _remote_owner(self, session_id):
+        """Channel of the live process owning session_id, when that is not this process."""
+        if shared_channel_layer() is None:
+            return None
+        from django.core.cache import cache
+        owner = cache.get(self._owner_key(session_id))
+        if owner and owner['pid'] != os.getpid() and pid_alive(owner['pid']):
+            return owner['channel']
+        return None
+
+    def _claim(self, session_id, session):
+        """Records this process as the owner so consumers in other processes attach here."""
+        channel = self._ensure_listener()
+        if channel is None:
+            return
+        from django.core.cache import cache
+        session.remote_group = f"terminal.{session_key(session_id)}"
+        cache.set(self._owner_key(session_id), {'channel': channel, 'pid': os.getpid()}, OWNER_TTL)
+
+    def _ensure_listener(self):
+        if shared_channel_layer() is None:
+            return None
+        if getattr(self, 'listener', None) is None:
+            self.channel_ready = threading.Event()
+            self.listener = threading.Thread(target=lambda: asyncio.run(self.listen()), daemon=True, name="SolsticeOpsTerminalListener")
+            self.listener.start()
+            self.channel_ready.wait(timeout=5)
+        return getattr(self, 'channel', None)
+
+    async def listen(self):
+        """Serves consumers of other processes attached to the sessions of this one."""
+        from asgiref.sync import sync_to_async
+        layer = shared_channel_layer()
+        self.channel = await layer.new_channel('terminal')
+        self.channel_ready.set()
+        next_refresh = time.monotonic() + OWNER_TTL / 3
+        while True:
+            try:
+                message = await asyncio.wait_for(layer.receive(self.channel), timeout=max(0, next_refresh - time.monotonic()))
+            except asyncio.TimeoutError:
+                message = None
+            if message is not None:
+                try:
+                    await sync_to_async(self._handle_remote, thread_sensitive=False)(layer, message)
+                except Exception as e:
+                    logger.error(f"Terminal message {message.get('type')} failed: {e}")
+            if time.monotonic() >= next_refresh:
+                await sync_to_async(self._refresh_claims, thread_sensitive=False)()
+                next_refresh = time.monotonic() + OWNER_TTL / 3
+
+    def _refresh_claims(self):
+        """Renews the owner records and drops remote viewers whose process went silent."""
+        from django.core.cache import cache
+        with self._lock:
+            sessions = list(self.sessions.items())
+        expired = time.monotonic() - VIEWER_TTL
+        for session_id, session in sessions:
+            cache.set(self._owner_key(session_id), {'channel': self.channel, 'pid': os.getpid()}, OWNER_TTL)
+            with session.lock:
+                for channel, seen in list(session.remote_viewers.items()):
+                    if seen < expired:
+                        del session.remote_viewers[channel]
+
+    def _handle_remote(self, layer, message):
+        session_id = message['session_id']
+        if message['type'] == 'terminal.attach':
+            session = self.get_session(session_id, message['session_type'], **message['kwargs'])
+            if not isinstance(session, TerminalSession):
+                return
+            reply_channel = message['reply_channel']
+
+            def send(bytes_data=None):
+                session.remote_output.send(reply_channel, bytes_data)
+
+            def add():
+                session.remote_viewers[reply_channel] = time.monotonic()
+                # Group output queued before this is part of the snapshot or the held output
+                session.remote_output.send(reply_channel, b'', attached=True)
+
+            if message.get('rows') and message.get('cols'):
+                resize_session(session, message['rows'], message['cols'])
+            session.attach(send, add)
+            return
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            return
+        if message['type'] == 'terminal.detach':
+            with session.lock:
+                session.remote_viewers.pop(message.get('reply_channel'), None)
+        elif message['type'] == 'terminal.keepalive':
+            with session.lock:
+                session.remote_viewers[message['reply_channel']] = time.monotonic()
+        elif message['type'] == 'terminal.input':
+            session.send_input(message['data'])
+        elif message['type'] == 'terminal.resize':
+            resize_session(session, message['rows'], message['cols'])
+        elif message['type'] == 'terminal.restart':
+            session.restart()
+
     def get_session(self, session_id, session_type, **kwargs):
         with self._lock:
             session = self.sessions.get(session_id)
@@ -235,6 +696,12 @@ class TerminalManager:
                 del self.sessions[session_id]
 
             if session_id not in self.sessions:
+                # With a shared channel layer, a session started by another worker process
+                # is used from there instead of starting a second one here
+                owner = self._remote_owner(session_id)
+                if owner:
+                    return RemoteSession(owner, session_id, session_type, kwargs)
+
                 if session_type == 'system':
                     is_admin = kwargs.get('is_admin', False)
                     session = SystemSession(is_admin=is_admin)
@@ -254,6 +721,7 @@ class TerminalManager:
                 
                 session.start()
                 self.sessions[session_id] = session
+                self._claim(session_id, session)
             return self.sessions.get(session_id)
 
 manager = TerminalManager()
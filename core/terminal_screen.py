@@ -0,0 +1,446 @@
+import codecs
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# Printable text is everything between these: escape sequences and C0 control characters
+_TOKEN_RE = re.compile(
+    r'\x1b\[([?>=!]?)([0-9;:]*)([ -/]*)([@-~])'  # CSI
+    r'|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)'        # OSC (window title...), ignored
+    r'|\x1b[P^_X][^\x1b]*\x1b\\'                 # DCS, PM, APC, SOS, ignored
+    r'|\x1b[()*+\-./#%][ -~]'                    # charset designations, ignored
+    r'|\x1b(?![\[\]P^_X()*+\-./#%])([ -~])'      # other two-character escapes
+    r'|([\x00-\x1a\x1c-\x1f\x7f])'               # C0 controls
+)
+
+# Private modes a reconnecting client needs back besides the screen content
+# (cursor keys, mouse reporting, bracketed paste)
+_RESTORED_MODES = (1, 1000, 1002, 1003, 1005, 1006, 2004)
+_ALT_SCREEN_MODES = (47, 1047, 1049)
+
+@lru_cache(maxsize=4096)
+def _char_width(char):
+    """Columns taken by a non-ASCII character: 0 for combining marks, 2 for wide CJK and emoji."""
+    if unicodedata.combining(char) or unicodedata.category(char) in ('Mn', 'Me', 'Cf'):
+        return 0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    return 1
+
+class TerminalScreen:
+    """
+    A minimal VT100/xterm screen model: the visible grid, cursor, SGR attributes, scroll
+    region, alternate screen and a bounded scrollback. snapshot() renders it as escape
+    sequences that recreate the screen in a fresh xterm.js terminal, which is O(screen)
+    instead of replaying the raw history.
+    """
+    def __init__(self, rows=24, cols=80, scrollback=1000):
+        self.rows = rows
+        self.cols = cols
+        self.scrollback = deque(maxlen=scrollback)
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = ''
+        self.reset()
+
+    def reset(self):
+        self.lines = [self._blank_line() for _ in range(self.rows)]
+        self.main_lines = None
+        self.x = 0
+        self.y = 0
+        self.attr = ''
+        self.sgr = {}
+        self.wrap_pending = False
+        self.saved = (0, 0, '', {})
+        self.top = 0
+        self.bottom = self.rows - 1
+        self.modes = {7, 25}
+
+    def _blank_line(self, attr=''):
+        return [[' '] * self.cols, [attr] * self.cols]
+
+    # Geometry
+
+    def resize(self, rows, cols):
+        if rows < 1 or cols < 1 or (rows, cols) == (self.rows, self.cols):
+            return
+        for line in self.lines + (self.main_lines or []):
+            for cells, fill in ((line[0], ' '), (line[1], '')):
+                del cells[cols:]
+                cells.extend([fill] * (cols - len(cells)))
+        self.cols = cols
+        main = self.main_lines if self.main_lines is not None else self.lines
+        for lines in (self.lines, self.main_lines):
+            if lines is None:
+                continue
+            while len(lines) > rows:
+                # Shrinking pushes the top rows of the main screen into the scrollback
+                line = lines.pop(0)
+                if lines is main:
+                    self.scrollback.append(line)
+            while len(lines) < rows:
+                lines.append(self._blank_line())
+        self.y = max(0, min(self.y - max(0, self.rows - rows), rows - 1))
+        self.rows = rows
+        self.x = min(self.x, cols - 1)
+        self.top = 0
+        self.bottom = rows - 1
+        self.wrap_pending = False
+
+    def _scroll_up(self, count=1):
+        for _ in range(min(count, self.bottom - self.top + 1)):
+            line = self.lines.pop(self.top)
+            if self.top == 0 and self.main_lines is None:
+                self.scrollback.append(line)
+            self.lines.insert(self.bottom, self._blank_line(self._bg()))
+
+    def _scroll_down(self, count=1):
+        for _ in range(min(count, self.bottom - self.top + 1)):
+            del self.lines[self.bottom]
+            self.lines.insert(self.top, self._blank_line(self._bg()))
+
+    def _linefeed(self):
+        self.wrap_pending = False
+        if self.y == self.bottom:
+            self._scroll_up()
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _bg(self):
+        # Erased cells keep the background colour (as xterm does), nothing else
+        bg = self.sgr.get('bg')
+        return bg or ''
+
+    # Input
+
+    def feed(self, data):
+        text = self.pending + self.decoder.decode(data)
+        self.pending = ''
+        position = 0
+        for match in _TOKEN_RE.finditer(text):
+            if match.start() > position:
+                self._draw(text[position:match.start()])
+            position = match.end()
+            if match.group(4) is not None:
+                self._csi(match.group(1), match.group(2), match.group(3), match.group(4))
+            elif match.group(5) is not None:
+                self._escape(match.group(5))
+            elif match.group(6) is not None:
+                self._control(match.group(6))
+        rest = text[position:]
+        escape = rest.find('\x1b')
+        if escape == -1:
+            self._draw(rest)
+        else:
+            self._draw(rest[:escape])
+            # An escape sequence split across reads: finish it with the next data,
+            # unless it is too long to be one
+            self.pending = rest[escape:] if len(rest) - escape < 4096 else ''
+
+    def _draw(self, text):
+        text = text.replace('\x1b', '')
+        if text.isascii():
+            self._draw_narrow(text)
+            return
+        run = []
+        for char in text:
+            width = _char_width(char)
+            if width == 1:
+                run.append(char)
+                continue
+            if run:
+                self._draw_narrow(''.join(run))
+                run = []
+            if width == 2:
+                self._draw_wide(char)
+            else:
+                self._combine(char)
+        if run:
+            self._draw_narrow(''.join(run))
+
+    def _draw_wide(self, char):
+        if self.cols < 2:
+            return
+        if self.x + 2 > self.cols or self.wrap_pending:
+            if 7 in self.modes:
+                self.x = 0
+                self._linefeed()
+            else:
+                self.x = self.cols - 2
+        chars, attrs = self.lines[self.y]
+        # The second column of a wide character is an empty placeholder
+        chars[self.x:self.x + 2] = [char, '']
+        attrs[self.x:self.x + 2] = [self.attr] * 2
+        self.wrap_pending = False
+        if self.x + 2 >= self.cols:
+            self.x = self.cols - 1
+            self.wrap_pending = True
+        else:
+            self.x += 2
+
+    def _combine(self, char):
+        chars = self.lines[self.y][0]
+        x = self.x if self.wrap_pending else self.x - 1
+        if x >= 0 and not chars[x] and x > 0:
+            x -= 1
+        if x >= 0:
+            chars[x] += char
+
+    def _draw_narrow(self, text):
+        while text:
+            if self.wrap_pending:
+                if 7 in self.modes:
+                    self.x = 0
+                    self._linefeed()
+                self.wrap_pending = False
+            chars, attrs = self.lines[self.y]
+            part = text[:self.cols - self.x]
+            text = text[len(part):]
+            end = self.x + len(part)
+            chars[self.x:end] = part
+            attrs[self.x:end] = [self.attr] * len(part)
+            if end >= self.cols:
+                self.x = self.cols - 1
+                self.wrap_pending = True
+                if 7 not in self.modes:
+                    # Without autowrap the rest of the text overwrites the last column
+                    if text:
+                        chars[-1] = text[-1]
+                    text = ''
+            else:
+                self.x = end
+
+    def _control(self, char):
+        if char == '\r':
+            self.x = 0
+            self.wrap_pending = False
+        elif char in '\n\x0b\x0c':
+            self._linefeed()
+        elif char == '\b':
+            self.x = max(0, self.x - 1)
+            self.wrap_pending = False
+        elif char == '\t':
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+
+    def _escape(self, char):
+        if char == '7':
+            self.saved = (self.x, self.y, self.attr, dict(self.sgr))
+        elif char == '8':
+            self.x, self.y, self.attr, sgr = self.saved
+            self.sgr = dict(sgr)
+            self.wrap_pending = False
+        elif char == 'D':
+            self._linefeed()
+        elif char == 'E':
+            self.x = 0
+            self._linefeed()
+        elif char == 'M':
+            self.wrap_pending = False
+            if self.y == self.top:
+                self._scroll_down()
+            elif self.y > 0:
+                self.y -= 1
+        elif char == 'c':
+            self.scrollback.clear()
+            self.reset()
+
+    def _csi(self, prefix, params, intermediates, final):
+        if intermediates or prefix in '>=!' and prefix:
+            return
+        values = [int(p) if p.isdigit() else 0 for p in params.replace(':', ';').split(';')] if params else []
+        arg = values[0] if values and values[0] else 1
+        if prefix == '?':
+            if final in 'hl':
+                self._private_modes(values, final == 'h')
+            return
+        if final in 'Hf':
+            row = values[0] if values and values[0] else 1
+            col = values[1] if len(values) > 1 and values[1] else 1
+            self._move(col - 1, row - 1)
+        elif final == 'A':
+            self._move(self.x, max(self.y - arg, self.top if self.y >= self.top else 0))
+        elif final == 'B':
+            self._move(self.x, min(self.y + arg, self.bottom if self.y <= self.bottom else self.rows - 1))
+        elif final in 'Ca':
+            self._move(self.x + arg, self.y)
+        elif final == 'D':
+            self._move(self.x - arg, self.y)
+        elif final == 'E':
+            self._move(0, self.y + arg)
+        elif final == 'F':
+            self._move(0, self.y - arg)
+        elif final in 'G`':
+            self._move(arg - 1, self.y)
+        elif final == 'd':
+            self._move(self.x, arg - 1)
+        elif final == 'J':
+            self._erase_display(values[0] if values else 0)
+        elif final == 'K':
+            self._erase_line(values[0] if values else 0)
+        elif final == 'X':
+            self._erase(self.y, self.x, self.x + arg)
+        elif final == '@':
+            chars, attrs = self.lines[self.y]
+            chars[self.x:self.x] = [' '] * arg
+            attrs[self.x:self.x] = [self._bg()] * arg
+            del chars[self.cols:], attrs[self.cols:]
+        elif final == 'P':
+            chars, attrs = self.lines[self.y]
+            del chars[self.x:self.x + arg], attrs[self.x:self.x + arg]
+            chars.extend([' '] * (self.cols - len(chars)))
+            attrs.extend([self._bg()] * (self.cols - len(attrs)))
+        elif final == 'L' and self.top <= self.y <= self.bottom:
+            for _ in range(min(arg, self.bottom - self.y + 1)):
+                del self.lines[self.bottom]
+                self.lines.insert(self.y, self._blank_line(self._bg()))
+            self.x = 0
+        elif final == 'M' and self.top <= self.y <= self.bottom:
+            for _ in range(min(arg, self.bottom - self.y + 1)):
+                del self.lines[self.y]
+                self.lines.insert(self.bottom, self._blank_line(self._bg()))
+            self.x = 0
+        elif final == 'S':
+            self._scroll_up(arg)
+        elif final == 'T':
+            self._scroll_down(arg)
+        elif final == 'm':
+            self._set_attributes(values or [0])
+        elif final == 'r':
+            top = values[0] if values and values[0] else 1
+            bottom = values[1] if len(values) > 1 and values[1] else self.rows
+            if top < bottom <= self.rows:
+                self.top, self.bottom = top - 1, bottom - 1
+                self._move(0, 0)
+        elif final == 's':
+            self._escape('7')
+        elif final == 'u':
+            self._escape('8')
+
+    def _move(self, x, y):
+        self.x = max(0, min(x, self.cols - 1))
+        self.y = max(0, min(y, self.rows - 1))
+        self.wrap_pending = False
+
+    def _erase(self, y, start, end):
+        chars, attrs = self.lines[y]
+        end = min(end, self.cols)
+        if start < end:
+            chars[start:end] = [' '] * (end - start)
+            attrs[start:end] = [self._bg()] * (end - start)
+
+    def _erase_line(self, mode):
+        if mode == 0:
+            self._erase(self.y, self.x, self.cols)
+        elif mode == 1:
+            self._erase(self.y, 0, self.x + 1)
+        else:
+            self._erase(self.y, 0, self.cols)
+
+    def _erase_display(self, mode):
+        if mode == 0:
+            self._erase_line(0)
+            rows = range(self.y + 1, self.rows)
+        elif mode == 1:
+            self._erase_line(1)
+            rows = range(0, self.y)
+        elif mode == 3:
+            self.scrollback.clear()
+            return
+        else:
+            rows = range(self.rows)
+        for y in rows:
+            self._erase(y, 0, self.cols)
+
+    def _private_modes(self, values, enable):
+        for mode in values:
+            if mode in _ALT_SCREEN_MODES:
+                if enable and self.main_lines is None:
+                    if mode == 1049:
+                        self._escape('7')
+                    self.main_lines = self.lines
+                    self.lines = [self._blank_line() for _ in range(self.rows)]
+                elif not enable and self.main_lines is not None:
+                    self.lines = self.main_lines
+                    self.main_lines = None
+                    if mode == 1049:
+                        self._escape('8')
+            elif enable:
+                self.modes.add(mode)
+            else:
+                self.modes.discard(mode)
+
+    def _set_attributes(self, values):
+        sgr = self.sgr
+        i = 0
+        while i < len(values):
+            value = values[i]
+            if value == 0:
+                sgr.clear()
+            elif value in (1, 2, 3, 4, 5, 7, 8, 9):
+                sgr[value] = str(value)
+            elif value == 22:
+                sgr.pop(1, None)
+                sgr.pop(2, None)
+            elif value in (23, 24, 25, 27, 28, 29):
+                sgr.pop(value - 20, None)
+            elif 30 <= value <= 37 or 90 <= value <= 97:
+                sgr['fg'] = str(value)
+            elif 40 <= value <= 47 or 100 <= value <= 107:
+                sgr['bg'] = str(value)
+            elif value == 39:
+                sgr.pop('fg', None)
+            elif value == 49:
+                sgr.pop('bg', None)
+            elif value in (38, 48) and i + 1 < len(values):
+                key = 'fg' if value == 38 else 'bg'
+                if values[i + 1] == 5 and i + 2 < len(values):
+                    sgr[key] = f"{value};5;{values[i + 2]}"
+                    i += 2
+                elif values[i + 1] == 2 and i + 4 < len(values):
+                    sgr[key] = f"{value};2;{values[i + 2]};{values[i + 3]};{values[i + 4]}"
+                    i += 4
+            i += 1
+        self.attr = ';'.join(sgr[key] for key in sorted(sgr, key=str))
+
+    # Output
+
+    def _render_line(self, line):
+        chars, attrs = line
+        end = len(chars)
+        while end and chars[end - 1] == ' ' and not attrs[end - 1]:
+            end -= 1
+        out = []
+        current = ''
+        start = 0
+        for x in range(end + 1):
+            attr = attrs[x] if x < end else None
+            if x == end or attr != current:
+                out.append(''.join(chars[start:x]))
+                if x < end:
+                    out.append(f"\x1b[0;{attr}m" if attr else '\x1b[0m')
+                    current = attr
+                    start = x
+        if current:
+            out.append('\x1b[0m')
+        return ''.join(out)
+
+    def snapshot(self):
+        """Escape sequences that reset a client terminal and redraw this screen."""
+        out = ['\x1bc']
+        main = self.main_lines if self.main_lines is not None else self.lines
+        out.append('\r\n'.join(self._render_line(line) for line in list(self.scrollback) + main))
+        if self.main_lines is not None:
+            out.append('\x1b[?1049h\x1b[H')
+            out.append('\r\n'.join(self._render_line(line) for line in self.lines))
+        if (self.top, self.bottom) != (0, self.rows - 1):
+            out.append(f"\x1b[{self.top + 1};{self.bottom + 1}r")
+        out.append(f"\x1b[{self.y + 1};{self.x + 1}H")
+        out.append(f"\x1b[0;{self.attr}m" if self.attr else '\x1b[0m')
+        for mode in _RESTORED_MODES:
+            if mode in self.modes:
+                out.append(f"\x1b[?{mode}h")
+        if 25 not in self.modes:
+            out.append('\x1b[?25l')
+        if 7 not in self.modes:
+            out.append('\x1b[?7l')
+        return ''.join(out).encode('utf-8', 'replace')
@@ -2,7 +2,7 @@ import os
 import json
 import collections
 import subprocess
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
@@ -405,6 +405,7 @@ class CoreViewsTest(TestCase):
             manager.restart_session("test_unique")
             self.assertIn("test_unique", manager.sessions)
 
+@override_settings(DOCKER_TRANSPORT='cli')
 class DockerCLIWrapperTest(TestCase):
     @patch('core.docker_cli_wrapper.run_command')
     def test_container_list(self, mock_run):
@@ -428,6 +429,26 @@ class DockerCLIWrapperTest(TestCase):
         any_ps_a = any('ps' in str(call) and '-a' in str(call) for call in mock_run.call_args_list)
         self.assertTrue(any_ps_a)
 
+    @patch('core.docker_cli_wrapper.run_command')
+    def test_container_list_summary(self, mock_run):
+        from core.docker_cli_wrapper import DockerCLI
+        mock_run.side_effect = [
+            b'{"ID": "abc123", "Names": "web", "State": "running", "Image": "nginx"}\n',
+            b'[{"Id": "abc123", "Name": "/web", "Image": "sha256:1", "State": {"Status": "running"}, "Config": {"Image": "nginx", "Env": ["A=1"]}}]',
+        ]
+        containers = DockerCLI().containers.list(all=True, summary=True)
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(mock_run.call_args[0][0], ['docker', 'ps', '--no-trunc', '--format', '{{json .}}', '-a'])
+        container = containers[0]
+        self.assertEqual((container.id, container.name, container.status), ('abc123', 'web', 'running'))
+        self.assertEqual(mock_run.call_count, 1)
+
+        # Touching a field outside the summary inspects the container once
+        self.assertEqual(container.Config['Env'], ['A=1'])
+        self.assertEqual(container.image.id, 'sha256:1')
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(mock_run.call_args[0][0], ['docker', 'inspect', 'abc123'])
+
     @patch('core.docker_cli_wrapper.run_command')
     def test_container_methods(self, mock_run):
         from core.docker_cli_wrapper import Container, Image
@@ -647,6 +668,230 @@ class DockerCLIWrapperTest(TestCase):
         client.networks.create("new-net")
         mock_run.assert_called_with(['docker', 'network', 'create', '--driver', 'bridge', 'new-net'])
 
+class FakeAPIServer:
+    """Serves canned JSON API responses on a temporary unix socket, or on localhost TCP."""
+    def __init__(self, routes, unix_socket=True):
+        import tempfile
+        import threading
+        import socketserver
+        from http.server import BaseHTTPRequestHandler
+
+        self.routes = routes
+        self.requests = []
+        self.headers = []
+        self.connections = 0
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                engine.connections += 1
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                engine.requests.append((self.command, self.path, body))
+                engine.headers.append(self.headers)
+                route = engine.routes.get((self.command, self.path.split('?')[0]), (404, {'message': 'not found'}))
+                # Callable routes answer based on the full path, query string included
+                status, payload = route(self.path) if callable(route) else route
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.tmpdir = tempfile.mkdtemp()
+        if unix_socket:
+            self.socket_path = os.path.join(self.tmpdir, 'docker.sock')
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        else:
+            self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+            self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        import shutil
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+class DockerEngineAPITest(TestCase):
+    def setUp(self):
+        self.engine = FakeAPIServer({
+            ('GET', '/containers/json'): (200, [{'Id': 'abc123'}]),
+            ('GET', '/containers/abc123/json'): (200, {'Id': 'abc123', 'Name': '/web', 'State': {'Status': 'running'}, 'Config': {'Image': 'nginx'}}),
+            ('POST', '/containers/abc123/start'): (204, b''),
+            ('GET', '/containers/abc123/logs'): (200, b'\x01\x00\x00\x00\x00\x00\x00\x03out\x02\x00\x00\x00\x00\x00\x00\x03err'),
+            ('DELETE', '/volumes/vol1'): (409, {'message': 'volume is in use'}),
+            ('GET', '/info'): (200, {'ID': 'engine'}),
+        })
+        self.settings_override = override_settings(DOCKER_TRANSPORT='api', DOCKER_SOCKET=self.engine.socket_path)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        from core.docker_api import get_docker_api
+        get_docker_api().close()
+        self.settings_override.disable()
+        self.engine.stop()
+
+    @patch('core.docker_cli_wrapper.run_command')
+    def test_api_transport_without_forks(self, mock_run):
+        from core.docker_cli_wrapper import DockerCLI
+        client = DockerCLI()
+        self.assertEqual(client.info(), {'ID': 'engine'})
+
+        containers = client.containers.list()
+        self.assertEqual(len(containers), 1)
+        self.assertEqual(containers[0].name, 'web')
+        self.assertEqual(containers[0].status, 'running')
+
+        containers[0].start()
+        self.assertIn(('POST', '/containers/abc123/start', b''), self.engine.requests)
+        self.assertEqual(containers[0].logs(tail=10), b'outerr')
+        self.assertIn('tail=10', self.engine.requests[-1][1])
+
+        self.assertIsNone(client.containers.get('missing'))
+        mock_run.assert_not_called()
+        # All requests were served over a single keep-alive connection
+        self.assertEqual(self.engine.connections, 1)
+
+    def test_api_summary_listing(self):
+        from core.docker_cli_wrapper import DockerCLI
+        self.engine.routes[('GET', '/containers/json')] = (200, [
+            {'Id': 'abc123', 'Names': ['/web'], 'State': 'running', 'Image': 'nginx', 'ImageID': 'sha256:1'},
+        ])
+        container = DockerCLI().containers.list(summary=True)[0]
+        self.assertEqual(container.name, 'web')
+        self.assertEqual(container.status, 'running')
+        self.assertEqual(container.image.id, 'sha256:1')
+        self.assertEqual(container.image.tags, ['nginx'])
+        self.assertEqual(len(self.engine.requests), 1)
+
+        self.assertEqual(container.attrs['Config']['Image'], 'nginx')
+        self.assertEqual(self.engine.requests[-1][1], '/containers/abc123/json')
+
+    def test_api_errors_raise(self):
+        from core.docker_cli_wrapper import Volume
+        from core.docker_api import DockerAPIError
+        with self.assertRaises(DockerAPIError) as cm:
+            Volume({'Name': 'vol1'}).remove()
+        self.assertEqual(cm.exception.status, 409)
+        self.assertIsInstance(cm.exception, subprocess.CalledProcessError)
+        self.assertIn('volume is in use', str(cm.exception))
+
+    def test_event_stream(self):
+        from core.docker_api import get_docker_api
+        self.engine.routes[('GET', '/events')] = (200, b'{"Type": "container", "Action": "start"}\n\n{"Type": "image", "Action": "pull"}\n')
+        lines = list(get_docker_api().stream('GET', '/events', params={'since': 1}))
+        self.assertEqual([json.loads(line)['Type'] for line in lines], ['container', 'image'])
+        self.assertEqual(self.engine.requests[-1][1], '/events?since=1')
+
+    def test_transport_selection(self):
+        from core.docker_api import get_docker_api
+        self.assertIsNotNone(get_docker_api())
+        with override_settings(DOCKER_TRANSPORT='cli'):
+            self.assertIsNone(get_docker_api())
+        with override_settings(DOCKER_TRANSPORT='auto', DOCKER_SOCKET='/nonexistent/docker.sock'):
+            self.assertIsNone(get_docker_api())
+
+    def test_demux_stream(self):
+        from core.docker_api import demux_stream
+        self.assertEqual(demux_stream(b'plain tty output'), b'plain tty output')
+        self.assertEqual(demux_stream(b'\x01\x00\x00\x00\x00\x00\x00\x02hi'), b'hi')
+
+class DockerStateCacheTest(TestCase):
+    def setUp(self):
+        from core.docker_state import DockerStateCache
+        from core.docker_cli_wrapper import Container, Image, Volume, Network
+        self.Container = Container
+        self.state = DockerStateCache()
+        self.state.client = MagicMock()
+        self.web = Container({'Id': 'abc123', 'Name': '/web', 'State': {'Status': 'running', 'Running': True}})
+        self.db = Container({'Id': 'def456', 'Name': '/db', 'State': {'Status': 'exited', 'Running': False}})
+        self.state.client.containers.list.return_value = [self.web, self.db]
+        self.state.client.images.list.return_value = [Image({'Id': 'img1', 'RepoTags': ['nginx:latest']})]
+        self.state.client.volumes.list.return_value = [Volume({'Name': 'vol1'})]
+        self.state.client.networks.list.return_value = [Network({'Id': 'net1', 'Name': 'bridge'})]
+        self.state.resync()
+
+    def test_reads_from_memory(self):
+        self.assertTrue(self.state.synced)
+        self.assertEqual(len(self.state.list_containers(all=True)), 2)
+        self.assertEqual([c.id for c in self.state.list_containers()], ['abc123'])
+        self.assertIs(self.state.get_container('web'), self.web)
+        self.assertIs(self.state.get_container('def'), self.db)
+        self.assertIsNone(self.state.get_container(''))
+        self.assertEqual(self.state.get_network('bridge').id, 'net1')
+        self.assertEqual(self.state.get_volume('vol1').name, 'vol1')
+
+    def test_held_objects_are_compact(self):
+        import pickle
+        web = self.state.get_container('web')
+        self.assertIsNone(web._attrs)
+        self.assertEqual((web.id, web.name, web.status, web.running), ('abc123', 'web', 'running', True))
+        self.assertIs(web.image, web.image)
+        # Fields outside the hot set are decoded from the stored JSON on demand, once,
+        # and the text is dropped so the data is never held twice
+        self.assertEqual(web.State['Status'], 'running')
+        self.assertIsNone(web._raw)
+        with patch('core.docker_cli_wrapper.json.loads') as mock_loads:
+            self.assertEqual(web.attrs['State']['Status'], 'running')
+            mock_loads.assert_not_called()
+        self.assertIsInstance(web.attrs, dict)
+        json.dumps(web.attrs)
+        self.assertFalse(hasattr(web, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(web)).State['Status'], 'running')
+        self.assertIsNone(web.compact()._attrs)
+        self.assertEqual(web.State['Status'], 'running')
+
+    def test_apply_events(self):
+        stopped = self.Container({'Id': 'abc123', 'Name': '/web', 'State': {'Status': 'exited', 'Running': False}})
+        self.state.client.containers.get.return_value = stopped
+        self.state.apply_event({'Type': 'container', 'Action': 'die', 'Actor': {'ID': 'abc123'}})
+        self.assertEqual(self.state.get_container('abc123').status, 'exited')
+
+        # Exec events do not change container state
+        self.state.client.containers.get.reset_mock()
+        self.state.apply_event({'Type': 'container', 'Action': 'exec_start: ls', 'Actor': {'ID': 'abc123'}})
+        self.state.client.containers.get.assert_not_called()
+
+        self.state.apply_event({'Type': 'container', 'Action': 'destroy', 'Actor': {'ID': 'def456'}})
+        self.assertIsNone(self.state.get_container('db'))
+
+        self.state.apply_event({'Type': 'volume', 'Action': 'destroy', 'Actor': {'ID': 'vol1'}})
+        self.assertEqual(self.state.list_volumes(), [])
+
+        self.state.apply_event({'Type': 'image', 'Action': 'delete', 'Actor': {'ID': 'img1'}})
+        self.assertEqual(self.state.list_images(), [])
+
+    @override_settings(DOCKER_TRANSPORT='cli')
+    @patch('core.docker_cli_wrapper.run_command')
+    def test_managers_use_synced_cache(self, mock_run):
+        from core.docker_cli_wrapper import DockerCLI
+        with patch('core.docker_state.docker_state', self.state):
+            client = DockerCLI()
+            self.assertEqual(len(client.containers.list(all=True)), 2)
+            self.assertIs(client.containers.get('web'), self.web)
+            self.assertEqual(len(client.images.list()), 1)
+            mock_run.assert_not_called()
+
+            # Bypassing the cache, or losing the stream, goes back to the daemon
+            mock_run.return_value = b""
+            DockerCLI(use_cache=False).containers.list()
+            self.state.synced = False
+            client.containers.list()
+            self.assertEqual(mock_run.call_count, 2)
+
 class UtilsTest(TestCase):
     @patch('subprocess.check_output')
     def test_run_command_success(self, mock_sub):
@@ -655,6 +900,815 @@ class UtilsTest(TestCase):
         result = run_command(['echo', 'test'])
         self.assertEqual(result, mock_run_val)
 
+class PollSchedulerTest(TestCase):
+    def _wait(self, job):
+        from concurrent.futures import wait
+        wait([job.future], timeout=5)
+
+    def test_slow_job_does_not_delay_others(self):
+        import threading
+        from core.scheduler import PollScheduler, PollJob
+        release = threading.Event()
+        calls = collections.Counter()
+
+        def slow():
+            calls['slow'] += 1
+            release.wait(5)
+
+        def fast():
+            calls['fast'] += 1
+
+        scheduler = PollScheduler(workers=2)
+        slow_job = PollJob('slow', slow, interval=10, timeout=30, jitter=0)
+        fast_job = PollJob('fast', fast, interval=10, timeout=30, jitter=0)
+        scheduler.set_jobs([slow_job, fast_job], now=0)
+        for now in (1, 12, 23):
+            scheduler.run_pending(now=now)
+            self._wait(fast_job)
+            scheduler.run_pending(now=now + 1)
+        self.assertEqual(calls['fast'], 3)
+        # Still running: not started again, and reported once past its timeout
+        self.assertEqual(calls['slow'], 1)
+        scheduler.run_pending(now=40)
+        self.assertTrue(slow_job.timed_out)
+        self.assertEqual(slow_job.failures, 1)
+        release.set()
+        self._wait(slow_job)
+        scheduler.run_pending(now=50)
+        self.assertEqual(slow_job.next_run, 50 + 20)
+        scheduler.stop()
+
+    def test_stuck_worker_is_replaced(self):
+        import threading
+        from core.deadlines import job_time_left
+        from core.scheduler import PollScheduler, PollJob
+        release = threading.Event()
+        started = threading.Event()
+        ran = threading.Event()
+        limits = []
+
+        def stuck():
+            started.set()
+            release.wait(5)
+
+        scheduler = PollScheduler(workers=1)
+        stuck_job = PollJob('stuck', stuck, interval=10, timeout=5, jitter=0)
+        queued_job = PollJob('queued', lambda: (limits.append(job_time_left(30)), ran.set()), interval=10, timeout=2, jitter=0)
+        scheduler.set_jobs([stuck_job], now=0)
+        scheduler.run_pending(now=1)
+        self.assertTrue(started.wait(2))
+        scheduler.set_jobs([stuck_job, queued_job], now=2)
+        scheduler.run_pending(now=2)
+        # The only worker is stuck: past the timeout the waiting job gets a new pool
+        scheduler.run_pending(now=10)
+        self.assertTrue(stuck_job.timed_out)
+        self.assertEqual(scheduler.abandoned, [stuck_job.future])
+        self.assertTrue(ran.wait(2))
+        self.assertEqual(len(limits), 1)
+        # Its calls are bounded by its own timeout
+        self.assertLessEqual(limits[0], 2)
+        self.assertEqual(job_time_left(30), 30)
+        release.set()
+        self._wait(stuck_job)
+        scheduler.stop()
+
+    def test_abandoned_threads_are_capped(self):
+        import threading
+        from core.scheduler import PollScheduler, PollJob
+        release = threading.Event()
+        started = threading.Event()
+        scheduler = PollScheduler(workers=1, max_abandoned=0)
+        executor = scheduler.executor
+        job = PollJob('stuck', lambda: (started.set(), release.wait(5)), interval=10, timeout=5, jitter=0)
+        scheduler.set_jobs([job], now=0)
+        scheduler.run_pending(now=1)
+        self.assertTrue(started.wait(2))
+        with self.assertLogs('core.scheduler', 'ERROR'):
+            scheduler.run_pending(now=10)
+        # Counted as a failure, but its pool is kept
+        self.assertTrue(job.timed_out)
+        self.assertIs(scheduler.executor, executor)
+        release.set()
+        self._wait(job)
+        scheduler.stop()
+
+    def test_failures_back_off(self):
+        from core.scheduler import PollScheduler, PollJob
+
+        def failing():
+            raise RuntimeError("boom")
+
+        scheduler = PollScheduler(workers=1)
+        job = PollJob('failing', failing, interval=10, jitter=0, max_backoff=30)
+        scheduler.set_jobs([job], now=0)
+        delays = []
+        now = 1
+        for _ in range(3):
+            scheduler.run_pending(now=now)
+            self._wait(job)
+            scheduler.run_pending(now=now)
+            delays.append(job.next_run - now)
+            now = job.next_run
+        self.assertEqual(delays, [20, 30, 30])
+
+        # Reloading the job list keeps the schedule of known jobs
+        scheduler.set_jobs([PollJob('failing', failing, interval=5)], now=now)
+        self.assertIs(scheduler.jobs['failing'], job)
+        self.assertEqual(job.interval, 5)
+        scheduler.set_jobs([], now=now)
+        self.assertEqual(scheduler.jobs, {})
+        scheduler.stop()
+
+    def test_adaptive_poll_interval(self):
+        import time
+        from core.plugin_system import mark_tool_viewed
+        module = MockModule()
+        tool = Tool(name="mock-tool")
+        cache.delete('tool_viewed_mock-tool')
+        self.assertEqual(module.get_poll_interval(tool), module.poll_max_interval)
+        mark_tool_viewed(tool)
+        self.assertEqual(module.get_poll_interval(tool), module.poll_min_interval)
+        # Expensive polls are spread out even while watched
+        self.assertEqual(module.get_poll_interval(tool, last_duration=3), 30)
+        self.assertEqual(module.get_poll_interval(tool, last_duration=100), module.poll_max_interval)
+        cache.set('tool_viewed_mock-tool', time.time() - 120)
+        self.assertEqual(module.get_poll_interval(tool), module.poll_interval)
+
+    def test_interval_shrink_pulls_next_run_forward(self):
+        from core.scheduler import PollScheduler, PollJob
+        interval = {'value': 300}
+        scheduler = PollScheduler(workers=1)
+        job = PollJob('job', lambda: None, jitter=0, get_interval=lambda last_duration: interval['value'])
+        scheduler.set_jobs([job], now=0)
+        scheduler.run_pending(now=1)
+        self._wait(job)
+        scheduler.run_pending(now=2)
+        self.assertEqual(job.next_run, 302)
+        interval['value'] = 5
+        scheduler.run_pending(now=3)
+        self.assertEqual(job.next_run, 7)
+        scheduler.stop()
+
+    def test_load_poll_jobs(self):
+        from core.apps import load_poll_jobs
+        plugin_registry.register(MockModule)
+        Tool.objects.create(name="mock-tool", status="installed")
+        Tool.objects.create(name="other-tool", status="installed")
+        jobs = {job.key: job for job in load_poll_jobs()}
+        self.assertEqual(set(jobs), {'server_stats', 'tools_nav', 'tool_mock-tool'})
+        self.assertEqual(jobs['tool_mock-tool'].interval, BaseModule.poll_interval)
+        self.assertIsNotNone(jobs['tool_mock-tool'].get_interval)
+
+class LeaderLeaseTest(TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'worker.lock')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_single_holder(self):
+        from core.leader import FileLease
+        first, second = FileLease(self.path), FileLease(self.path)
+        self.assertTrue(first.try_acquire())
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        self.assertEqual(second.leader_pid(), os.getpid())
+        first.release()
+        self.assertTrue(second.try_acquire())
+        second.release()
+
+    @patch('core.scheduler.PollScheduler')
+    @patch('core.leader.FileLease')
+    @patch('core.apps.time.sleep')
+    def test_leader_only_with_shared_cache(self, mock_sleep, mock_lease, mock_scheduler):
+        from core.apps import background_worker
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}), \
+                self.assertLogs('core.apps', 'WARNING'):
+            background_worker()
+        mock_lease.assert_not_called()
+        mock_scheduler.return_value.run.assert_called_once()
+        with override_settings(CACHES={'default': {'BACKEND': 'core.cache_backends.SQLiteCache', 'LOCATION': self.path}}):
+            background_worker()
+        mock_lease.assert_called_once()
+        mock_lease.return_value.try_acquire.assert_called_once()
+
+    def test_failover_when_leader_dies(self):
+        import sys
+        import time
+        from core.leader import FileLease
+        script = (
+            "import sys, time; sys.path.insert(0, %r)\n"
+            "from core.leader import FileLease\n"
+            "FileLease(%r).try_acquire(); print('ok', flush=True); time.sleep(30)"
+        ) % (os.getcwd(), self.path)
+        leader = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE)
+        try:
+            self.assertEqual(leader.stdout.readline(), b'ok\n')
+            lease = FileLease(self.path)
+            self.assertFalse(lease.try_acquire())
+            self.assertEqual(lease.leader_pid(), leader.pid)
+            leader.kill()
+            leader.wait()
+            start = time.monotonic()
+            lease.wait(retry_interval=0.1)
+            self.assertLess(time.monotonic() - start, 2)
+            lease.release()
+        finally:
+            leader.kill()
+            leader.wait()
+            leader.stdout.close()
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from core.cache_backends import SQLiteCache
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_basic_operations(self):
+        import time
+        self.cache.set('stats', {'cpu': 5}, 30)
+        self.assertEqual(self.cache.get('stats'), {'cpu': 5})
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.get_many(['stats', 'missing']), {'stats': {'cpu': 5}})
+        self.assertFalse(self.cache.add('stats', 'other'))
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertEqual(self.cache.incr('new'), 2)
+        self.assertTrue(self.cache.has_key('new'))
+        self.assertTrue(self.cache.delete('new'))
+        self.assertFalse(self.cache.delete('new'))
+
+        self.cache.set('short', 'value', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.touch('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.assertTrue(self.cache.touch('stats', None))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('stats'))
+
+    def test_shared_between_instances(self):
+        import threading
+        from core.cache_backends import SQLiteCache
+        other = SQLiteCache(self.path, {})
+        self.cache.set('bg_server_stats', [1, 2, 3])
+        self.assertEqual(other.get('bg_server_stats'), [1, 2, 3])
+        thread = threading.Thread(target=other.set, args=('from_thread', 'x'))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.cache.get('from_thread'), 'x')
+
+    def test_cull(self):
+        self.cache.PURGE_EVERY = 1
+        for i in range(12):
+            self.cache.set(f'key{i}', i, 100 + i)
+        self.assertLessEqual(len(self.cache.get_many([f'key{i}' for i in range(12)])), 10)
+        self.assertEqual(self.cache.get('key11'), 11)
+
+    def test_refuses_files_others_control(self):
+        import sqlite3
+        from core.cache_backends import SQLiteCache
+        from core.private_files import UnsafeFileError
+        # A planted entry, signed with another key, is ignored instead of unpickled
+        conn = sqlite3.connect(self.path)
+        self.cache.set('stats', 1)
+        conn.execute("UPDATE cache SET value = ? WHERE key LIKE '%stats'", (b'x' * 32 + b'cos\nsystem\n',))
+        conn.commit()
+        self.assertIsNone(self.cache.get('stats'))
+        self.assertEqual(self.cache.get_many(['stats']), {})
+
+        planted = os.path.join(self.tmpdir, 'planted.sqlite3')
+        open(planted, 'w').close()
+        os.chmod(planted, 0o666)
+        with self.assertRaises(UnsafeFileError):
+            SQLiteCache(planted, {}).get('stats')
+        os.chmod(self.tmpdir, 0o777)
+        with self.assertRaises(UnsafeFileError):
+            SQLiteCache(os.path.join(self.tmpdir, 'new.sqlite3'), {}).get('stats')
+
+    def test_summary_containers_survive_pickling(self):
+        import pickle
+        from core.docker_cli_wrapper import Container
+        container = pickle.loads(pickle.dumps(Container(summary={'Id': 'c1', 'Name': 'web', 'Status': 'running'})))
+        with patch('core.docker_cli_wrapper.Container._fetch_attrs', return_value={'Id': 'c1', 'Created': '2026'}):
+            self.assertEqual(container.created, '2026')
+
+class SQLiteChannelLayerTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from core.channel_layers import SQLiteChannelLayer
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'channels.sqlite3')
+        self.layer = SQLiteChannelLayer(self.path, capacity=2)
+        # A second instance stands in for another worker process
+        self.other = SQLiteChannelLayer(self.path, capacity=2)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_groups_across_instances(self):
+        import asyncio
+        async def scenario():
+            channel = await self.layer.new_channel()
+            await self.layer.group_add('live.server_stats', channel)
+            await self.other.group_send('live.server_stats', {'type': 'live.update', 'n': 1})
+            await self.other.send(channel, {'type': 'direct', 'n': 2})
+            first = await asyncio.wait_for(self.layer.receive(channel), 2)
+            second = await asyncio.wait_for(self.layer.receive(channel), 2)
+            await self.layer.group_discard('live.server_stats', channel)
+            await self.other.group_send('live.server_stats', {'type': 'live.update', 'n': 3})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.layer.receive(channel), 0.3)
+            return first, second
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, {'type': 'live.update', 'n': 1})
+        self.assertEqual(second, {'type': 'direct', 'n': 2})
+
+    def test_capacity_and_expiry(self):
+        import asyncio
+        from channels.exceptions import ChannelFull
+        async def scenario():
+            await self.layer.send('general', {'type': 'a'})
+            await self.layer.send('general', {'type': 'b'})
+            with self.assertRaises(ChannelFull):
+                await self.layer.send('general', {'type': 'c'})
+            self.assertEqual((await self.other.receive('general'))['type'], 'a')
+
+            self.layer.expiry = -1
+            await self.layer.group_add('stale', 'general')
+            await self.layer.send('general', {'type': 'expired'})
+            await self.layer._run(self.layer._purge)
+            return await self.layer._run(lambda: self.layer._connection().execute('SELECT COUNT(*) FROM groups').fetchone()[0])
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+    def test_idle_poll_does_not_take_write_lock(self):
+        import sqlite3
+        self.layer._connection()
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            self.other._connection().execute('PRAGMA busy_timeout=0')
+            self.assertEqual(self.other._db_fetch({'general'}), [])
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+
+    def test_refuses_messages_others_wrote(self):
+        import asyncio
+        import time
+        from core.channel_layers import SQLiteChannelLayer
+        from core.private_files import UnsafeFileError
+        async def scenario():
+            await self.layer.send('general', {'type': 'first'})
+            await self.layer._run(lambda: self.layer._connection().execute(
+                "INSERT INTO messages (target, channel, body, expires) VALUES ('general', 'general', ?, ?)",
+                (b'x' * 32 + b'cos\nsystem\n', time.time() + 60)))
+            first = await asyncio.wait_for(self.other.receive('general'), 2)
+            await self.layer.send('general', {'type': 'second'})
+            second = await asyncio.wait_for(self.other.receive('general'), 2)
+            return first['type'], second['type']
+        self.assertEqual(asyncio.run(scenario()), ('first', 'second'))
+
+        os.chmod(self.tmpdir, 0o777)
+        layer = SQLiteChannelLayer(os.path.join(self.tmpdir, 'new.sqlite3'))
+        with self.assertRaises(UnsafeFileError):
+            asyncio.run(layer.send('general', {'type': 'a'}))
+
+class RemoteTerminalSessionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        from core.terminal_manager import TerminalManager
+        self.manager = TerminalManager()
+        self.manager.sessions.clear()
+
+    @patch('core.terminal_manager.shared_channel_layer')
+    def test_session_owned_elsewhere_is_attached(self, mock_layer):
+        from core.terminal_manager import RemoteSession, session_key
+        layer = mock_layer.return_value
+        layer.send = MagicMock()
+        layer.group_add = MagicMock()
+        cache.set(f"terminal_owner_{session_key('system_shell_1')}", {'channel': 'terminal.owner!x', 'pid': 1})
+        with patch('asgiref.sync.async_to_sync', side_effect=lambda f: f):
+            session = self.manager.get_session('system_shell_1', 'system', is_admin=False)
+            self.assertIsInstance(session, RemoteSession)
+            consumer = MagicMock(channel_name='specific.here!abc')
+            session.register_consumer(consumer)
+            session.send_input('ls\n')
+        layer.group_add.assert_called_with(f"terminal.{session_key('system_shell_1')}", 'specific.here!abc')
+        layer.send.assert_called_with('terminal.owner!x', {'type': 'terminal.input', 'session_id': 'system_shell_1', 'data': 'ls\n'})
+
+    @patch('core.terminal_manager.shared_channel_layer')
+    def test_owner_serves_remote_consumers(self, mock_layer):
+        from core.terminal_manager import TerminalSession
+        layer = mock_layer.return_value
+        session = TerminalSession()
+        session.thread = MagicMock()
+        session.send_input = MagicMock()
+        session.history.append(b'hello ')
+        session.history.append(b'world')
+        session.remote_group = 'terminal.abc'
+        self.manager.sessions['system_shell_2'] = session
+        with patch('asgiref.sync.async_to_sync', side_effect=lambda f: f):
+            self.manager._handle_remote(layer, {'type': 'terminal.attach', 'session_id': 'system_shell_2',
+                                                'session_type': 'system', 'kwargs': {}, 'reply_channel': 'specific.x!1'})
+            session.remote_output.join()
+            replies = [call[0] for call in layer.send.call_args_list]
+            self.assertEqual({channel for channel, _ in replies}, {'specific.x!1'})
+            self.assertIn(b'hello world', b''.join(message['data'] for _, message in replies))
+            # The reply ends with the attached marker
+            self.assertEqual([message['attached'] for _, message in replies][-1], True)
+            self.assertEqual(list(session.remote_viewers), ['specific.x!1'])
+            self.manager._handle_remote(layer, {'type': 'terminal.input', 'session_id': 'system_shell_2', 'data': 'pwd\n'})
+            session.send_input.assert_called_with('pwd\n')
+            session.add_history(b'more')
+            session.add_history(b' output')
+            session.remote_output.join()
+            self.assertEqual({call[0][0] for call in layer.group_send.call_args_list}, {'terminal.abc'})
+            self.assertEqual(b''.join(call[0][1]['data'] for call in layer.group_send.call_args_list), b'more output')
+            self.manager._handle_remote(layer, {'type': 'terminal.detach', 'session_id': 'system_shell_2',
+                                                'reply_channel': 'specific.x!1'})
+        self.assertEqual(session.remote_viewers, {})
+
+    def test_silent_remote_viewers_expire(self):
+        import time
+        from core.terminal_manager import TerminalSession, VIEWER_TTL
+        session = TerminalSession()
+        session.thread = MagicMock()
+        session.remote_viewers = {'specific.gone!1': time.monotonic() - VIEWER_TTL - 1, 'specific.here!2': time.monotonic() - 5}
+        self.manager.sessions['system_shell_3'] = session
+        self.manager.channel = 'terminal.owner!x'
+        self.manager._handle_remote(MagicMock(), {'type': 'terminal.keepalive', 'session_id': 'system_shell_3',
+                                                  'reply_channel': 'specific.here!2'})
+        self.manager._refresh_claims()
+        self.assertEqual(list(session.remote_viewers), ['specific.here!2'])
+
+    def test_remote_consumer_waits_for_the_snapshot(self):
+        import asyncio
+        from core.consumers import TerminalConsumer
+        consumer = TerminalConsumer()
+        consumer.output = MagicMock()
+        consumer.remote_attached = False
+
+        async def scenario():
+            # Already part of the snapshot
+            await consumer.terminal_output({'type': 'terminal.output', 'data': b'early'})
+            await consumer.terminal_reply({'type': 'terminal.reply', 'data': b'snapshot', 'attached': False})
+            await consumer.terminal_reply({'type': 'terminal.reply', 'data': b'', 'attached': True})
+            await consumer.terminal_output({'type': 'terminal.output', 'data': b'live'})
+        asyncio.run(scenario())
+        self.assertEqual([call.kwargs['bytes_data'] for call in consumer.output.send.call_args_list], [b'snapshot', b'live'])
+
+class LiveUpdatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='password')
+        self.tool = Tool.objects.create(name='docker', status='installed')
+
+    def test_publish_sends_only_changes(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from core.live import Publisher, group_name
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group_name('server_stats'), channel)
+        publisher = Publisher()
+
+        self.assertTrue(publisher.publish('server_stats', {'cpu_usage': 5, 'ram_usage': 40}, html='<b>5</b>'))
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message['data'], {'cpu_usage': 5, 'ram_usage': 40})
+        self.assertEqual(message['html'], '<b>5</b>')
+
+        self.assertFalse(publisher.publish('server_stats', {'cpu_usage': 5, 'ram_usage': 40}, html='<b>5</b>'))
+        self.assertTrue(publisher.publish('server_stats', {'cpu_usage': 7}, html='<b>7</b>'))
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message['data'], {'cpu_usage': 7})
+        self.assertEqual(message['removed'], ['ram_usage'])
+        self.assertEqual(cache.get('live_snapshot_server_stats')['data'], {'cpu_usage': 7})
+
+    def test_publish_from_threads_uses_server_loop(self):
+        import asyncio
+        import threading
+        from core import live
+        loop = asyncio.new_event_loop()
+        server = threading.Thread(target=loop.run_forever, daemon=True)
+        server.start()
+        sent = []
+
+        class Layer:
+            async def group_send(self, group, message):
+                sent.append((group, threading.current_thread()))
+
+        async def request(scope, receive, send):
+            pass
+
+        try:
+            asyncio.run_coroutine_threadsafe(live.ServerLoopMiddleware(request)({}, None, None), loop).result(2)
+            with patch('channels.layers.get_channel_layer', return_value=Layer()):
+                publishers = [threading.Thread(target=live.Publisher().publish, args=('server_stats', {'n': n})) for n in range(3)]
+                for thread in publishers:
+                    thread.start()
+                for thread in publishers:
+                    thread.join()
+        finally:
+            live._server_loop = None
+            loop.call_soon_threadsafe(loop.stop)
+            server.join()
+            loop.close()
+        self.assertEqual(sent, [('live.server_stats', server)] * 3)
+
+    def test_consumer_subscriptions(self):
+        from core.consumers import LiveUpdatesConsumer
+        from core import live
+        cache.set('live_snapshot_tool.docker', {'topic': 'tool.docker', 'data': {'status': 'running'}, 'html': None})
+        consumer = LiveUpdatesConsumer()
+        consumer.scope = {'user': self.user}
+        consumer.channel_name = 'test-channel'
+        consumer.channel_layer = MagicMock()
+        consumer.accept = MagicMock()
+        consumer.close = MagicMock()
+        consumer.send_json = MagicMock()
+
+        consumer.connect()
+        consumer.accept.assert_called_once()
+        with patch('core.consumers.async_to_sync', side_effect=lambda f: f):
+            consumer.receive_json({'subscribe': ['tool.docker', 'tool.missing', 'bad topic!', 'server_stats']})
+            self.assertEqual(consumer.topics, {'tool.docker', 'server_stats'})
+            consumer.channel_layer.group_add.assert_any_call('live.tool.docker', 'test-channel')
+            consumer.send_json.assert_called_once_with({'topic': 'tool.docker', 'data': {'status': 'running'}, 'html': None, 'snapshot': True})
+            self.assertTrue(live.is_watched('tool.docker'))
+            self.assertIsNotNone(cache.get('tool_viewed_docker'))
+
+            consumer.live_update({'type': 'live.update', 'topic': 'server_stats', 'data': {'cpu_usage': 1}})
+            consumer.send_json.assert_called_with({'topic': 'server_stats', 'data': {'cpu_usage': 1}})
+
+            consumer.disconnect(1000)
+            self.assertEqual(consumer.topics, set())
+            consumer.channel_layer.group_discard.assert_any_call('live.server_stats', 'test-channel')
+
+    def test_consumer_rejects_anonymous(self):
+        from django.contrib.auth.models import AnonymousUser
+        from core.consumers import LiveUpdatesConsumer
+        consumer = LiveUpdatesConsumer()
+        consumer.scope = {'user': AnonymousUser()}
+        consumer.accept = MagicMock()
+        consumer.close = MagicMock()
+        consumer.connect()
+        consumer.close.assert_called_once()
+        consumer.accept.assert_not_called()
+
+    def test_live_trigger_filter(self):
+        from core.templatetags.core_tags import live_trigger
+        self.assertEqual(live_trigger('every 5s'), 'live-update, every 5s')
+        self.assertEqual(live_trigger('every 5s', True), 'live-update, every 5s [!window.liveUpdatesConnected()]')
+        self.assertEqual(live_trigger('every 5s [ready], load', True), 'live-update, every 5s [ready], load')
+
+    def test_live_updates_need_a_shared_layer_with_a_shared_cache(self):
+        from core import live
+        memory = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        shared = {'BACKEND': 'core.cache_backends.SQLiteCache', 'LOCATION': '/tmp/unused.sqlite3'}
+        with override_settings(CACHES={'default': memory}), patch('core.terminal_manager.shared_channel_layer', return_value=None):
+            self.assertTrue(live.updates_reach_this_process())
+        with override_settings(CACHES={'default': shared}):
+            with patch('core.terminal_manager.shared_channel_layer', return_value=None):
+                self.assertFalse(live.updates_reach_this_process())
+            with patch('core.terminal_manager.shared_channel_layer', return_value=object()):
+                self.assertTrue(live.updates_reach_this_process())
+
+    @patch('core.views.get_server_stats', return_value={'cpu_usage': 12, 'cpu_cores_usage': [12], 'ram_usage': 1,
+                                                         'ram_segments': [], 'disks_usage': [], 'disk_usage': 1})
+    def test_server_stats_poll_publishes(self, mock_stats):
+        from core.apps import poll_server_stats, server_stats_interval
+        from core import live
+        live.publisher.forget()
+        self.assertEqual(server_stats_interval(), 15)
+        live.mark_watched(live.SERVER_STATS_TOPIC)
+        self.assertEqual(server_stats_interval(), 3)
+        poll_server_stats()
+        snapshot = live.get_snapshot(live.SERVER_STATS_TOPIC)
+        self.assertEqual(snapshot['data']['cpu_usage'], 12)
+        self.assertIn('12%', snapshot['html'])
+
+class ServiceProbeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        plugin_registry._reset()
+        plugin_registry.register(MockModule)
+        self.module = plugin_registry.get_module("mock-tool")
+        self.tool = Tool.objects.create(name="mock-tool", status="installed")
+
+    def test_status_reused_for_ttl_and_request(self):
+        from core.service_probes import ServiceProbeMiddleware
+        with patch.object(self.module, 'get_service_status', return_value='running') as probe:
+            for _ in range(3):
+                self.assertEqual(self.module.get_cached_service_status(self.tool), 'running')
+            self.assertEqual(probe.call_count, 1)
+            self.module.get_cached_service_status(self.tool, refresh=True)
+            self.assertEqual(probe.call_count, 2)
+
+            # Without a TTL, still probed once per request
+            self.module.service_status_ttl = 0
+            def view(request):
+                return [self.module.get_cached_service_status(self.tool) for _ in range(3)]
+            self.assertEqual(ServiceProbeMiddleware(view)(MagicMock()), ['running'] * 3)
+            self.assertEqual(probe.call_count, 3)
+
+    def test_concurrent_callers_share_one_probe(self):
+        import threading
+        import time
+        calls = []
+        def slow_version():
+            calls.append(1)
+            time.sleep(0.2)
+            return '1.2.3'
+        with patch.object(self.module, 'get_service_version', side_effect=slow_version):
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(self.module.get_cached_service_version())) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, ['1.2.3'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    @patch('core.views.run_command')
+    def test_tool_action_invalidates(self, mock_run):
+        User.objects.create_superuser(username='ops', password='password', email='ops@test.com')
+        self.client.login(username='ops', password='password')
+        from core.context_processors import TOOLS_NAV_CACHE_KEY
+        with patch.object(self.module, 'get_service_status', return_value='running'):
+            self.module.get_cached_service_status(self.tool)
+        cache.set(TOOLS_NAV_CACHE_KEY, {'mock-tool': {'service_version': '1.0', 'actual_service_status': 'running'}})
+        with patch.object(self.module, 'get_service_status', return_value='stopped'):
+            self.client.get(reverse('tool_action', kwargs={'tool_name': 'mock-tool', 'action': 'stop'}))
+            self.assertEqual(self.module.get_cached_service_status(self.tool), 'stopped')
+        # The sidebar shows the new status without waiting for the next poll
+        self.assertEqual(cache.get(TOOLS_NAV_CACHE_KEY)['mock-tool']['actual_service_status'], 'stopped')
+
+    def test_context_refreshed_without_the_request(self):
+        from django.core.handlers.wsgi import WSGIRequest
+        from core import views
+        user = User.objects.create_superuser(username='ops', password='password', email='ops@test.com')
+        self.client.login(username='ops', password='password')
+        seen, refreshes = [], []
+
+        def get_or_compute(key, ttl, compute, max_stale=0, refresh=None):
+            refreshes.append(refresh)
+            return compute()
+
+        with patch.object(self.module, 'get_context_data', side_effect=lambda request, tool: seen.append((request, tool)) or {}), \
+                patch.object(views, 'get_or_compute', side_effect=get_or_compute):
+            self.client.get(reverse('tool_detail', kwargs={'tool_name': 'mock-tool'}) + '?tab=status&namespace=team',
+                            HTTP_HX_REQUEST='true')
+            # The page's own compute gets the real request, the background refresh a stand-in
+            self.assertIsInstance(seen[0][0], WSGIRequest)
+            refreshes[0]()
+        request, tool = seen[1]
+        self.assertNotIsInstance(request, WSGIRequest)
+        self.assertEqual((request.method, request.path), ('GET', reverse('tool_detail', kwargs={'tool_name': 'mock-tool'})))
+        self.assertEqual((request.GET['tab'], request.GET['namespace']), ('status', 'team'))
+        self.assertEqual(request.headers.get('HX-Request'), 'true')
+        self.assertEqual((request.user.pk, tool.pk), (user.pk, self.tool.pk))
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        import threading
+        import time
+        from core.single_flight import get_or_compute
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'containers': 3}
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute('inventory', 30, compute))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [{'containers': 3}] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('inventory'), {'containers': 3})
+        self.assertIsNone(cache.get('inventory_computing'))
+
+    def test_waits_for_other_process(self):
+        import threading
+        from core.single_flight import get_or_compute
+        # Another process holds the lock and stores the value shortly after
+        cache.add('inventory_computing', 1, 30)
+        threading.Timer(0.2, lambda: cache.set('inventory', {'containers': 1}, 30)).start()
+        compute = MagicMock(return_value={'containers': 2})
+        self.assertEqual(get_or_compute('inventory', 30, compute), {'containers': 1})
+        compute.assert_not_called()
+
+    def test_errors_reach_waiting_callers(self):
+        from core.single_flight import SingleFlight
+        flights = SingleFlight()
+        with self.assertRaises(ValueError):
+            flights.do('key', MagicMock(side_effect=ValueError('probe failed')))
+        self.assertEqual(flights.flights, {})
+
+    def test_stale_value_served_while_refreshing(self):
+        import threading
+        import time
+        from core.single_flight import get_or_compute, store
+        store('stats', {'cpu': 1}, 30, max_stale=60)
+        compute = MagicMock(return_value={'cpu': 2})
+        self.assertEqual(get_or_compute('stats', 30, compute, max_stale=60), {'cpu': 1})
+        compute.assert_not_called()
+
+        # Expired: the stale value is returned at once and one refresh runs in the background
+        refreshed = threading.Event()
+        def slow_compute():
+            time.sleep(0.2)
+            refreshed.set()
+            return {'cpu': 3}
+        store('stats', {'cpu': 1}, -1, max_stale=60)
+        started = time.monotonic()
+        for _ in range(5):
+            self.assertEqual(get_or_compute('stats', 30, slow_compute, max_stale=60), {'cpu': 1})
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(50):
+            if cache.get('stats_computing') is None:
+                break
+            time.sleep(0.01)
+        self.assertEqual(get_or_compute('stats', 30, compute, max_stale=60), {'cpu': 3})
+        compute.assert_not_called()
+
+        # Past the staleness bound the entry is gone and the caller computes it
+        cache.delete('stats')
+        self.assertEqual(get_or_compute('stats', 30, compute, max_stale=60), {'cpu': 2})
+
+    def test_module_context_shared_across_users(self):
+        from core.views import module_context_key
+        module = MockModule()
+        tool = Tool(name='mock-tool')
+        alice, bob = MagicMock(id=1), MagicMock(id=2)
+        self.assertNotEqual(module_context_key(module, tool, alice), module_context_key(module, tool, bob))
+        module.context_per_user = False
+        self.assertEqual(module_context_key(module, tool, alice), 'module_context_mock-tool_shared')
+        self.assertEqual(module_context_key(module, tool, alice), module_context_key(module, tool, bob))
+
+class VersionTest(TestCase):
+    def setUp(self):
+        from core import version
+        version.clear_cache()
+
+    def test_stamped_version_file(self):
+        import tempfile
+        from core.version import resolve_version, get_core_version
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'VERSION'), 'w') as f:
+                f.write('v2.1.0\n')
+            with patch('core.version.subprocess.check_output') as check_output:
+                self.assertEqual(resolve_version(path), 'v2.1.0')
+                with override_settings(BASE_DIR=path):
+                    self.assertEqual(get_core_version(), 'v2.1.0')
+            check_output.assert_not_called()
+            # Without a VERSION file or a checkout there is nothing to fork git for
+            os.remove(os.path.join(path, 'VERSION'))
+            with override_settings(BASE_DIR=path):
+                self.assertEqual(get_core_version(), 'v0.0.0')
+
+    def test_git_tag_read_once_until_it_changes(self):
+        import tempfile
+        from core import version
+        with tempfile.TemporaryDirectory() as path:
+            git = lambda *args: subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args], cwd=path, check=True, capture_output=True)
+            git('init', '-q')
+            git('commit', '-q', '--allow-empty', '-m', 'init')
+            git('tag', 'v1.0.0')
+            self.assertEqual(version.resolve_version(path), 'v1.0.0')
+            with patch('core.version.subprocess.check_output') as check_output:
+                self.assertEqual(version.resolve_version(path), 'v1.0.0')
+            check_output.assert_not_called()
+            git('commit', '-q', '--allow-empty', '-m', 'next')
+            git('tag', 'v1.1.0')
+            self.assertEqual(version.resolve_version(path), 'v1.1.0')
+
+            # In a checkout a stale VERSION file does not hide the current tag
+            with open(os.path.join(path, 'VERSION'), 'w') as f:
+                f.write('v1.0.0\n')
+            self.assertEqual(version.resolve_version(path), 'v1.1.0')
+
+            # Modules use the tag of their own directory, without the 'v'
+            module = MockModule()
+            with patch('core.version.inspect.getfile', return_value=os.path.join(path, 'module.py')):
+                self.assertEqual(version.get_module_version(module), '1.1.0')
+        self.assertEqual(version.get_module_version(module), MockModule.version)
+
 class TagsTest(TestCase):
     def test_tools_nav_processor(self):
         from core.context_processors import tools_nav
@@ -668,6 +1722,35 @@ class TagsTest(TestCase):
         context = tools_nav(request)
         self.assertEqual(context, {})
 
+    def test_tools_nav_from_snapshot(self):
+        from core.apps import poll_tools_nav
+        from core.context_processors import tools_nav, TOOLS_NAV_CACHE_KEY
+        from core.version import get_core_version
+        cache.clear()
+        get_core_version()
+        plugin_registry.register(MockModule)
+        Tool.objects.create(name="mock-tool", status="installed", version="1.0.0")
+        module = plugin_registry.get_module("mock-tool")
+        request = MagicMock()
+        request.user.is_authenticated = True
+        with patch.object(module, 'get_service_status', return_value='stopped') as status, \
+             patch.object(module, 'get_service_version', return_value='2.5') as version, \
+             patch('core.version.subprocess.check_output') as check_output:
+            # Nothing polled yet: rendering shows an unknown status instead of probing
+            tool = tools_nav(request)['tools_nav'][0]
+            self.assertIsNone(tool.actual_service_status)
+            self.assertEqual(tool.service_version, "1.0.0")
+            status.assert_not_called()
+
+            poll_tools_nav()
+            self.assertEqual(cache.get(TOOLS_NAV_CACHE_KEY)['mock-tool'], {'service_version': '2.5', 'actual_service_status': 'stopped'})
+            for _ in range(3):
+                tool = tools_nav(request)['tools_nav'][0]
+            self.assertEqual((tool.service_version, tool.actual_service_status), ('2.5', 'stopped'))
+            self.assertEqual(status.call_count, 1)
+            self.assertEqual(version.call_count, 1)
+            check_output.assert_not_called()
+
     def test_divide_filter(self):
         from core.templatetags.core_tags import divide
         self.assertEqual(divide(10, 2), 5)
@@ -714,15 +1797,16 @@ class TerminalManagerTest(TestCase):
     def test_terminal_session_base(self):
         from core.terminal_manager import TerminalSession
         session = TerminalSession()
-        self.assertEqual(session.history, collections.deque(maxlen=10000))
+        self.assertEqual(len(session.history), 0)
+        self.assertEqual(session.history.capacity, 1024 * 1024)
         
         # Test consumer registration
         consumer = MagicMock()
         session.add_history(b"old history")
         session.register_consumer(consumer)
         self.assertIn(consumer, session.consumers)
-        # Should have sent history
-        consumer.send.assert_called_with(bytes_data=b"old history")
+        # Should have sent a snapshot of the screen
+        self.assertIn(b"old history", consumer.send.call_args.kwargs['bytes_data'])
         
         session.add_history(b"test")
         self.assertIn(b"test", session.history)
@@ -904,6 +1988,271 @@ class TerminalManagerTest(TestCase):
         res = manager.get_session('invalid', 'invalid-type')
         self.assertIsNone(res)
 
+class TerminalOutputTest(TestCase):
+    def make_output(self, **limits):
+        from core.consumers import TerminalOutput
+        consumer = MagicMock(channel_name='specific.x!1')
+        frames = []
+        async def send(bytes_data=None):
+            frames.append(bytes_data)
+        consumer.send = send
+        output = TerminalOutput(consumer)
+        for name, value in limits.items():
+            setattr(output, name, value)
+        return output, frames
+
+    def test_coalesces_small_chunks(self):
+        import asyncio
+        import threading
+        async def scenario():
+            output, frames = self.make_output()
+            writer = threading.Thread(target=lambda: [output.send(bytes_data=b'a') for _ in range(200)])
+            writer.start()
+            writer.join()
+            await asyncio.sleep(0.1)
+            output.close()
+            return frames
+        frames = asyncio.run(scenario())
+        self.assertEqual(b''.join(frames), b'a' * 200)
+        self.assertLessEqual(len(frames), 2)
+
+    def test_slow_client_is_resynced(self):
+        import asyncio
+        from core.consumers import TerminalOutput
+        async def scenario():
+            output, frames = self.make_output(WINDOW_BYTES=100, MAX_BYTES=1000, FRAME_BYTES=100)
+            output.ack(0)
+            output.send(bytes_data=b'x' * 100)
+            await asyncio.sleep(0.05)
+            self.assertEqual(frames, [b'x' * 100])
+            # The window is full: this piles up past MAX_BYTES and is dropped
+            for _ in range(30):
+                output.send(bytes_data=b'y' * 50)
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(frames), 1)
+            output.send(bytes_data=b'tail')
+            output.WINDOW_BYTES = 10000
+            output.ack(100)
+            await asyncio.sleep(0.05)
+            output.close()
+            return frames
+        frames = asyncio.run(scenario())
+        self.assertTrue(frames[1].startswith(TerminalOutput.SKIPPED_NOTICE))
+        resumed = b''.join(frames[1:])[len(TerminalOutput.SKIPPED_NOTICE):]
+        self.assertEqual(resumed, b'y' * 500 + b'tail')
+
+    @patch('core.consumers.manager')
+    def test_consumer_routes_input_and_output(self, mock_manager):
+        import asyncio
+        from channels.testing import WebsocketCommunicator
+        from core.consumers import TerminalConsumer
+        from core.terminal_manager import TerminalSession
+        user = User.objects.create_user(username='shell', password='password')
+        session = TerminalSession()
+        session.send_input = MagicMock()
+        mock_manager.get_session.return_value = session
+        async def scenario():
+            communicator = WebsocketCommunicator(TerminalConsumer.as_asgi(), '/ws/system/shell/')
+            communicator.scope['user'] = user
+            communicator.scope['url_route'] = {'kwargs': {'session_type': 'system'}}
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'input': 'ls\n'})
+            await asyncio.sleep(0.05)
+            session.add_history(b'file.txt\r\n')
+            output = await communicator.receive_from(timeout=1)
+            await communicator.disconnect()
+            return output
+        self.assertEqual(asyncio.run(scenario()), b'file.txt\r\n')
+        session.send_input.assert_called_with('ls\n')
+        self.assertEqual(session.consumers, set())
+
+class SessionExitTest(TestCase):
+    def test_exit_does_not_wait_for_manager_lock(self):
+        import threading
+        import time
+        from core.terminal_manager import SystemSession, manager
+        session = SystemSession.__new__(SystemSession)
+        session.process = MagicMock()
+        session.master_fd = -1
+        manager.sessions['exiting'] = session
+        # Held by get_session while start() waits for the multiplexer thread
+        with manager._lock:
+            exited = threading.Thread(target=session._on_exit)
+            exited.start()
+            exited.join(1)
+            self.assertFalse(exited.is_alive())
+            self.assertIn('exiting', manager.sessions)
+        deadline = time.monotonic() + 2
+        while 'exiting' in manager.sessions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertNotIn('exiting', manager.sessions)
+        session.process.wait.assert_called_once()
+
+class PTYMultiplexerTest(TestCase):
+    def test_dispatches_output_and_close(self):
+        import threading
+        from core.pty_multiplexer import PTYMultiplexer
+        mux = PTYMultiplexer()
+        read_fd, write_fd = os.pipe()
+        received = []
+        closed = threading.Event()
+        mux.register(read_fd, received.append, closed.set)
+        try:
+            os.write(write_fd, b'x' * 10000)
+            os.close(write_fd)
+            self.assertTrue(closed.wait(2))
+            self.assertEqual(b''.join(received), b'x' * 10000)
+            # The first read filled the 4096 byte buffer, the next ones were larger
+            self.assertEqual(len(received[0]), PTYMultiplexer.MIN_READ)
+            self.assertGreater(len(received[1]), PTYMultiplexer.MIN_READ)
+            self.assertEqual(mux.readers, {})
+        finally:
+            os.close(read_fd)
+
+    def test_unregister_stops_dispatch(self):
+        import time
+        from core.pty_multiplexer import PTYMultiplexer
+        mux = PTYMultiplexer()
+        read_fd, write_fd = os.pipe()
+        on_data, on_close = MagicMock(), MagicMock()
+        mux.register(read_fd, on_data, on_close)
+        mux.unregister(read_fd)
+        os.write(write_fd, b'late')
+        os.close(write_fd)
+        time.sleep(0.1)
+        on_data.assert_not_called()
+        on_close.assert_not_called()
+        os.close(read_fd)
+
+class ScrollbackBufferTest(TestCase):
+    def test_wraps_at_byte_budget(self):
+        from core.terminal_manager import ScrollbackBuffer
+        buffer = ScrollbackBuffer(16)
+        buffer.append(b'0123456789')
+        self.assertEqual(buffer.getvalue(), b'0123456789')
+        buffer.append(b'abcdefghij')
+        self.assertEqual(len(buffer), 16)
+        self.assertEqual(bytes(b''.join(buffer._views())), b'456789abcdefghij')
+        buffer.append(b'x' * 40)
+        self.assertEqual(bytes(b''.join(buffer._views())), b'x' * 16)
+        buffer.clear()
+        self.assertEqual(buffer.frames(), [])
+
+    def test_replay_frames(self):
+        from core.terminal_manager import ScrollbackBuffer, TerminalSession
+        buffer = ScrollbackBuffer(100)
+        buffer.append(b'first line\r\n' * 5)
+        buffer.append(b'\x1b[31mred\x1b[0m\r\n' * 5)
+        frames = buffer.frames(frame_size=32)
+        self.assertTrue(all(len(frame) <= 32 for frame in frames))
+        # Output was overwritten: replay starts after the first complete line
+        self.assertEqual(b''.join(frames), bytes(b''.join(buffer._views())).split(b'\n', 1)[1])
+
+    def test_since(self):
+        from core.terminal_manager import ScrollbackBuffer
+        buffer = ScrollbackBuffer(16)
+        buffer.append(b'0123456789')
+        position = buffer.written
+        buffer.append(b'abcdef')
+        self.assertEqual(buffer.since(position), b'abcdef')
+        buffer.append(b'ghij')
+        # Wrapped around the end of the buffer
+        self.assertEqual(buffer.since(position), b'abcdefghij')
+        self.assertEqual(buffer.since(buffer.written), b'')
+        buffer.append(b'x' * 10)
+        self.assertIsNone(buffer.since(position))
+        position = buffer.written
+        buffer.clear()
+        self.assertIsNone(buffer.since(position))
+
+class TerminalScreenTest(TestCase):
+    def test_screen_model(self):
+        from core.terminal_screen import TerminalScreen
+        screen = TerminalScreen(rows=4, cols=10, scrollback=2)
+        screen.feed('\x1b[1;31mred\x1b[0m plain text\r\n\u4e2d\u6587\x1b[?2004h\x1b[3;5H'.encode())
+        self.assertEqual(''.join(screen.lines[0][0]), 'red plain ')
+        self.assertEqual(screen.lines[0][1][:3], ['1;31'] * 3)
+        self.assertEqual(''.join(screen.lines[1][0]).rstrip(), 'text')
+        self.assertEqual(screen.lines[2][0][:4], ['\u4e2d', '', '\u6587', ''])
+        self.assertEqual((screen.y, screen.x), (2, 4))
+        snapshot = screen.snapshot()
+        self.assertTrue(snapshot.startswith(b'\x1bc\x1b[0;1;31mred\x1b[0m plain'))
+        self.assertTrue(snapshot.endswith(b'\x1b[3;5H\x1b[0m\x1b[?2004h'))
+
+        # Scrolled lines go to the bounded scrollback, the alternate screen keeps the main one
+        screen.feed(b'\r\n1\r\n2\r\n3\x1b[?1049h\x1b[Hvi')
+        self.assertEqual([''.join(line[0]).strip() for line in screen.scrollback], ['red plain', 'text'])
+        snapshot = screen.snapshot()
+        self.assertIn(b'3\x1b[?1049h\x1b[Hvi', snapshot)
+        screen.feed(b'\x1b[?1049')
+        screen.feed(b'l')
+        self.assertIsNone(screen.main_lines)
+        self.assertEqual(''.join(screen.lines[3][0]).strip(), '3')
+
+    def test_max_history_alias(self):
+        import warnings
+        from core.terminal_manager import TerminalSession
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            session = TerminalSession(max_history=2)
+        self.assertEqual(caught[0].category, DeprecationWarning)
+        self.assertEqual(session.history.capacity, 2 * TerminalSession.HISTORY_CHUNK_BYTES)
+        session.add_history(b'one')
+        session.add_history(b'two')
+        self.assertEqual(b''.join(session.history), b'onetwo')
+
+    def test_snapshot_on_attach(self):
+        import threading
+        import time
+        from core.terminal_manager import TerminalSession
+        session = TerminalSession(max_history_bytes=1024 * 1024)
+        for i in range(5000):
+            session.add_history(f'line {i}\r\n'.encode())
+        consumer = MagicMock()
+        session.register_consumer(consumer)
+        self.assertEqual(consumer.send.call_count, 1)
+        snapshot = consumer.send.call_args.kwargs['bytes_data']
+        # The screen and the last 1000 lines instead of 5000 lines of history
+        self.assertIn(b'line 4999\r\n', snapshot)
+        self.assertNotIn(b'line 3000\r\n', snapshot)
+        self.assertLess(len(snapshot), 15000)
+
+        # Output written while a snapshot renders follows the snapshot
+        other = MagicMock()
+        snapshot = session.screen.snapshot
+        session.screen.snapshot = lambda: (threading.Thread(target=session.add_history, args=(b'late',)).start(), time.sleep(0.1), snapshot())[2]
+        session.add_history(b'typed')
+        session.register_consumer(other)
+        self.assertIn(b'typed', other.send.call_args_list[0].kwargs['bytes_data'])
+        self.assertEqual(other.send.call_args_list[1].kwargs['bytes_data'], b'late')
+        consumer.send.assert_called_with(bytes_data=b'late')
+
+        session.resize_screen(10, 40)
+        self.assertEqual((session.screen.rows, session.screen.cols), (10, 40))
+
+    def test_screen_fed_as_output_arrives(self):
+        import time
+        from core.terminal_manager import TerminalSession
+        session = TerminalSession()
+        session.resize = MagicMock()
+        session.add_history(b'\x1b[2J\x1b[Hprompt$ ')
+        deadline = time.monotonic() + 2
+        while session.screen_position != session.history.written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(session.screen_position, session.history.written)
+        self.assertEqual(''.join(session.screen.lines[0][0]).strip(), 'prompt$')
+
+        # The consumer's size applies before its snapshot is rendered
+        from core.consumers import terminal_size
+        self.assertEqual(terminal_size({'query_string': b'rows=30&cols=100'}), (30, 100))
+        self.assertEqual(terminal_size({'query_string': b'rows=0&cols=x'}), (None, None))
+        consumer = MagicMock()
+        session.register_consumer(consumer, 30, 100)
+        session.resize.assert_called_with(30, 100)
+        self.assertEqual((session.screen.rows, session.screen.cols), (30, 100))
+        consumer.send.assert_called_once()
+
 class RoutingTest(TestCase):
     def test_websocket_urlpatterns(self):
         from core.routing import websocket_urlpatterns
@@ -979,6 +2328,7 @@ class DeploymentTest(TestCase):
         from solstice_ops.wsgi import application
         self.assertIsNotNone(application)
 
+@override_settings(K8S_WATCH_CACHE=False, K8S_TRANSPORT='cli')
 class K8sCLIWrapperTest(TestCase):
     @patch('core.k8s_cli_wrapper.get_kubeconfig')
     @patch('core.k8s_cli_wrapper.run_command')
@@ -1101,3 +2451,344 @@ class K8sCLIWrapperTest(TestCase):
         
         with self.assertRaises(AttributeError):
             _ = obj.nonexistent
+
+    def test_k8s_object_memoizes_attributes(self):
+        import pickle
+        from core.k8s_cli_wrapper import Pod
+        pod = Pod({'metadata': {'name': 'p1'}, 'status': {'podIP': '10.0.0.5', 'containerStatuses': [{'restartCount': 1}]}})
+        self.assertFalse(hasattr(pod, '__dict__'))
+        self.assertEqual(pod.status.pod_ip, '10.0.0.5')
+        self.assertIs(pod.status, pod.status)
+        self.assertIs(pod.status.container_statuses, pod.status.container_statuses)
+        self.assertEqual(pod['status']['container_statuses'][0].restart_count, 1)
+        with self.assertRaises(AttributeError):
+            _ = pod.missing
+        with self.assertRaises(AttributeError):
+            _ = pod.missing
+
+        pod.kube_context = 'staging'
+        copy = pickle.loads(pickle.dumps(pod))
+        self.assertEqual((copy.name, copy.kube_context), ('p1', 'staging'))
+        with self.assertRaises(AttributeError):
+            _ = copy.missing
+
+class K8sInformerTest(TestCase):
+    def _informer(self):
+        from core.k8s_informer import ResourceInformer
+        from core.k8s_cli_wrapper import Pod
+        return ResourceInformer('pod', Pod, lambda: {}, namespace='default')
+
+    def _pod(self, uid, name, rv):
+        return {'metadata': {'uid': uid, 'name': name, 'namespace': 'default', 'resourceVersion': rv}}
+
+    @patch('core.k8s_informer.run_command')
+    def test_relist_and_events(self, mock_run):
+        informer = self._informer()
+        mock_run.return_value = json.dumps({'metadata': {'resourceVersion': '7'},
+                                            'items': [self._pod('u1', 'pod1', '1'), self._pod('u2', 'pod2', '1')]}).encode()
+        informer.relist()
+        self.assertTrue(informer.synced)
+        self.assertEqual(mock_run.call_args[0][0], ['kubectl', 'get', '--raw', '/api/v1/namespaces/default/pods'])
+        self.assertEqual(informer.resource_version, '7')
+        self.assertEqual(len(informer.items()), 2)
+
+        pod1 = informer.get('pod1')
+        # Unchanged resourceVersion keeps the existing object
+        informer.apply_event({'type': 'ADDED', 'object': self._pod('u1', 'pod1', '1')})
+        self.assertIs(informer.get('pod1'), pod1)
+        informer.apply_event({'type': 'MODIFIED', 'object': self._pod('u1', 'pod1', '2')})
+        self.assertIsNot(informer.get('pod1'), pod1)
+
+        informer.apply_event({'type': 'DELETED', 'object': self._pod('u2', 'pod2', '3')})
+        self.assertIsNone(informer.get('pod2', namespace='default'))
+        self.assertEqual(len(informer.items()), 1)
+        self.assertFalse(informer.apply_event({'type': 'ERROR', 'object': {'message': 'too old resource version'}}))
+
+    @patch('core.k8s_informer.subprocess.Popen')
+    def test_watch_parses_event_stream(self, mock_popen):
+        informer = self._informer()
+        r, w = os.pipe()
+        stream = json.dumps({'type': 'ADDED', 'object': self._pod('u3', 'pod3', '5')}, indent=4)
+        stream += json.dumps({'type': 'ADDED', 'object': self._pod('u4', 'pod4', '6')}, indent=4)
+        os.write(w, stream.encode())
+        os.close(w)
+        process = MagicMock()
+        process.stdout = os.fdopen(r, 'rb')
+        mock_popen.return_value = process
+
+        informer.resource_version = '4'
+        informer.watch()
+        process.stdout.close()
+        # Watches from the list's resourceVersion, so nothing between list and watch is missed
+        self.assertEqual(mock_popen.call_args[0][0][:3], ['kubectl', 'get', '--raw'])
+        self.assertIn('watch=1&resourceVersion=4&', mock_popen.call_args[0][0][3])
+        self.assertEqual(sorted(p.name for p in informer.items()), ['pod3', 'pod4'])
+        process.terminate.assert_called()
+
+    @patch('core.k8s_informer.ResourceInformer.run')
+    def test_registry_caps_and_drops_informers(self, mock_run):
+        from core.k8s_informer import InformerRegistry
+        from core.k8s_cli_wrapper import Pod
+        registry = InformerRegistry(max_informers=2)
+        stopped = set()
+        with patch('core.k8s_informer.ResourceInformer.is_alive', lambda informer: informer not in stopped):
+            first = registry.get('pod', Pod, lambda: {}, namespace='a')
+            first.last_read -= 10
+            second = registry.get('pod', Pod, lambda: {}, namespace='b')
+            # The least recently read informer makes room
+            registry.get('pod', Pod, lambda: {}, namespace='c')
+            self.assertFalse(first.keep_running)
+            self.assertEqual(sorted(k[2] for k in registry.informers), ['b', 'c'])
+            # Stopped ones are dropped
+            stopped.add(second)
+            registry.get('pod', Pod, lambda: {}, namespace='d')
+            self.assertEqual(sorted(k[2] for k in registry.informers), ['c', 'd'])
+
+    @override_settings(K8S_WATCH_CACHE=True, K8S_TRANSPORT='cli')
+    @patch('core.k8s_cli_wrapper.run_command')
+    def test_manager_reads_from_synced_informer(self, mock_run):
+        from core.k8s_cli_wrapper import K8sCLI
+        informer = self._informer()
+        with patch('core.k8s_informer.run_command') as mock_list:
+            mock_list.return_value = json.dumps({'items': [self._pod('u1', 'pod1', '1')]}).encode()
+            informer.relist()
+        with patch('core.k8s_cli_wrapper.informers') as mock_informers:
+            mock_informers.get.return_value = informer
+            mock_informers.find.return_value = informer
+            k8s = K8sCLI()
+            self.assertEqual([p.name for p in k8s.pods.list(namespace='default')], ['pod1'])
+            self.assertEqual(k8s.pods.get('pod1', namespace='default').name, 'pod1')
+            mock_run.assert_not_called()
+
+            # Not yet synced falls back to kubectl
+            informer.synced = False
+            mock_run.return_value = b'{"items": []}'
+            self.assertEqual(k8s.pods.list(namespace='default'), [])
+            mock_run.assert_called()
+
+@override_settings(K8S_WATCH_CACHE=False)
+class K8sAPITest(TestCase):
+    def setUp(self):
+        import tempfile
+        self.server = FakeAPIServer({
+            ('GET', '/api/v1/namespaces/team/pods'): (200, {'kind': 'PodList', 'apiVersion': 'v1', 'metadata': {'resourceVersion': '10'}, 'items': [
+                {'metadata': {'name': 'pod1', 'namespace': 'team', 'uid': 'u1'}, 'status': {'phase': 'Running'}},
+            ]}),
+            ('GET', '/api/v1/namespaces/team/pods/pod1/log'): (200, b'log line'),
+            ('GET', '/apis/apps/v1/namespaces/prod/deployments/web'): (200, {'metadata': {'name': 'web'}, 'spec': {'replicas': 2}}),
+            ('PATCH', '/apis/apps/v1/namespaces/prod/deployments/web/scale'): (200, {}),
+            ('PATCH', '/apis/apps/v1/namespaces/prod/deployments/web'): (200, {}),
+            ('DELETE', '/api/v1/namespaces/team/pods/pod1'): (200, {}),
+            ('GET', '/version'): (200, {'gitVersion': 'v1.30.0'}),
+        }, unix_socket=False)
+        self.kubeconfig = {
+            'current-context': 'admin@test',
+            'contexts': [{'name': 'admin@test', 'context': {'cluster': 'test', 'user': 'admin', 'namespace': 'team'}}],
+            'clusters': [{'name': 'test', 'cluster': {'server': self.server.url}}],
+            'users': [{'name': 'admin', 'user': {'token': 'secret-token'}}],
+        }
+        fd, self.config_path = tempfile.mkstemp()
+        os.close(fd)
+        patcher = patch('core.k8s_api.run_command', return_value=json.dumps(self.kubeconfig).encode())
+        self.mock_config_view = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('core.k8s_cli_wrapper.get_kubeconfig', return_value=self.config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.stop()
+        os.remove(self.config_path)
+
+    @patch('core.k8s_cli_wrapper.run_command')
+    def test_rest_transport(self, mock_run):
+        from core.k8s_cli_wrapper import K8sCLI, Pod
+        k8s = K8sCLI()
+        pods = k8s.pods.list()
+        self.assertIsInstance(pods[0], Pod)
+        self.assertEqual(pods[0].name, 'pod1')
+        self.assertEqual(pods[0].kind, 'Pod')
+        self.assertEqual(pods[0].status.phase, 'Running')
+        self.assertEqual(pods[0].logs(tail=5), b'log line')
+        self.assertIn('tailLines=5', self.server.requests[-1][1])
+        self.assertEqual(self.server.headers[-1]['Authorization'], 'Bearer secret-token')
+
+        self.assertEqual(k8s.deployments.get('web', namespace='prod').replicas, 2)
+        self.assertIsNone(k8s.deployments.get('missing', namespace='prod'))
+        k8s.deployments.scale('web', 3, namespace='prod')
+        self.assertEqual(json.loads(self.server.requests[-1][2]), {'spec': {'replicas': 3}})
+        k8s.deployments.restart('web', namespace='prod')
+        self.assertIn('restartedAt', self.server.requests[-1][2].decode())
+        k8s.pods.delete('pod1')
+        self.assertEqual(self.server.requests[-1][0], 'DELETE')
+
+        self.assertEqual(k8s.info()['serverVersion']['gitVersion'], 'v1.30.0')
+        self.assertEqual(k8s.get_context(), 'admin@test')
+        mock_run.assert_not_called()
+        # The kubeconfig is resolved once and connections are reused
+        self.assertEqual(self.mock_config_view.call_count, 1)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_exec_credentials_fall_back_to_kubectl(self):
+        from core.k8s_api import get_k8s_api
+        self.kubeconfig['users'][0]['user'] = {'exec': {'command': 'aws'}}
+        self.mock_config_view.return_value = json.dumps(self.kubeconfig).encode()
+        os.utime(self.config_path, ns=(1, 1))
+        self.assertIsNone(get_k8s_api(self.config_path))
+        with override_settings(K8S_TRANSPORT='cli'):
+            self.assertIsNone(get_k8s_api(self.config_path))
+
+    def test_informer_uses_rest_watch(self):
+        from core.k8s_informer import ResourceInformer
+        from core.k8s_api import get_k8s_api
+        from core.k8s_cli_wrapper import Pod
+        api = get_k8s_api(self.config_path)
+        self.server.routes[('GET', '/api/v1/namespaces/team/pods')] = (200, {'metadata': {'resourceVersion': '10'}, 'items': []})
+        informer = ResourceInformer('pod', Pod, lambda: {}, lambda: api)
+        informer.relist()
+        self.assertEqual(informer.resource_version, '10')
+
+        self.server.routes[('GET', '/api/v1/namespaces/team/pods')] = (200, json.dumps(
+            {'type': 'ADDED', 'object': {'metadata': {'uid': 'u9', 'name': 'pod9', 'namespace': 'team', 'resourceVersion': '11'}}}
+        ).encode() + b'\n')
+        informer.watch()
+        self.assertIn('resourceVersion=10', self.server.requests[-1][1])
+        self.assertEqual([p.name for p in informer.items()], ['pod9'])
+        self.assertEqual(informer.resource_version, '11')
+
+    def test_paged_list(self):
+        from urllib.parse import urlsplit, parse_qs
+        from core.k8s_cli_wrapper import K8sCLI
+        from core.utils import paginate_list
+        names = [f"pod{i}" for i in range(5)]
+
+        def pods(path):
+            query = parse_qs(urlsplit(path).query)
+            if query.get('continue') == ['stale']:
+                return 410, {'message': 'The provided continue parameter is too old'}
+            start = int(query.get('continue', ['0'])[0])
+            limit = int(query.get('limit', ['500'])[0])
+            chunk = names[start:start + limit]
+            metadata = {}
+            if start + limit < len(names):
+                metadata = {'continue': str(start + limit), 'remainingItemCount': len(names) - start - limit}
+            return 200, {'kind': 'PodList', 'metadata': metadata, 'items': [{'metadata': {'name': n}} for n in chunk]}
+        self.server.routes[('GET', '/api/v1/namespaces/team/pods')] = pods
+
+        k8s = K8sCLI()
+        chunk = k8s.pods.list(limit=2, label_selector='app=web', field_selector='status.phase=Running')
+        self.assertEqual([p.name for p in chunk], ['pod0', 'pod1'])
+        self.assertEqual(chunk.continue_token, '2')
+        self.assertEqual(chunk.remaining_item_count, 3)
+        query = parse_qs(urlsplit(self.server.requests[-1][1]).query)
+        self.assertEqual(query['labelSelector'], ['app=web'])
+        self.assertEqual(query['fieldSelector'], ['status.phase=Running'])
+        self.assertEqual(k8s.pods.list(limit=2, continue_token=chunk.continue_token).continue_token, '4')
+
+        cache.clear()
+        source = k8s.pods.paged()
+        page = paginate_list(source, 1, 2)
+        self.assertEqual([p.name for p in page['items']], ['pod0', 'pod1'])
+        self.assertEqual((page['total_items'], page['total_pages'], page['has_next']), (5, 3, True))
+        # Jumping ahead walks the continue tokens, one bounded request per page
+        requests_before = len(self.server.requests)
+        page = paginate_list(source, 3, 2)
+        self.assertEqual([p.name for p in page['items']], ['pod4'])
+        self.assertFalse(page['has_next'])
+        self.assertEqual(len(self.server.requests) - requests_before, 2)
+
+        # Going back to an earlier page keeps the tokens of the later ones
+        requests_before = len(self.server.requests)
+        paginate_list(source, 1, 2)
+        page = paginate_list(source, 3, 2)
+        self.assertEqual([p.name for p in page['items']], ['pod4'])
+        self.assertEqual(len(self.server.requests) - requests_before, 2)
+
+        # An expired continue token walks to the requested page again from the first one
+        cache.set(f"{source.cache_key}_2", [None, 'stale'], 300)
+        page = paginate_list(source, 2, 2)
+        self.assertEqual(page['page'], 2)
+        self.assertEqual([p.name for p in page['items']], ['pod2', 'pod3'])
+
+        # Searching needs the full list
+        page = paginate_list(source, 1, 10, search_query='pod3', search_fields=['metadata.name'])
+        self.assertEqual([p.name for p in page['items']], ['pod3'])
+
+    @patch('core.k8s_cli_wrapper.run_command')
+    def test_paged_list_over_kubectl(self, mock_run):
+        from core.k8s_cli_wrapper import K8sCLI
+        mock_run.return_value = json.dumps({'metadata': {'continue': 'next'}, 'items': [{'metadata': {'name': 'pod1'}}]}).encode()
+        with override_settings(K8S_TRANSPORT='cli'):
+            chunk = K8sCLI().pods.list(limit=1, label_selector='app=web')
+            self.assertEqual(chunk.continue_token, 'next')
+            self.assertEqual(mock_run.call_args[0][0], ['kubectl', 'get', '--raw', '/api/v1/namespaces/team/pods?labelSelector=app%3Dweb&limit=1'])
+
+            K8sCLI().pods.list(label_selector='app=web', field_selector='status.phase=Running')
+            self.assertEqual(mock_run.call_args[0][0], ['kubectl', 'get', 'pod', '-o', 'json', '-l', 'app=web', '--field-selector', 'status.phase=Running'])
+
+class KubeconfigResolverTest(TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        self.first = os.path.join(self.tmpdir, 'admin.conf')
+        self.second = os.path.join(self.tmpdir, 'config')
+        with open(self.second, 'w') as f:
+            f.write('apiVersion: v1')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_path_and_env_are_cached(self):
+        from core.k8s_config import KubeconfigResolver
+        resolver = KubeconfigResolver(candidates=[self.first, self.second])
+        self.assertEqual(resolver.path(), self.second)
+        env = resolver.env()
+        self.assertEqual(env['KUBECONFIG'], self.second)
+
+        with patch('core.k8s_config.os.path.exists') as mock_exists:
+            self.assertEqual(resolver.path(), self.second)
+            self.assertIs(resolver.env(), env)
+            mock_exists.assert_not_called()
+
+        # A new higher-priority file is only picked up once the chosen one changes
+        with open(self.first, 'w') as f:
+            f.write('apiVersion: v1')
+        self.assertEqual(resolver.path(), self.second)
+        with open(self.second, 'a') as f:
+            f.write('\nkind: Config')
+        self.assertEqual(resolver.path(), self.first)
+        self.assertEqual(resolver.env()['KUBECONFIG'], self.first)
+
+        resolver.switch(self.second)
+        self.assertEqual(resolver.path(), self.second)
+        os.remove(self.second)
+        self.assertIsNone(resolver.path())
+        resolver.switch(None)
+        self.assertEqual(resolver.path(), self.first)
+
+    def test_missing_kubeconfig_is_not_reprobed(self):
+        from core.k8s_config import KubeconfigResolver
+        resolver = KubeconfigResolver(candidates=[self.first])
+        self.assertIsNone(resolver.path())
+        self.assertNotIn('KUBECONFIG', resolver.env())
+        with open(self.first, 'w') as f:
+            f.write('apiVersion: v1')
+        self.assertIsNone(resolver.path())
+        resolver.invalidate()
+        self.assertEqual(resolver.path(), self.first)
+
+    @override_settings(K8S_WATCH_CACHE=False, K8S_TRANSPORT='cli')
+    @patch('core.k8s_cli_wrapper.get_kubeconfig', return_value=None)
+    @patch('core.k8s_cli_wrapper.run_command')
+    def test_named_context(self, mock_run, mock_config):
+        from core.k8s_cli_wrapper import K8sCLI
+        k8s = K8sCLI(context='staging')
+        mock_run.return_value = b'{"items": [{"metadata": {"name": "pod1"}}]}'
+        pod = k8s.pods.list()[0]
+        self.assertEqual(mock_run.call_args[0][0][:3], ['kubectl', '--context', 'staging'])
+        self.assertEqual(pod.kube_context, 'staging')
+        mock_run.return_value = b'log'
+        pod.logs()
+        self.assertEqual(mock_run.call_args[0][0], ['kubectl', '--context', 'staging', 'logs', 'pod1'])
+        self.assertEqual(k8s.get_context(), 'staging')
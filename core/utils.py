@@ -2,6 +2,7 @@ import subprocess
 import os
 import logging
 import socket
+from .deadlines import job_time_left
 
 logger = logging.getLogger(__name__)
 
@@ -46,10 +47,93 @@ def get_primary_ip():
         s.close()
     return IP
 
+def _page_args(page, per_page):
+    try:
+        page = int(page)
+        per_page = int(per_page)
+    except (ValueError, TypeError):
+        page = 1
+        per_page = 10
+
+    if per_page <= 0:
+        per_page = 10
+    return page, per_page
+
+def _page_result(items, page, per_page, total_items, total_pages, has_next, total_is_estimate=False):
+    return {
+        'items': items,
+        'total_items': total_items,
+        'total_is_estimate': total_is_estimate,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': total_pages,
+        'has_next': has_next,
+        'has_prev': page > 1,
+        'next_page': page + 1,
+        'prev_page': page - 1,
+    }
+
+# Continue tokens expire on the server after a few minutes anyway
+PAGE_TOKEN_TTL = 300
+
+def _paginate_source(source, page, per_page):
+    """
+    Fetches a single page from a server-side paged source (see K8sPagedSource).
+    The continue token leading to each page is kept in the cache, so moving to the next
+    page is one bounded request; pages past the furthest known token are walked to.
+    Once a token expired, the requested page is walked to again from the first one.
+    """
+    from django.core.cache import cache
+    key = f"{source.cache_key}_{per_page}"
+    # tokens[i] is the continue token that fetches page i + 1
+    tokens = cache.get(key) or [None]
+    page = max(1, page)
+
+    current = min(page, len(tokens))
+    restarted = False
+    while True:
+        try:
+            chunk = source.fetch_page(per_page, tokens[current - 1])
+        except Exception as e:
+            if current > 1 and not restarted and source.is_expired(e):
+                tokens, current, restarted = [None], 1, True
+                continue
+            logger.warning(f"Failed to fetch page {current}: {e}")
+            return _page_result([], 1, per_page, 0, 0, False)
+        if chunk.continue_token:
+            # Tokens of the pages after this one stay usable
+            tokens[current:current + 1] = [chunk.continue_token]
+        else:
+            del tokens[current:]
+        if current >= page or not chunk.continue_token:
+            break
+        current += 1
+    cache.set(key, tokens, PAGE_TOKEN_TTL)
+
+    seen = (current - 1) * per_page + len(chunk)
+    if not chunk.continue_token:
+        total_items, estimate = seen, False
+    elif chunk.remaining_item_count is not None:
+        total_items, estimate = seen + chunk.remaining_item_count, False
+    else:
+        # The server only says there is more; show at least one more page
+        total_items, estimate = seen + 1, True
+    total_pages = max(current, (total_items + per_page - 1) // per_page)
+    return _page_result(list(chunk), current, per_page, total_items, total_pages,
+                        bool(chunk.continue_token), total_is_estimate=estimate)
+
 def paginate_list(items, page, per_page, search_query=None, search_fields=None):
     """
     Paginates and filters a list of objects or dictionaries.
+    items may also be a paged source (fetch_page/fetch_all, see K8sPagedSource): without a
+    search query only the requested page is fetched from the server.
     """
+    page, per_page = _page_args(page, per_page)
+    if hasattr(items, 'fetch_page'):
+        if not (search_query and search_fields) and items.supports_paging():
+            return _paginate_source(items, page, per_page)
+        items = items.fetch_all()
+
     if search_query and search_fields:
         query = search_query.lower()
         filtered_items = []
@@ -72,16 +156,6 @@ def paginate_list(items, page, per_page, search_query=None, search_fields=None):
         items = filtered_items
 
     total_items = len(items)
-    try:
-        page = int(page)
-        per_page = int(per_page)
-    except (ValueError, TypeError):
-        page = 1
-        per_page = 10
-
-    if per_page <= 0:
-        per_page = 10
-        
     total_pages = (total_items + per_page - 1) // per_page
     if page > total_pages:
         page = max(1, total_pages)
@@ -89,22 +163,13 @@ def paginate_list(items, page, per_page, search_query=None, search_fields=None):
     start = (page - 1) * per_page
     end = start + per_page
     
-    return {
-        'items': items[start:end],
-        'total_items': total_items,
-        'page': page,
-        'per_page': per_page,
-        'total_pages': total_pages,
-        'has_next': page < total_pages,
-        'has_prev': page > 1,
-        'next_page': page + 1,
-        'prev_page': page - 1,
-    }
+    return _page_result(items[start:end], page, per_page, total_items, total_pages, page < total_pages)
 
 def run_command(cmd, input_data=None, timeout=30, capture_output=True, shell=False, env=None, log_errors=True):
     """
     Runs a command. Assumes the application is already running as root.
     """
+    timeout = job_time_left(timeout)
     try:
         if capture_output:
             return subprocess.check_output(cmd, input=input_data, stderr=subprocess.STDOUT, timeout=timeout, shell=shell, env=env)
@@ -0,0 +1,94 @@
+import inspect
+import logging
+import os
+import subprocess
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Written at build or install time (see install.sh), for copies without a git checkout
+VERSION_FILE = 'VERSION'
+
+_lock = threading.Lock()
+# directory -> (signature of its git state, version)
+_git_versions = {}
+
+def _git_dir(path):
+    """The git directory of a checkout at path, following the `gitdir:` file of submodules."""
+    dot_git = os.path.join(path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
+    try:
+        with open(dot_git) as f:
+            content = f.read().strip()
+    except OSError:
+        return None
+    if not content.startswith('gitdir:'):
+        return None
+    return os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+
+def _signature(git_dir):
+    """Changes whenever HEAD moves or tags are added, so the cached tag is read again."""
+    signature = []
+    for name in ('HEAD', 'packed-refs', os.path.join('refs', 'tags')):
+        try:
+            signature.append(os.stat(os.path.join(git_dir, name)).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def _read_version_file(path):
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _read_git_version(path):
+    git_dir = _git_dir(path)
+    if git_dir is None:
+        return None
+    signature = _signature(git_dir)
+    with _lock:
+        cached = _git_versions.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    try:
+        version = subprocess.check_output(
+            ['git', 'describe', '--tags', '--abbrev=0'], cwd=path, stderr=subprocess.DEVNULL
+        ).decode().strip() or None
+    except Exception:
+        version = None
+    with _lock:
+        _git_versions[path] = (signature, version)
+    return version
+
+def resolve_version(path):
+    """
+    Version of the checkout at path: its latest git tag, else the stamped VERSION file. git
+    wins so a checkout moved by hand (git pull, git checkout) never shows a stale stamp.
+    """
+    return _read_git_version(path) or _read_version_file(path)
+
+def get_core_version():
+    """Core version. Forks git only after the checkout's HEAD or tags changed."""
+    return resolve_version(str(settings.BASE_DIR)) or 'v0.0.0'
+
+def get_module_version(module):
+    """
+    Version of a module: the git tag or VERSION file of its own directory (modules added
+    as submodules), else the module's version attribute.
+    """
+    version = None
+    try:
+        version = resolve_version(os.path.dirname(inspect.getfile(type(module))))
+    except (TypeError, OSError):
+        pass
+    if version:
+        return version[1:] if version[:1] in ('v', 'V') else version
+    return getattr(module, 'version', '1.0.0')
+
+def clear_cache():
+    with _lock:
+        _git_versions.clear()
@@ -13,8 +13,10 @@ from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
 from django.conf import settings
 from .models import Tool
-from .plugin_system import plugin_registry
+from .plugin_system import plugin_registry, mark_tool_viewed
 from .utils import run_command, devops_admin_required
+from .single_flight import get_or_compute
+from .context_processors import refresh_tools_nav
 
 logger = logging.getLogger(__name__)
 
@@ -116,6 +118,10 @@ def get_server_stats():
         'disk_usage': psutil.disk_usage('/').percent,
     }
 
+def get_cached_server_stats():
+    """Stats kept by the background worker (apps.poll_server_stats), refreshed in the background once expired."""
+    return get_or_compute('bg_server_stats', 30, get_server_stats, max_stale=getattr(settings, 'CACHE_MAX_STALE', 0))
+
 @login_required
 def dashboard(request):
     # Hardware Info (cached or static)
@@ -132,9 +138,7 @@ def dashboard(request):
     hw_sudo = get_hw_info_sudo()
     
     # Use background-cached stats if available
-    stats = cache.get('bg_server_stats')
-    if not stats:
-        stats = get_server_stats()
+    stats = get_cached_server_stats()
         
     context = {
         'server_info': {
@@ -155,11 +159,29 @@ def dashboard(request):
 
 @login_required
 def server_stats_partial(request):
-    stats = cache.get('bg_server_stats')
-    if not stats:
-        stats = get_server_stats()
+    stats = get_cached_server_stats()
     return render(request, 'core/partials/stats.html', {'stats': stats})
 
+def module_context_key(module, tool, user):
+    """Cache key of a tool page's module context, shared by all users unless the module says otherwise."""
+    return f"module_context_{tool.name}_{user.id if module.context_per_user else 'shared'}"
+
+def context_request(user_id, method, path, query_string, hx_headers):
+    """
+    Stand-in for the request of a module context refreshed in the background, built from
+    plain values so the refresh does not keep the client's request alive. It carries
+    user, method, path, GET and the HTMX headers; no session, cookies or messages.
+    """
+    from django.contrib.auth import get_user_model
+    from django.http import HttpRequest, QueryDict
+    stand_in = HttpRequest()
+    stand_in.method = method
+    stand_in.path = stand_in.path_info = path
+    stand_in.GET = QueryDict(query_string)
+    stand_in.META.update(hx_headers)
+    stand_in.user = get_user_model().objects.get(pk=user_id)
+    return stand_in
+
 @login_required
 def tool_detail(request, tool_name):
     tool = get_object_or_404(Tool, name=tool_name)
@@ -171,6 +193,9 @@ def tool_detail(request, tool_name):
     }
 
     if module:
+        # Lets the background worker poll this tool faster while the page is open
+        mark_tool_viewed(tool)
+
         # Get module specific context with caching
         # Include tab in cache key for HTMX requests
         target = request.GET.get('tab')
@@ -192,7 +217,7 @@ def tool_detail(request, tool_name):
                     context['bg_timestamp'] = datetime.fromtimestamp(ts)
         
         if 'service_status' not in context:
-            cache_key = f'module_context_{tool.name}_{request.user.id}'
+            cache_key = module_context_key(module, tool, request.user)
             if is_hx and target:
                 cache_key += f'_{target}'
                 # For namespace-specific requests
@@ -200,27 +225,31 @@ def tool_detail(request, tool_name):
                 if namespace:
                     cache_key += f'_{namespace}'
             
-            module_context = cache.get(cache_key)
-                
-            if module_context is None:
-                module_context = module.get_context_data(request, tool)
-                try:
-                    # Cache for 30s for page loads, 5s for HTMX refreshes
-                    ttl = 5 if is_hx else 30
-                    cache.set(cache_key, module_context, ttl)
-                except Exception as e:
-                    logger.warning(f"Failed to cache module context for {tool.name}: {e}")
+            # Cache for 30s for page loads, 5s for HTMX refreshes. Concurrent misses
+            # (e.g. many users opening the page after a restart) compute it once
+            ttl = 5 if is_hx else 30
+            # The background refresh may run after this request ended: it only captures
+            # plain values and gets a stand-in request
+            user_id, tool_id = request.user.pk, tool.pk
+            method, path, query_string = request.method, request.path, request.GET.urlencode()
+            hx_headers = {k: v for k, v in request.META.items() if k.startswith('HTTP_HX_')}
+            module_context = get_or_compute(
+                cache_key, ttl, lambda: module.get_context_data(request, tool),
+                max_stale=getattr(settings, 'CACHE_MAX_STALE', 0),
+                refresh=lambda: module.get_context_data(
+                    context_request(user_id, method, path, query_string, hx_headers), Tool.objects.get(pk=tool_id)),
+            )
             
             context.update(module_context)
 
             # Update tool status based on actual service status
-            service_status = module.get_service_status(tool)
+            service_status = module.get_cached_service_status(tool)
             context['service_status'] = service_status
         
         # Add dynamic module properties to context
         context['resource_tabs'] = module.get_resource_tabs()
         context['module'] = module
-        context['service_version'] = module.get_service_version() or tool.version
+        context['service_version'] = module.get_cached_service_version() or tool.version
 
         # Handle HTMX requests
         if is_hx:
@@ -258,6 +287,8 @@ def tool_action(request, tool_name, action):
     if action == 'update':
         if module and hasattr(module, 'update'):
             module.update(request, tool)
+            module.invalidate_service_probes(tool)
+            refresh_tools_nav(module, tool)
             return redirect('tool_detail', tool_name=tool_name)
         else:
             return HttpResponse("Update not supported for this module", status=400)
@@ -276,8 +307,10 @@ def tool_action(request, tool_name, action):
             pass
             
     # Clear cache for this module to reflect changes immediately
-    cache_key = f'module_context_{tool.name}_{request.user.id}'
-    cache.delete(cache_key)
+    cache.delete_many([f'module_context_{tool.name}_{request.user.id}', f'module_context_{tool.name}_shared'])
+    if module:
+        module.invalidate_service_probes(tool)
+        refresh_tools_nav(module, tool)
     
     return redirect('tool_detail', tool_name=tool_name)
 
@@ -45,6 +45,26 @@ get_install_dir() {
     fi
 }
 
+stamp_versions() {
+    # Record the git tags in VERSION files, used by copies of the tree without .git
+    git describe --tags --abbrev=0 > VERSION 2>/dev/null || rm -f VERSION
+    for mod_dir in modules/*; do
+        if [[ -d "$mod_dir" && -e "$mod_dir/.git" ]]; then
+            (
+                cd "$mod_dir"
+                if git describe --tags --abbrev=0 > VERSION 2>/dev/null; then
+                    # Keep the submodule checkout clean
+                    exclude="$(git rev-parse --git-path info/exclude)"
+                    mkdir -p "$(dirname "$exclude")"
+                    grep -qx VERSION "$exclude" 2>/dev/null || echo VERSION >> "$exclude"
+                else
+                    rm -f VERSION
+                fi
+            )
+        fi
+    done
+}
+
 do_install() {
     echo "Welcome to the SolsticeOps installation script!"
     echo "This will install the core panel and selected modules."
@@ -131,6 +151,7 @@ do_install() {
                 ;;
         esac
     done
+    stamp_versions
 
     # 7. Create .env file
     echo -e "\n${YELLOW}--- Creating Configuration ---${NC}"
@@ -142,6 +163,8 @@ ALLOWED_HOSTS=*
 DATABASE_URL=sqlite:///db.sqlite3
 CSRF_TRUSTED_ORIGINS=http://localhost:$PANEL_PORT,http://127.0.0.1:$PANEL_PORT
 PORT=$PANEL_PORT
+CACHE_BACKEND=sqlite
+CHANNEL_LAYER_BACKEND=sqlite
 EOF
 
     # 8. Database and Admin user
@@ -225,6 +248,13 @@ do_update() {
             fi
         fi
     done
+    stamp_versions
+
+    # Settings added after older installs: the worker processes share one cache and channel layer
+    [[ -s .env && -n "$(tail -c1 .env)" ]] && echo >> .env
+    for setting in CACHE_BACKEND=sqlite CHANNEL_LAYER_BACKEND=sqlite; do
+        grep -q "^${setting%%=*}=" .env 2>/dev/null || echo "$setting" >> .env
+    done
 
     echo -e "\n${YELLOW}--- Running Migrations ---${NC}"
     python3 manage.py migrate
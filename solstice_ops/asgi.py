@@ -8,12 +8,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'solstice_ops.settings')
 django_asgi_app = get_asgi_application()
 
 import core.routing
+from core.live import ServerLoopMiddleware
 
-application = ProtocolTypeRouter({
+application = ServerLoopMiddleware(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             core.routing.websocket_urlpatterns
         )
     ),
-})
+}))
@@ -38,6 +38,10 @@ USE_X_FORWARDED_HOST = True
 USE_X_FORWARDED_PORT = True
 
 
+# Files shared by the worker processes (cache, channel layer, worker lock). Must be a
+# directory only the service user can write to: files in it are refused otherwise
+RUN_DIR = env('RUN_DIR', default=os.path.join(BASE_DIR, 'var'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -70,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.service_probes.ServiceProbeMiddleware',
 ]
 
 LOGGING = {
@@ -114,12 +119,62 @@ TEMPLATES = [
 WSGI_APPLICATION = 'solstice_ops.wsgi.application'
 ASGI_APPLICATION = 'solstice_ops.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Channel layer: 'memory' only reaches consumers of the same process, 'sqlite' is one file
+# shared by all worker processes on the host (live updates, terminals attached elsewhere)
+CHANNEL_LAYER_BACKEND = env('CHANNEL_LAYER_BACKEND', default='memory')
+if CHANNEL_LAYER_BACKEND == 'sqlite':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.channel_layers.SQLiteChannelLayer',
+            'CONFIG': {
+                'path': env('CHANNEL_LAYER_LOCATION', default=os.path.join(RUN_DIR, 'channels.sqlite3')),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
+# Docker transport: 'auto' uses the Engine API socket when present and falls back to the CLI,
+# 'api' always uses the socket, 'cli' always forks the docker binary
+DOCKER_TRANSPORT = env('DOCKER_TRANSPORT', default='auto')
+DOCKER_SOCKET = env('DOCKER_SOCKET', default='/var/run/docker.sock')
+# Keep Docker state in memory, updated from the events stream, instead of re-listing on every read
+DOCKER_STATE_CACHE = env.bool('DOCKER_STATE_CACHE', default=True)
+# Kubernetes transport: 'auto' talks to the API server directly when the kubeconfig allows it
+# (token, basic or client-certificate auth), 'cli' always forks kubectl
+K8S_TRANSPORT = env('K8S_TRANSPORT', default='auto')
+# Serve Kubernetes lists from per-type watch caches instead of a full `kubectl get` per call.
+# Every worker process runs its own watches, so this is off by default
+K8S_WATCH_CACHE = env.bool('K8S_WATCH_CACHE', default=False)
+# Terminal history kept per session for reconnects, in bytes
+TERMINAL_SCROLLBACK_BYTES = env.int('TERMINAL_SCROLLBACK_BYTES', default=1024 * 1024)
+# Scrollback lines included in the screen snapshot sent to a reconnecting terminal
+TERMINAL_SNAPSHOT_LINES = env.int('TERMINAL_SNAPSHOT_LINES', default=1000)
+# Seconds an expired module context or server stats entry is still served while one
+# background refresh runs (stale-while-revalidate), 0 to always recompute on expiry
+CACHE_MAX_STALE = env.int('CACHE_MAX_STALE', default=120)
+# Number of module polls the background worker runs at the same time
+BACKGROUND_POLL_WORKERS = env.int('BACKGROUND_POLL_WORKERS', default=4)
+# Lock file that elects the single process running the background worker when several
+# ASGI workers share the host. Only used with a shared cache (CACHE_BACKEND=sqlite)
+BACKGROUND_WORKER_LOCK = env('BACKGROUND_WORKER_LOCK', default=os.path.join(RUN_DIR, 'worker.lock'))
+
+
+# Cache: 'locmem' is private to each process, 'sqlite' is one file shared by all worker
+# processes on the host so poll results are computed once
+CACHE_BACKEND = env('CACHE_BACKEND', default='locmem')
+if CACHE_BACKEND == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': env('CACHE_LOCATION', default=os.path.join(RUN_DIR, 'cache.sqlite3')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases